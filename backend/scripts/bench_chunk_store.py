@@ -0,0 +1,137 @@
+"""Chunk store benchmark: dedup ratio across policy versions and reconstruction throughput.
+
+Generates a synthetic manual and a series of successive versions, each with a
+few small edits (reworded sentences, inserted and deleted paragraphs), and
+stores every version through core/chunking.py into a scratch CONTENT_ROOT.
+Reports chunking throughput, the dedup ratio (logical bytes stored over
+bytes of unique chunks), the share of chunks each new version had to upload,
+and how fast files are reassembled by full sequential reads and random
+range reads. No database is needed; the scratch directory is removed
+afterwards.
+
+Usage:
+    python -m backend.scripts.bench_chunk_store [--size-mb 40] [--versions 10] [--edits 20]
+"""
+import argparse
+import hashlib
+import io
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+
+def make_manual(size: int, rng: random.Random):
+    words = [f"{rng.choice('bcdfghjklmnpqrstvwz')}{rng.choice('aeiou')}{rng.randint(0, 9999)}" for _ in range(5000)]
+    paragraphs = []
+    total = 0
+    while total < size:
+        paragraph = " ".join(rng.choices(words, k=rng.randint(40, 160)))
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return paragraphs, words
+
+
+def edit(paragraphs, words, edits: int, rng: random.Random):
+    paragraphs = list(paragraphs)
+    for _ in range(edits):
+        index = rng.randrange(len(paragraphs))
+        action = rng.random()
+        if action < 0.6: # Reword part of a paragraph
+            tokens = paragraphs[index].split(" ")
+            start = rng.randrange(len(tokens))
+            tokens[start:start + rng.randint(1, 8)] = rng.choices(words, k=rng.randint(1, 8))
+            paragraphs[index] = " ".join(tokens)
+        elif action < 0.8:
+            paragraphs.insert(index, " ".join(rng.choices(words, k=rng.randint(40, 160))))
+        elif len(paragraphs) > 1:
+            del paragraphs[index]
+    return paragraphs
+
+
+def render(paragraphs) -> bytes:
+    return "\n\n".join(paragraphs).encode()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=40)
+    parser.add_argument("--versions", type=int, default=10)
+    parser.add_argument("--edits", type=int, default=20, help="edits between successive versions")
+    parser.add_argument("--range-reads", type=int, default=2000)
+    parser.add_argument("--range-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    content_root = tempfile.mkdtemp(prefix="chunk-bench-")
+    # CONTENT_ROOT is read at import time, so set it before importing the store.
+    os.environ["CONTENT_ROOT"] = content_root
+    from backend.src.core.chunking import ChunkedReader, iter_chunks, store_chunk, verify_manifest
+
+    rng = random.Random(args.seed)
+    try:
+        paragraphs, words = make_manual(int(args.size_mb * 2**20), rng)
+        unique = {}
+        manifests = []
+        logical_bytes = 0
+        chunk_seconds = 0.0
+        print(f"{'version':>8} {'size':>9} {'chunks':>7} {'new':>6} {'new bytes':>10}")
+        for version in range(1, args.versions + 1):
+            if version > 1:
+                paragraphs = edit(paragraphs, words, args.edits, rng)
+            data = render(paragraphs)
+            logical_bytes += len(data)
+            manifest = []
+            new_chunks = new_bytes = 0
+            offset = 0
+            started_at = time.perf_counter()
+            for chunk in iter_chunks(io.BytesIO(data)):
+                chunk_hash, written = store_chunk(chunk)
+                if written:
+                    unique[chunk_hash] = len(chunk)
+                    new_chunks += 1
+                    new_bytes += len(chunk)
+                manifest.append((offset, chunk_hash, len(chunk)))
+                offset += len(chunk)
+            chunk_seconds += time.perf_counter() - started_at
+            assert verify_manifest([h for _, h, _ in manifest]) == (hashlib.sha256(data).hexdigest(), len(data))
+            manifests.append(manifest)
+            print(f"{version:>8} {len(data) / 2**20:8.1f}M {len(manifest):>7} {new_chunks:>6} {new_bytes / 2**20:9.2f}M")
+
+        stored_bytes = sum(unique.values())
+        sizes = list(unique.values())
+        print(f"\n{'chunking':>22}: {logical_bytes / 2**20 / chunk_seconds:7.1f}MB/s (hash, cut and write)")
+        print(f"{'chunks':>22}: {len(sizes)} unique, mean {statistics.mean(sizes) / 1024:.1f}KiB, "
+              f"median {statistics.median(sizes) / 1024:.1f}KiB")
+        print(f"{'dedup ratio':>22}: {logical_bytes / stored_bytes:7.2f}x "
+              f"({logical_bytes / 2**20:.1f}MB logical, {stored_bytes / 2**20:.1f}MB stored)")
+
+        manifest = manifests[-1]
+        size = manifest[-1][0] + manifest[-1][2]
+        reader = io.BufferedReader(ChunkedReader(manifest), buffer_size=256 * 1024)
+        started_at = time.perf_counter()
+        while reader.read(1024 * 1024):
+            pass
+        elapsed = time.perf_counter() - started_at
+        print(f"{'sequential read':>22}: {size / 2**20 / elapsed:7.1f}MB/s")
+
+        timings = []
+        for _ in range(args.range_reads):
+            reader.seek(rng.randrange(max(1, size - args.range_bytes)))
+            started_at = time.perf_counter()
+            reader.read(args.range_bytes)
+            timings.append((time.perf_counter() - started_at) * 1000)
+        timings.sort()
+        print(f"{'range reads':>22}: {args.range_bytes // 1024}KiB p50 {statistics.median(timings):.3f}ms "
+              f"p99 {timings[int(len(timings) * 0.99) - 1]:.3f}ms, "
+              f"{args.range_reads * args.range_bytes / 2**20 / (sum(timings) / 1000):.1f}MB/s")
+    finally:
+        shutil.rmtree(content_root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
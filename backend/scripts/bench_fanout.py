@@ -0,0 +1,113 @@
+"""Attestation fan-out benchmark: assigning and notifying a large audience.
+
+Seeds users spread over the four roles into a scratch schema of the
+PostgreSQL database at DATABASE_URL and fans a policy version out to three
+of the roles through core/fanout.py, then delivers the queued notifications
+with the outbox dispatcher. For comparison it also times the old way, one
+notification row and commit per user, on a sample of the audience. A
+second fan-out to the same roles checks that nobody is assigned or notified
+twice. The scratch schema is dropped afterwards.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m backend.scripts.bench_fanout [--users 25000] [--chunk-size 2000]
+"""
+import argparse
+import sys
+import time
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.scripts.scratch import scratch_schema
+from backend.src.core.fanout import FanOutWorker
+from backend.src.core.outbox import OutboxDispatcher
+from backend.src.database import DATABASE_URL
+from backend.src.models import policy as models
+
+SCHEMA = "fanout_bench"
+
+
+def seed(conn, users: int) -> None:
+    conn.execute(text(
+        "INSERT INTO users (id, username, password_hash, email, permissions_version) "
+        "SELECT g, 'user' || g, 'x', 'user' || g || '@example.com', 0 FROM generate_series(1, :n) g"
+    ), {"n": users})
+    conn.execute(text("INSERT INTO roles (id, name) VALUES (1, 'Admin'), (2, 'Editor'), (3, 'Reviewer'), (4, 'Viewer')"))
+    conn.execute(text("INSERT INTO user_roles (user_id, role_id) SELECT g, 1 + g % 4 FROM generate_series(1, :n) g"), {"n": users})
+    conn.execute(text("INSERT INTO policies (id, title, status, created_by) VALUES (1, 'Code of Conduct', 'Published', 1)"))
+    conn.execute(text("INSERT INTO policy_versions (id, policy_id, version_number, created_by) VALUES (1, 1, 1, 1)"))
+    conn.execute(text("ANALYZE"))
+
+
+def fan_out(Session, worker: FanOutWorker) -> models.AttestationFanOut:
+    with Session() as db:
+        fanout = models.AttestationFanOut(policy_version_id=1, role_ids="[2, 3, 4]", user_ids="[]",
+                                          message="Please read and attest to version 1 of 'Code of Conduct'.")
+        db.add(fanout)
+        db.commit()
+        fanout_id = fanout.id
+    worker.run(fanout_id)
+    with Session() as db:
+        return db.get(models.AttestationFanOut, fanout_id)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=25000)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--baseline-sample", type=int, default=500, help="users notified one commit at a time")
+    args = parser.parse_args()
+    if not DATABASE_URL.startswith("postgresql"):
+        print("bench_fanout needs a PostgreSQL DATABASE_URL", file=sys.stderr)
+        return 2
+
+    with scratch_schema(DATABASE_URL, SCHEMA) as engine:
+        Session = sessionmaker(bind=engine)
+        with engine.begin() as conn:
+            seed(conn, args.users)
+
+        with Session() as db:
+            started_at = time.perf_counter()
+            for user_id in range(1, args.baseline_sample + 1):
+                db.add(models.Notification(user_id=user_id, message="Please attest"))
+                db.commit()
+            per_user = (time.perf_counter() - started_at) / args.baseline_sample
+            db.query(models.Notification).delete()
+            db.query(models.NotificationCounter).delete()
+            db.commit()
+
+        worker = FanOutWorker(session_factory=Session, chunk_size=args.chunk_size)
+        started_at = time.perf_counter()
+        fanout = fan_out(Session, worker)
+        fanout_seconds = time.perf_counter() - started_at
+
+        dispatcher = OutboxDispatcher(session_factory=Session)
+        started_at = time.perf_counter()
+        while dispatcher.dispatch_once():
+            pass
+        dispatch_seconds = time.perf_counter() - started_at
+
+        with Session() as db:
+            notifications = db.execute(select(func.count()).select_from(models.Notification)).scalar()
+            assignments = db.execute(select(func.count()).select_from(models.AttestationAssignment)).scalar()
+        again = fan_out(Session, worker)
+        while dispatcher.dispatch_once():
+            pass
+        with Session() as db:
+            notifications_after = db.execute(select(func.count()).select_from(models.Notification)).scalar()
+
+        audience = fanout.total
+        print(f"{'audience':>24}: {audience} users in 3 of 4 roles, chunks of {args.chunk_size}")
+        print(f"{'one commit per user':>24}: {per_user * 1000:.2f}ms/user, ~{per_user * audience:.1f}s for the audience "
+              f"(sampled on {args.baseline_sample}; HTTP overhead not included)")
+        print(f"{'fan-out':>24}: {fanout_seconds:.2f}s ({audience / fanout_seconds:,.0f} users/s), "
+              f"{assignments} assignments, status {fanout.status}")
+        print(f"{'notification delivery':>24}: {dispatch_seconds:.2f}s ({notifications / dispatch_seconds:,.0f}/s), "
+              f"{notifications} notifications")
+        print(f"{'repeat fan-out':>24}: {again.processed} users checked, {again.assigned} assigned, "
+              f"{notifications_after - notifications} new notifications")
+        return 0 if again.assigned == 0 and notifications_after == notifications == assignments == audience else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""Search backend benchmark: in-process BM25 against PostgreSQL full-text search.
+
+Generates a synthetic corpus of policies (title, description, version summary
+and document body drawn from a Zipf-distributed vocabulary) and reports, for
+the BM25 index, build time, memory and query latency. With a PostgreSQL
+DATABASE_URL the same corpus is also loaded into a scratch schema, indexed
+the way core/extraction.py and database/init.sql index it, and both backends
+answer the same queries end to end (ranking plus snippets for the page of
+hits). The scratch schema is dropped afterwards.
+
+Usage:
+    python -m backend.scripts.bench_search [--documents 100000] [--queries 200]
+    DATABASE_URL=postgresql://... python -m backend.scripts.bench_search
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import random
+import resource
+import statistics
+import sys
+import time
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.scripts.scratch import scratch_schema
+from backend.src.core.search import BM25Index, BM25SearchBackend, PostgresSearchBackend, tokenize
+from backend.src.database import DATABASE_URL, _async_url
+from backend.src.models import policy as models
+
+SCHEMA = "search_benchmark"
+STATUSES = ("Draft", "Published", "Archived")
+INSERT_BATCH = 5000
+
+
+def make_corpus(documents: int, vocabulary: int, body_words: int, seed: int):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(vocabulary)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+
+    def phrase(n):
+        return " ".join(rng.choices(words, cum_weights=cum_weights, k=n))
+
+    for policy_id in range(1, documents + 1):
+        yield {
+            "id": policy_id,
+            "title": phrase(rng.randint(3, 8)),
+            "description": phrase(rng.randint(15, 40)),
+            "summary": phrase(rng.randint(5, 15)),
+            "body": phrase(rng.randint(body_words // 2, body_words * 3 // 2)),
+            "status": rng.choice(STATUSES),
+            "document_type_id": rng.randint(1, 10),
+        }
+
+
+def make_queries(count: int, vocabulary: int, seed: int):
+    # Skip the handful of near-stopword terms; the rest range from very common to selective.
+    rng = random.Random(seed + 1)
+    queries = []
+    for _ in range(count):
+        terms = [f"w{rng.randint(5, min(2000, vocabulary - 1))}" for _ in range(rng.choice((1, 1, 2, 2, 3)))]
+        queries.append(" ".join(terms))
+    return queries
+
+
+def summarize(name: str, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{name:>28}: p50 {statistics.median(timings):7.2f}ms  p95 {p95:7.2f}ms  p99 {p99:7.2f}ms")
+
+
+def bench_index(args) -> None:
+    gc.collect()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = BM25Index()
+    started_at = time.perf_counter()
+    for doc in make_corpus(args.documents, args.vocabulary, args.body_words, args.seed):
+        index.upsert(doc["id"], (doc["title"], doc["description"], doc["summary"], doc["body"]),
+                     doc["status"], doc["document_type_id"])
+    build_seconds = time.perf_counter() - started_at
+    # ru_maxrss is in KiB on Linux; the corpus is generated lazily, so the growth is mostly the index.
+    rss_growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+    stats = index.stats()
+    print(f"BM25 index over {stats['documents']} documents: built in {build_seconds:.1f}s, "
+          f"{stats['terms']} terms, {stats['postings']} postings")
+    print(f"{'memory':>28}: {rss_growth / 2**20:7.1f}MB peak RSS growth, "
+          f"postings and slot arrays {stats['postings_bytes'] / 2**20:.1f}MB")
+
+    for label, status in (("query", None), ("query, status filter", "Published")):
+        timings = []
+        for query in make_queries(args.queries, args.vocabulary, args.seed):
+            started_at = time.perf_counter()
+            index.search(tokenize(query), status=status, limit=21)
+            timings.append((time.perf_counter() - started_at) * 1000)
+        summarize(f"BM25 {label}", timings)
+
+
+def load_postgres(engine, args) -> None:
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"id": 1, "username": "bench", "password_hash": "x", "email": "bench@example.com"}])
+        conn.execute(insert(models.DocumentType), [{"id": i, "name": f"Type {i}"} for i in range(1, 11)])
+        batch = []
+        for doc in make_corpus(args.documents, args.vocabulary, args.body_words, args.seed):
+            batch.append(doc)
+            if len(batch) == INSERT_BATCH:
+                _insert_batch(conn, batch)
+                batch = []
+        if batch:
+            _insert_batch(conn, batch)
+        conn.execute(text(
+            "UPDATE policy_versions SET search_vector = "
+            "setweight(to_tsvector('english', COALESCE(summary_of_changes, '')), 'C') || "
+            "setweight(to_tsvector('english', content_blobs.extracted_text), 'D') "
+            "FROM content_blobs WHERE content_blobs.id = policy_versions.content_blob_id"
+        ))
+        conn.execute(text(
+            "UPDATE policies SET current_version_id = policies.id, search_vector = "
+            "setweight(to_tsvector('english', COALESCE(policies.title, '')), 'A') || "
+            "setweight(to_tsvector('english', COALESCE(policies.description, '')), 'B') || "
+            "policy_versions.search_vector "
+            "FROM policy_versions WHERE policy_versions.id = policies.id"
+        ))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+
+
+def _insert_batch(conn, batch) -> None:
+    conn.execute(insert(models.ContentBlob), [
+        {"id": d["id"], "file_path": f"bench/{d['id']}.txt", "extracted_text": d["body"]} for d in batch
+    ])
+    conn.execute(insert(models.Policy), [
+        {"id": d["id"], "title": d["title"], "description": d["description"], "status": d["status"],
+         "document_type_id": d["document_type_id"], "created_by": 1} for d in batch
+    ])
+    conn.execute(insert(models.PolicyVersion), [
+        {"id": d["id"], "policy_id": d["id"], "version_number": 1, "summary_of_changes": d["summary"],
+         "content_blob_id": d["id"], "created_by": 1} for d in batch
+    ])
+
+
+async def time_backend(backend, session_factory, queries, status=None):
+    timings = []
+    async with session_factory() as db:
+        for query in queries:
+            started_at = time.perf_counter()
+            await backend.search(db, query, status, None, None, 20)
+            timings.append((time.perf_counter() - started_at) * 1000)
+    return timings
+
+
+def bench_postgres(args) -> None:
+    with scratch_schema(DATABASE_URL, SCHEMA) as engine:
+        async_engine = create_async_engine(_async_url(DATABASE_URL), connect_args={"server_settings": {"search_path": SCHEMA}})
+        started_at = time.perf_counter()
+        load_postgres(engine, args)
+        print(f"\nPostgreSQL: loaded and indexed {args.documents} documents in {time.perf_counter() - started_at:.1f}s")
+        with engine.connect() as conn:
+            sizes = conn.execute(text(
+                "SELECT pg_relation_size('policies_search_idx'), pg_total_relation_size('policies'), "
+                "pg_total_relation_size('policy_versions')"
+            )).one()
+        print(f"{'GIN index':>28}: {sizes[0] / 2**20:7.1f}MB (policies {sizes[1] / 2**20:.1f}MB, "
+              f"policy_versions {sizes[2] / 2**20:.1f}MB incl. vectors)")
+
+        backend = BM25SearchBackend(session_factory=sessionmaker(bind=engine), snapshot_path="", refresh_seconds=0)
+        started_at = time.perf_counter()
+        backend._warm_up()
+        print(f"{'BM25 build from database':>28}: {time.perf_counter() - started_at:7.1f}s")
+
+        session_factory = sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+        queries = make_queries(args.queries, args.vocabulary, args.seed)
+
+        async def run():
+            for name, search_backend in (("postgres", PostgresSearchBackend()), ("bm25", backend)):
+                await time_backend(search_backend, session_factory, queries[:10]) # Warm caches and connections
+                summarize(f"{name} end to end", await time_backend(search_backend, session_factory, queries))
+                summarize(f"{name} status filter", await time_backend(search_backend, session_factory, queries, "Published"))
+            await async_engine.dispose()
+
+        asyncio.run(run())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--body-words", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    bench_index(args)
+    if DATABASE_URL.startswith("postgresql"):
+        bench_postgres(args)
+    else:
+        print("\nSet a PostgreSQL DATABASE_URL to compare against ts_rank_cd search.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Worker cold-start benchmark.
+
+Starts the application in fresh interpreters and reports how long it takes
+to import the app module, run the lifespan startup and answer the first
+request. Autoscaled workers should be ready well under a second.
+
+Usage:
+    python -m backend.scripts.bench_startup [--runs 5] [--path /health] [--budget-ms 1000]
+
+DATABASE_URL defaults to a throwaway SQLite file so the benchmark can run
+without a database server; point it at Postgres to include connection setup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import backend.src.main as main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    t2 = time.perf_counter()
+    response = client.get(sys.argv[1])
+    t3 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "startup_ms": (t2 - t1) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "ready_ms": (t3 - t0) * 1000,
+    "status": response.status_code,
+}))
+"""
+
+
+def run_once(path: str, env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, path], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("PYTHONPATH", os.getcwd())
+    if "DATABASE_URL" not in env:
+        env["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), "bench_startup.db")
+
+    results = [run_once(args.path, env) for _ in range(args.runs)]
+    for key in ("import_ms", "startup_ms", "first_request_ms", "ready_ms"):
+        values = [r[key] for r in results]
+        print(f"{key:>17}: median {statistics.median(values):8.1f}  max {max(values):8.1f}")
+    statuses = sorted({r["status"] for r in results})
+    print(f"{'status':>17}: {statuses}")
+
+    ready = statistics.median(r["ready_ms"] for r in results)
+    if ready > args.budget_ms:
+        print(f"median ready time {ready:.0f}ms exceeds budget {args.budget_ms:.0f}ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Workflow template benchmark: starting a review workflow on many policies.
+
+Seeds policies and a four-step template into a scratch schema of the
+PostgreSQL database at DATABASE_URL and instantiates the template on all of
+them through core/workflow_runs.py, one transaction per batch of
+``--batch-size`` policies, counting the statements each batch sends. For
+comparison it also times the old way, a workflow and then each of its steps
+created and committed one at a time as the CRUD endpoints do, on a sample of
+the policies. The scratch schema is dropped afterwards.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m backend.scripts.bench_workflow_templates [--policies 10000] [--batch-size 1000]
+"""
+import argparse
+import sys
+import time
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.scripts.scratch import scratch_schema
+from backend.src.core.workflow_runs import instantiate_template
+from backend.src.database import DATABASE_URL
+from backend.src.models import policy as models
+
+SCHEMA = "workflow_template_bench"
+
+
+def seed(conn, policies: int) -> None:
+    conn.execute(text("INSERT INTO users (id, username, password_hash, email, permissions_version) VALUES (1, 'admin', 'x', 'admin@example.com', 0)"))
+    conn.execute(text("INSERT INTO roles (id, name) VALUES (1, 'Admin'), (2, 'Editor'), (3, 'Reviewer'), (4, 'Viewer')"))
+    conn.execute(text("INSERT INTO user_roles (user_id, role_id) VALUES (1, 1)"))
+    conn.execute(text("INSERT INTO policies (id, title, status, created_by) SELECT g, 'Policy ' || g, 'Published', 1 FROM generate_series(1, :n) g"), {"n": policies})
+    conn.execute(text("INSERT INTO workflow_templates (id, name) VALUES (1, 'Annual review')"))
+    conn.execute(text(
+        "INSERT INTO workflow_template_steps (template_id, step_order, name, assigned_to_role_id, due_offset_hours) VALUES "
+        "(1, 1, 'Owner check', 2, 72), (1, 2, 'Legal', 3, 120), (1, 2, 'Security', 3, 120), (1, 3, 'Sign-off', 1, 48)"
+    ))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--policies", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=1000, help="policies per instantiate call (the API allows 1000)")
+    parser.add_argument("--baseline-sample", type=int, default=200, help="policies set up one commit at a time")
+    args = parser.parse_args()
+    if not DATABASE_URL.startswith("postgresql"):
+        print("bench_workflow_templates needs a PostgreSQL DATABASE_URL", file=sys.stderr)
+        return 2
+
+    with scratch_schema(DATABASE_URL, SCHEMA) as engine:
+        Session = sessionmaker(bind=engine)
+        with engine.begin() as conn:
+            seed(conn, args.policies)
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('policies', 'id'), :n)"), {"n": args.policies})
+
+        with Session() as db:
+            template = db.get(models.WorkflowTemplate, 1)
+            steps = [(step.step_order, step.name, step.assigned_to_role_id) for step in template.steps]
+            started_at = time.perf_counter()
+            for policy_id in range(1, args.baseline_sample + 1):
+                workflow = models.Workflow(policy_id=policy_id, name="Annual review")
+                db.add(workflow)
+                db.commit()
+                for step_order, name, role_id in steps:
+                    db.add(models.WorkflowStep(workflow_id=workflow.id, step_order=step_order, name=name, assigned_to_role_id=role_id))
+                    db.commit()
+            per_policy = (time.perf_counter() - started_at) / args.baseline_sample
+            db.query(models.WorkflowStep).delete()
+            db.query(models.Workflow).delete()
+            db.commit()
+
+        statements = [0]
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _count(*_):
+            statements[0] += 1
+
+        batches = 0
+        started_at = time.perf_counter()
+        with Session() as db:
+            template = db.get(models.WorkflowTemplate, 1)
+            for first in range(1, args.policies + 1, args.batch_size):
+                policies = db.execute(
+                    select(models.Policy.id, models.Policy.title)
+                    .where(models.Policy.id.between(first, first + args.batch_size - 1)).order_by(models.Policy.id)
+                ).all()
+                instantiate_template(db, template, policies)
+                db.commit()
+                batches += 1
+        batch_seconds = time.perf_counter() - started_at
+        event.remove(engine, "before_cursor_execute", _count)
+
+        with Session() as db:
+            workflows = db.execute(select(func.count()).select_from(models.Workflow)).scalar()
+            created = db.execute(select(func.count()).select_from(models.WorkflowStep)).scalar()
+            active = db.execute(select(func.count()).select_from(models.WorkflowStep).where(models.WorkflowStep.status == "In Progress")).scalar()
+
+        print(f"{'policies':>20}: {args.policies}, template of {len(steps)} steps")
+        print(f"{'one commit per row':>20}: {per_policy * 1000:.2f}ms/policy, ~{per_policy * args.policies:.1f}s for all "
+              f"(sampled on {args.baseline_sample}; HTTP overhead not included)")
+        print(f"{'template batches':>20}: {batch_seconds:.2f}s ({args.policies / batch_seconds:,.0f} policies/s), "
+              f"{batches} transactions, {statements[0] / batches:.1f} statements each")
+        print(f"{'created':>20}: {workflows} workflows, {created} steps, {active} in progress")
+        return 0 if workflows == args.policies and created == args.policies * len(steps) and active == args.policies else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+"""Throwaway PostgreSQL schemas for the benchmarks and the database tests."""
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from backend.src.database import Base
+
+
+@contextmanager
+def scratch_schema(url: str, schema: str, **engine_options) -> Iterator[Engine]:
+    """Yield an engine on a fresh ``schema`` of the database at ``url``, holding the app's tables.
+
+    The engine's connections put ``schema`` first on the search_path. A
+    leftover schema of that name is replaced, and the schema is dropped
+    again on exit.
+    """
+    engine = create_engine(url, connect_args={"options": f"-c search_path={schema}"}, **engine_options)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+        try:
+            Base.metadata.create_all(bind=engine)
+            yield engine
+        finally:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    finally:
+        engine.dispose()
@@ -1,12 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import replace
 from datetime import timedelta
 
-from backend.src.database import get_db
+from backend.src.database import get_async_db
 from backend.src.models import policy as models
 from backend.src.schemas import policy as schemas
-from backend.src.auth.auth import verify_password, create_access_token, decode_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from backend.src.auth.auth import verify_password_async, create_access_token, create_refresh_token, decode_access_token, password_hash_pool, PasswordHashPoolFull, ACCESS_TOKEN_EXPIRE_MINUTES, JWT_STATELESS
+from backend.src.auth import permissions
+from backend.src.auth.permissions import permission_resolver
+from backend.src.auth.user_cache import load_user_snapshot
 SECRET_KEY = "8V3B8lKjP0qR2sT4uX6yZ8!A@b#c$d%e^f&g*h(i)j_k+l=m-n.o/p~`" # TODO: Load from environment variable
 router = APIRouter(
     prefix="/auth",
@@ -16,34 +21,74 @@ router = APIRouter(
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 @router.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(models.User).where(models.User.username == form_data.username))).scalars().first()
+    try:
+        password_ok = user is not None and await verify_password_async(form_data.password, user.password_hash)
+    except PasswordHashPoolFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return await _issue_tokens(db, user)
+
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh_access_token(request: schemas.RefreshTokenRequest, db: AsyncSession = Depends(get_async_db)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = decode_access_token(request.refresh_token)
+    if payload is None or payload.get("type") != "refresh" or payload.get("id") is None:
+        raise credentials_exception
+    user = await db.get(models.User, payload["id"])
+    # A role change since the refresh token was issued revokes it.
+    if user is None or user.permissions_version != payload.get("pv"):
+        raise credentials_exception
+    return await _issue_tokens(db, user)
+
+async def _issue_tokens(db: AsyncSession, user: models.User):
+    roles = None
+    if JWT_STATELESS:
+        roles = permissions.mask_to_roles(await db.run_sync(permission_resolver.role_mask, user.id))
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "id": user.id}, expires_delta=access_token_expires
+        data={"sub": user.username, "id": user.id}, expires_delta=access_token_expires,
+        roles=roles,
+        permissions_version=user.permissions_version,
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token = create_refresh_token(user.id, user.username, user.permissions_version)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     payload = decode_access_token(token)
-    if payload is None:
+    if payload is None or payload.get("type") == "refresh":
         raise credentials_exception
     username: str = payload.get("sub")
     user_id: int = payload.get("id")
     if username is None or user_id is None:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if JWT_STATELESS and "pv" in payload:
+        # Served from the user snapshot cache; a role change bumps the user's
+        # permissions_version and thereby revokes tokens issued before it.
+        snapshot = await db.run_sync(load_user_snapshot, user_id)
+        if snapshot is None or snapshot.permissions_version != payload["pv"]:
+            raise credentials_exception
+        return replace(snapshot, role_mask=permissions.roles_to_mask(payload.get("roles", [])))
+    user = await db.get(models.User, user_id)
     if user is None:
         raise credentials_exception
     return user
@@ -52,55 +97,23 @@ async def get_current_active_user(current_user: models.User = Depends(get_curren
     # Add checks for active status if applicable
     return current_user
 
-async def get_current_admin_user(current_user: models.User = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    admin_role = db.query(models.Role).filter(models.Role.name == "Admin").first()
-    if not admin_role:
-        raise HTTPException(status_code=500, detail="Admin role not defined")
-    user_has_admin_role = db.query(models.UserRole).filter(
-        models.UserRole.user_id == current_user.id,
-        models.UserRole.role_id == admin_role.id
-    ).first()
-    if not user_has_admin_role:
-async def get_current_editor_user(current_user: models.User = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    editor_role = db.query(models.Role).filter(models.Role.name == "Editor").first()
-    admin_role = db.query(models.Role).filter(models.Role.name == "Admin").first()
-    if not editor_role or not admin_role:
-        raise HTTPException(status_code=500, detail="Editor or Admin role not defined")
-    
-    is_editor = db.query(models.UserRole).filter(
-        models.UserRole.user_id == current_user.id,
-        models.UserRole.role_id == editor_role.id
-    ).first()
-    is_admin = db.query(models.UserRole).filter(
-        models.UserRole.user_id == current_user.id,
-        models.UserRole.role_id == admin_role.id
-    ).first()
-
-    if not is_editor and not is_admin:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions (requires Editor or Admin role)")
+async def _require_roles(db: AsyncSession, current_user: models.User, required: int, detail: str):
+    role_mask = getattr(current_user, "role_mask", None)
+    if role_mask is None:
+        role_mask = await db.run_sync(permission_resolver.role_mask, current_user.id)
+    if not role_mask & required:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
     return current_user
 
-async def get_current_reviewer_user(current_user: models.User = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    reviewer_role = db.query(models.Role).filter(models.Role.name == "Reviewer").first()
-    editor_role = db.query(models.Role).filter(models.Role.name == "Editor").first()
-    admin_role = db.query(models.Role).filter(models.Role.name == "Admin").first()
-    if not reviewer_role or not editor_role or not admin_role:
-        raise HTTPException(status_code=500, detail="Reviewer, Editor, or Admin role not defined")
-    
-    is_reviewer = db.query(models.UserRole).filter(
-        models.UserRole.user_id == current_user.id,
-        models.UserRole.role_id == reviewer_role.id
-    ).first()
-    is_editor = db.query(models.UserRole).filter(
-        models.UserRole.user_id == current_user.id,
-        models.UserRole.role_id == editor_role.id
-    ).first()
-    is_admin = db.query(models.UserRole).filter(
-        models.UserRole.user_id == current_user.id,
-        models.UserRole.role_id == admin_role.id
-    ).first()
+async def get_current_admin_user(current_user: models.User = Depends(get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    return await _require_roles(db, current_user, permissions.ADMIN, "Not enough permissions (requires Admin role)")
 
-    if not is_reviewer and not is_editor and not is_admin:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions (requires Reviewer, Editor, or Admin role)")
-    return current_user
-    return current_user
+async def get_current_editor_user(current_user: models.User = Depends(get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    return await _require_roles(db, current_user, permissions.EDITOR_OR_ADMIN, "Not enough permissions (requires Editor or Admin role)")
+
+async def get_current_reviewer_user(current_user: models.User = Depends(get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    return await _require_roles(db, current_user, permissions.REVIEWER_OR_ABOVE, "Not enough permissions (requires Reviewer, Editor, or Admin role)")
+
+@router.get("/password-hashing/stats")
+async def read_password_hashing_stats(current_user: models.User = Depends(get_current_admin_user)):
+    return password_hash_pool.stats()
@@ -1,10 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from backend.src.database import get_db
+from backend.src.database import AsyncSessionLocal, get_db, get_async_db, get_async_read_db
 from backend.src.models import policy as models
 from backend.src.schemas import policy as schemas
+from backend.src.core.notification_hub import notification_hub
+from backend.src.core.notification_store import delete_notifications, notification_retention, set_read, unread_count
+from backend.src.core.outbox import outbox_dispatcher
+from backend.src.core.pagination import PAGE_MAX_LIMIT, Keyset
 from backend.src.api.auth_api import get_current_active_user, get_current_admin_user
 
 router = APIRouter(
@@ -12,6 +22,11 @@ router = APIRouter(
     tags=["Notifications"]
 )
 
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "20")) # Keeps proxies from closing idle streams
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", "3000")) # Client reconnect delay
+SSE_BATCH_SIZE = 100
+SSE_REORDER_WINDOW = int(os.getenv("SSE_REORDER_WINDOW", "1000")) # Ids below the newest sent that are re-read for rows committed late
+
 @router.post("/", response_model=schemas.Notification, status_code=status.HTTP_201_CREATED)
 def create_notification(notification: schemas.NotificationCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
     # Only admin can create notifications for any user for now, or internal system
@@ -21,10 +36,125 @@ def create_notification(notification: schemas.NotificationCreate, db: Session =
     db.refresh(db_notification)
     return db_notification
 
-@router.get("/me/", response_model=List[schemas.Notification])
-def get_my_notifications(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    notifications = db.query(models.Notification).filter(models.Notification.user_id == current_user.id).offset(skip).limit(limit).all()
-    return notifications
+@router.get("/outbox/stats")
+async def read_outbox_stats(current_user: models.User = Depends(get_current_admin_user)):
+    return outbox_dispatcher.stats()
+
+@router.get("/retention/stats")
+async def read_retention_stats(current_user: models.User = Depends(get_current_admin_user)):
+    return notification_retention.stats()
+
+@router.get("/stream/stats")
+async def read_stream_stats(current_user: models.User = Depends(get_current_admin_user)):
+    return notification_hub.stats()
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_my_notifications(
+    after: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Push the caller's new notifications as Server-Sent Events.
+
+    Each ``notification`` event carries a schemas.Notification. Its event id
+    is the highest notification id sent so far, so a client that reconnects
+    with Last-Event-ID (or ``?after=``) resumes where it left off. Without
+    one, only notifications created after connecting are sent. The stream is
+    idle until notification_hub wakes it, apart from a comment line every
+    SSE_HEARTBEAT_SECONDS.
+
+    Ids are allocated when a row is inserted, not when it commits, so a
+    notification can become visible after one with a higher id was sent.
+    Each re-read therefore covers the last SSE_REORDER_WINDOW ids below the
+    newest sent as well, skipping the ones already sent.
+    """
+    user_id = current_user.id
+    last_id = after
+    if last_event_id is not None:
+        try:
+            last_id = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be a notification id")
+    if last_id is None:
+        last_id = (await db.execute(
+            select(func.max(models.Notification.id)).where(models.Notification.user_id == user_id)
+        )).scalar() or 0
+    # What is already committed up to last_id counts as sent; anything that commits there later is new.
+    floor = max(last_id - SSE_REORDER_WINDOW, 0)
+    sent = set((await db.execute(
+        select(models.Notification.id)
+        .where(models.Notification.user_id == user_id, models.Notification.id > floor, models.Notification.id <= last_id)
+    )).scalars().all())
+    # Don't hold a pooled connection for the life of the stream; each re-read uses its own session.
+    await db.close()
+
+    async def events():
+        nonlocal last_id, floor
+        wakeup = notification_hub.subscribe(user_id)
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while True:
+                wakeup.clear()
+                async with AsyncSessionLocal() as session:
+                    ids = (await session.execute(
+                        select(models.Notification.id)
+                        .where(models.Notification.user_id == user_id, models.Notification.id > floor)
+                        .order_by(models.Notification.id)
+                        .limit(SSE_BATCH_SIZE + len(sent)) # Enough for a full batch whatever was sent
+                    )).scalars().all()
+                    unsent = [notification_id for notification_id in ids if notification_id not in sent][:SSE_BATCH_SIZE]
+                    rows = (await session.execute(
+                        select(models.Notification).where(models.Notification.id.in_(unsent)).order_by(models.Notification.id)
+                    )).scalars().all() if unsent else []
+                for row in rows:
+                    sent.add(row.id)
+                    last_id = max(last_id, row.id)
+                    yield f"id: {last_id}\nevent: notification\ndata: {schemas.Notification.from_orm(row).json()}\n\n"
+                floor = max(last_id - SSE_REORDER_WINDOW, floor)
+                sent.difference_update([notification_id for notification_id in sent if notification_id <= floor])
+                if len(rows) == SSE_BATCH_SIZE:
+                    continue
+                try:
+                    await asyncio.wait_for(wakeup.wait(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            notification_hub.unsubscribe(user_id, wakeup)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/me/", response_model=schemas.Page[schemas.Notification])
+async def get_my_notifications(cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: AsyncSession = Depends(get_async_read_db), current_user: models.User = Depends(get_current_active_user)):
+    # Newest first; ids increase with creation time and share an index with user_id.
+    keyset = Keyset(models.Notification.id, descending=True)
+    statement = select(models.Notification).where(models.Notification.user_id == current_user.id)
+    result = await db.execute(keyset.apply(statement, cursor, limit, skip))
+    return keyset.page(result.scalars().all(), limit)
+
+@router.get("/me/unread-count", response_model=schemas.UnreadCount)
+async def get_my_unread_count(db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    # A single counter row; read from the primary so it reflects the caller's own bulk updates.
+    return {"unread": await db.run_sync(unread_count, current_user.id)}
+
+def _check_selection(selection: schemas.NotificationSelection):
+    if (selection.ids is None) == (selection.before is None):
+        raise HTTPException(status_code=400, detail="Give either ids or before")
+
+@router.post("/me/read", response_model=schemas.NotificationBulkResult)
+def mark_my_notifications_as_read(update: schemas.NotificationBulkUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    # Ids that aren't the caller's, or are already in the requested state, are skipped.
+    _check_selection(update)
+    affected = set_read(db, current_user.id, update.read, ids=update.ids, before=update.before)
+    db.commit()
+    return {"affected": affected, "unread": unread_count(db, current_user.id)}
+
+@router.post("/me/delete", response_model=schemas.NotificationBulkResult)
+def delete_my_notifications(selection: schemas.NotificationSelection, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    _check_selection(selection)
+    affected = delete_notifications(db, current_user.id, ids=selection.ids, before=selection.before)
+    db.commit()
+    return {"affected": affected, "unread": unread_count(db, current_user.id)}
 
 @router.put("/{notification_id}/read", response_model=schemas.Notification)
 def mark_notification_as_read(notification_id: int, update: schemas.NotificationUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
@@ -35,8 +165,7 @@ def mark_notification_as_read(notification_id: int, update: schemas.Notification
     if db_notification.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this notification")
     
-    db_notification.read = update.read
-    db.add(db_notification)
+    set_read(db, current_user.id, update.read, ids=[notification_id])
     db.commit()
     db.refresh(db_notification)
     return db_notification
@@ -50,6 +179,6 @@ def delete_notification(notification_id: int, db: Session = Depends(get_db), cur
     if db_notification.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this notification")
     
-    db.delete(db_notification)
+    delete_notifications(db, current_user.id, ids=[notification_id])
     db.commit()
     return
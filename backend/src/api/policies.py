@@ -1,19 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from backend.src.api.auth_api import get_current_active_user, get_current_admin_user, get_current_editor_user, get_current_reviewer_user
-from backend.src.api.auth_api import get_current_active_user, get_current_admin_user, get_current_editor_user, get_current_reviewer_user
-from backend.src.models.policy import Notification as NotificationModel # Alias to avoid conflict
-from backend.src.database import get_db
+import itertools
+import json
+import mimetypes
+import os
+import re
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, noload, selectinload
+from sqlalchemy import func, literal_column, select, update
+from typing import List, Optional, Tuple
+from backend.src.database import AsyncReadSessionLocal, SessionLocal, get_db, get_read_db, get_async_db, get_async_read_db
 from backend.src.models import policy as models
 from backend.src.schemas import policy as schemas
-from backend.src.api.auth_api import get_current_active_user, get_current_admin_user
+from backend.src.core.pagination import PAGE_MAX_LIMIT, Keyset
+from backend.src.core.search import PostgresSearchBackend, SearchUnavailable, search_backend
+from backend.src.core.storage import UPLOAD_MAX_BYTES, InvalidUpload, OutsideContentRoot, RangeFileResponse, UploadTooLarge, parse_range, resolve, store_multipart
+from backend.src.core.chunking import CHUNK_AVG_BYTES, CHUNK_MAX_BYTES, CHUNK_MIN_BYTES, GEAR, ChunkedFile, ChunkedRangeResponse, is_chunk_hash, manifest_query, new_chunked_blob, record_chunks, store_chunk, store_stream_chunked, verify_manifest
+from backend.src.core.conditional import IMMUTABLE, conditional_get, etag_matches, is_not_modified, make_etag
+from backend.src.core.outbox import enqueue_notification
+from backend.src.core.read_cache import DOCUMENT_TYPES_KEY, policy_key, read_cache
+from backend.src.core.diff import content_key, diff_engine, iter_chunks
+from backend.src.core.bulk_import import LineTooLong, RequestStreamingResponse, iter_ndjson_lines, parse_policy_import, import_policy_batch
+from backend.src.api.auth_api import get_current_active_user, get_current_admin_user, get_current_editor_user, get_current_reviewer_user
 
 router = APIRouter(
     prefix="/policies",
     tags=["Policies"]
 )
-def create_document_type(doc_type: schemas.DocumentTypeCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
+
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "500")) # Records per transaction
+BULK_IMPORT_MAX_LINE_BYTES = int(os.getenv("BULK_IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
+
+@router.get("/cache/stats")
+async def read_cache_stats(current_user: models.User = Depends(get_current_admin_user)):
+    return read_cache.stats()
+
 # --- Document Types CRUD ---
 
 @router.post("/document-types/", response_model=schemas.DocumentType, status_code=status.HTTP_201_CREATED)
@@ -23,243 +47,437 @@ def create_document_type(doc_type: schemas.DocumentTypeCreate, db: Session = Dep
         raise HTTPException(status_code=400, detail="Document type with this name already exists")
     db_doc_type = models.DocumentType(name=doc_type.name, description=doc_type.description)
     db.add(db_doc_type)
-def create_content_blob(content_blob: schemas.ContentBlobCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    db.commit()
     db.refresh(db_doc_type)
     return db_doc_type
 
-@router.get("/document-types/", response_model=List[schemas.DocumentType])
-def read_document_types(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    doc_types = db.query(models.DocumentType).offset(skip).limit(limit).all()
-    return doc_types
+@router.get("/document-types/", response_model=schemas.Page[schemas.DocumentType])
+async def read_document_types(request: Request, response: Response, cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    # The whole (short) list is cached and paged here. Cache fills read the
+    # primary so they can't pick up a replica's pre-write rows.
+    async def load():
+        result = await db.execute(select(models.DocumentType).order_by(models.DocumentType.id))
+        return [schemas.DocumentType.from_orm(doc_type) for doc_type in result.scalars()]
+
+    doc_types = await read_cache.get_or_load(DOCUMENT_TYPES_KEY, load)
+    # Document types are only ever added, so the count and highest id identify the list's state.
+    etag = make_etag("document-types", len(doc_types), doc_types[-1].id if doc_types else None, cursor, skip, limit)
+    not_modified = conditional_get(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+    keyset = Keyset(models.DocumentType.id)
+    if cursor:
+        after = keyset.decode(cursor)[0]
+        rows = [doc_type for doc_type in doc_types if doc_type.id > after]
+    else:
+        rows = doc_types[skip:]
+    return keyset.page(rows[:limit + 1], limit)
 
 @router.get("/document-types/{doc_type_id}", response_model=schemas.DocumentType)
-def read_document_type(doc_type_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+def read_document_type(doc_type_id: int, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
     db_doc_type = db.query(models.DocumentType).filter(models.DocumentType.id == doc_type_id).first()
     if db_doc_type is None:
         raise HTTPException(status_code=404, detail="Document type not found")
     return db_doc_type
-def create_policy(policy: schemas.PolicyCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_editor_user)):
-# --- Content Blobs CRUD (Simplified for MVP) ---
 
-@router.post("/content-blobs/", response_model=schemas.ContentBlob, status_code=status.HTTP_201_CREATED)
-def create_content_blob(content_blob: schemas.ContentBlobCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    # In a real application, file upload logic would be here.
-    # For MVP, we're just storing the path and metadata.
-    db_content_blob = models.ContentBlob(**content_blob.dict())
-    db.refresh(db_policy)
+# --- Content Blobs CRUD (Simplified for MVP) ---
 
-    # Create a notification for the creator
-    db_notification = NotificationModel(user_id=current_user.id, message=f"You created a new policy: {db_policy.title}")
-    db.add(db_notification)
-    db.commit()
-    db.refresh(db_notification)
+def _guess_mime_type(mime_type: Optional[str], filename: Optional[str]) -> Optional[str]:
+    if (not mime_type or mime_type == "application/octet-stream") and filename:
+        return mimetypes.guess_type(filename)[0] or mime_type
+    return mime_type
+
+def _existing_chunked_blob(db: Session, file_hash: str) -> Optional[models.ContentBlob]:
+    return db.query(models.ContentBlob).filter(
+        models.ContentBlob.file_hash == file_hash,
+        models.ContentBlob.storage == "chunks",
+    ).order_by(models.ContentBlob.id).first()
+
+def _save_uploaded_blob(stored: ChunkedFile) -> Tuple[models.ContentBlob, bool]:
+    with SessionLocal() as db:
+        # Identical content is stored once, so an existing blob for it is returned as is.
+        db_content_blob = _existing_chunked_blob(db, stored.file_hash)
+        if db_content_blob is not None:
+            return db_content_blob, False
+        record_chunks(db, stored.chunks)
+        db_content_blob = new_chunked_blob(stored.file_hash, stored.chunks, _guess_mime_type(stored.mime_type, stored.filename))
+        db.add(db_content_blob)
+        db.commit()
+        db.refresh(db_content_blob)
+        return db_content_blob, True
+
+@router.post("/content-blobs/upload", response_model=schemas.ContentBlob, status_code=status.HTTP_201_CREATED)
+async def upload_content_blob(request: Request, response: Response, filename: Optional[str] = None, current_user: models.User = Depends(get_current_active_user)):
+    """Upload a file as a multipart/form-data file part or as the raw request body.
+
+    The body is streamed to a temporary file while its SHA-256 and size are
+    computed, so it is never held in memory, and then split into
+    content-defined chunks off the event loop; chunks already stored by
+    earlier uploads are shared. Re-uploading content that is already stored
+    returns the existing blob with 200 instead of 201.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {UPLOAD_MAX_BYTES} bytes")
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            stored = await store_multipart(request.stream(), content_type, store=store_stream_chunked)
+        else:
+            stored = await store_stream_chunked(request.stream(), filename, content_type.split(";")[0].strip() or None)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db_content_blob, created = await anyio.to_thread.run_sync(_save_uploaded_blob, stored)
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return db_content_blob
 
-    return db_policy
+# --- Chunked uploads: files split into content-defined chunks, each stored once ---
+
+@router.get("/content-blobs/chunking", response_model=schemas.ChunkingParameters)
+def read_chunking_parameters(current_user: models.User = Depends(get_current_active_user)):
+    """The parameters clients must chunk with for their chunks to match the server's."""
+    return {
+        "algorithm": "fastcdc-gear64",
+        "min_bytes": CHUNK_MIN_BYTES,
+        "avg_bytes": CHUNK_AVG_BYTES,
+        "max_bytes": CHUNK_MAX_BYTES,
+        "gear": [f"{value:016x}" for value in GEAR],
+    }
+
+@router.post("/content-blobs/chunks/missing", response_model=schemas.MissingChunks)
+def find_missing_chunks(payload: schemas.ChunkHashes, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    """Return which of ``hashes`` the server doesn't have, so a client uploads only those."""
+    hashes = [h.lower() for h in payload.hashes]
+    if not all(is_chunk_hash(h) for h in hashes):
+        raise HTTPException(status_code=400, detail="Chunk hashes must be hex SHA-256 digests")
+    # Read from the primary: chunks uploaded a moment ago must count as present.
+    known = set(db.execute(select(models.ContentChunk.hash).where(models.ContentChunk.hash.in_(set(hashes)))).scalars())
+    return {"missing": list(dict.fromkeys(h for h in hashes if h not in known))}
+
+def _record_chunk(chunk_hash: str, size: int) -> bool:
+    with SessionLocal() as db:
+        if db.get(models.ContentChunk, chunk_hash) is not None:
+            return False
+        db.add(models.ContentChunk(hash=chunk_hash, size_bytes=size))
+        try:
+            db.commit()
+        except IntegrityError: # Uploaded concurrently by another client
+            db.rollback()
+            return False
+        return True
+
+@router.put("/content-blobs/chunks/{chunk_hash}", response_model=schemas.ContentChunk, status_code=status.HTTP_201_CREATED)
+async def upload_content_chunk(chunk_hash: str, request: Request, response: Response, current_user: models.User = Depends(get_current_active_user)):
+    """Store one chunk; the body must hash to ``chunk_hash``. Existing chunks return 200."""
+    chunk_hash = chunk_hash.lower()
+    if not is_chunk_hash(chunk_hash):
+        raise HTTPException(status_code=400, detail="Chunk hashes must be hex SHA-256 digests")
+    data = bytearray()
+    async for part in request.stream():
+        data += part
+        if len(data) > CHUNK_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Chunks are at most {CHUNK_MAX_BYTES} bytes")
+    try:
+        await anyio.to_thread.run_sync(store_chunk, bytes(data), chunk_hash)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not await anyio.to_thread.run_sync(_record_chunk, chunk_hash, len(data)):
+        response.status_code = status.HTTP_200_OK
+    return {"hash": chunk_hash, "size_bytes": len(data)}
+
+@router.post("/content-blobs/chunked", response_model=schemas.ContentBlob, status_code=status.HTTP_201_CREATED)
+def create_chunked_content_blob(payload: schemas.ChunkedContentBlobCreate, response: Response, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    """Create a content blob from chunks already on the server, listed in file order.
+
+    Missing chunks are reported with 409 so the client can upload them and
+    retry. The chunks are read back to check the whole file against
+    ``file_hash`` before the blob is created; a chunked blob with the same
+    hash is returned as is with 200.
+    """
+    chunk_hashes = [h.lower() for h in payload.chunks]
+    file_hash = payload.file_hash.lower()
+    if not is_chunk_hash(file_hash) or not all(is_chunk_hash(h) for h in chunk_hashes):
+        raise HTTPException(status_code=400, detail="Hashes must be hex SHA-256 digests")
+    sizes = dict(db.execute(
+        select(models.ContentChunk.hash, models.ContentChunk.size_bytes).where(models.ContentChunk.hash.in_(set(chunk_hashes)))
+    ).all())
+    missing = list(dict.fromkeys(h for h in chunk_hashes if h not in sizes))
+    if missing:
+        raise HTTPException(status_code=409, detail={"message": "Upload the missing chunks first", "missing": missing})
+    if sum(sizes[h] for h in chunk_hashes) > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {UPLOAD_MAX_BYTES} bytes")
+
+    db_content_blob = _existing_chunked_blob(db, file_hash)
+    if db_content_blob is not None:
+        response.status_code = status.HTTP_200_OK
+        return db_content_blob
+
+    actual_hash, size = verify_manifest(chunk_hashes)
+    if actual_hash != file_hash:
+        raise HTTPException(status_code=400, detail="file_hash does not match the assembled chunks")
+    db_content_blob = new_chunked_blob(file_hash, [(h, sizes[h]) for h in chunk_hashes], _guess_mime_type(payload.mime_type, payload.filename))
+    db.add(db_content_blob)
     db.commit()
     db.refresh(db_content_blob)
     return db_content_blob
 
+@router.api_route("/content-blobs/{content_blob_id}/content", methods=["GET", "HEAD"], response_class=RangeFileResponse)
+async def download_content_blob(content_blob_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db), current_user: models.User = Depends(get_current_active_user)):
+    """Download a stored file; a single ``Range: bytes=...`` request gets 206 with that slice.
+
+    Files with a hash get it as a strong ETag and are cacheable forever:
+    If-None-Match is answered with 304, and a Range request whose If-Range
+    doesn't match gets the whole file.
+    """
+    db_content_blob = await db.get(models.ContentBlob, content_blob_id)
+    if db_content_blob is None:
+        raise HTTPException(status_code=404, detail="Content blob not found")
+    headers = {}
+    range_header = request.headers.get("range")
+    if db_content_blob.file_hash:
+        etag = f'"{db_content_blob.file_hash}"'
+        headers = {"ETag": etag, "Cache-Control": IMMUTABLE}
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        if_range = request.headers.get("if-range")
+        if if_range is not None and not etag_matches(if_range, etag, weak=False):
+            range_header = None
+    if db_content_blob.storage == "chunks":
+        chunks = (await db.execute(manifest_query(content_blob_id))).all()
+        size = sum(chunk.size_bytes for chunk in chunks)
+    else:
+        try:
+            path = resolve(db_content_blob.file_path)
+            size = (await anyio.to_thread.run_sync(os.stat, path)).st_size
+        except (OutsideContentRoot, FileNotFoundError, NotADirectoryError):
+            raise HTTPException(status_code=404, detail="Content blob file not found")
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    if db_content_blob.storage == "chunks":
+        return ChunkedRangeResponse(chunks, size, byte_range, media_type=db_content_blob.mime_type, headers=headers)
+    return RangeFileResponse(path, size, byte_range, media_type=db_content_blob.mime_type, headers=headers)
+
 @router.get("/content-blobs/{content_blob_id}", response_model=schemas.ContentBlob)
-def read_content_blob(content_blob_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-def update_policy(policy_id: int, policy_update: schemas.PolicyUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_editor_user)):
+def read_content_blob(content_blob_id: int, request: Request, response: Response, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    db_content_blob = db.query(models.ContentBlob).filter(models.ContentBlob.id == content_blob_id).first()
     if db_content_blob is None:
         raise HTTPException(status_code=404, detail="Content blob not found")
+    # Blob metadata never changes once created.
+    not_modified = conditional_get(request, response, make_etag("content-blob", content_blob_id), db_content_blob.uploaded_at, IMMUTABLE)
+    if not_modified is not None:
+        return not_modified
     return db_content_blob
 
-# --- Policies CRUD ---
-
-@router.post("/", response_model=schemas.Policy, status_code=status.HTTP_201_CREATED)
-def create_policy(policy: schemas.PolicyCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    db_policy = models.Policy(**policy.dict(), created_by=current_user.id)
-    db.add(db_policy)
-    db.commit()
-    db.refresh(db_policy)
-    return db_policy
-
-@router.get("/", response_model=List[schemas.Policy])
-def read_policies(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    policies = db.query(models.Policy).offset(skip).limit(limit).all()
-    return policies
-
-@router.get("/{policy_id}", response_model=schemas.Policy)
-def read_policy(policy_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    current_user: models.User = Depends(get_current_editor_user)
-    if db_policy is None:
-        raise HTTPException(status_code=404, detail="Policy not found")
-    return db_policy
-
-@router.put("/{policy_id}", response_model=schemas.Policy)
-def update_policy(policy_id: int, policy_update: schemas.PolicyUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    db_policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
-    if db_policy is None:
-        raise HTTPException(status_code=404, detail="Policy not found")
-
-    update_data = policy_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_policy, key, value)
-
-    db.add(db_policy)
-    db.commit()
-    db.refresh(db_policy)
-    return db_policy
+# --- Search ---
 
-@router.delete("/{policy_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_policy(policy_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
-    db_policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
-    if db_policy is None:
-        raise HTTPException(status_code=404, detail="Policy not found")
-    db.delete(db_policy)
-    db.commit()
-    return
-    db.refresh(db_policy)
+_TS_SIMPLE_CONFIG = literal_column("'simple'::regconfig") # Must match ix_policies_title_words
 
-    # Create a notification for the policy creator about new version
-    db_notification = NotificationModel(user_id=db_policy.created_by, message=f"A new version ({db_policy_version.version_number}) of your policy '{db_policy.title}' has been created.")
-    db.add(db_notification)
-    db.commit()
-    db.refresh(db_notification)
-
-    return db_policy_version
-# --- Policy Versions CRUD ---
-
-@router.post("/{policy_id}/versions/", response_model=schemas.PolicyVersion, status_code=status.HTTP_201_CREATED)
-def create_policy_version(
-    policy_id: int,
-    policy_version: schemas.PolicyVersionCreate,
-    db: Session = Depends(get_db),
+@router.get("/search/", response_model=schemas.Page[schemas.PolicySearchHit])
+async def search_policies(
+    query: str,
+    status: Optional[str] = None,
+    document_type_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    db_policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
-    if db_policy is None:
-        raise HTTPException(status_code=404, detail="Policy not found")
-
-    # Determine next version number
-    last_version = db.query(models.PolicyVersion).filter(models.PolicyVersion.policy_id == policy_id).order_by(models.PolicyVersion.version_number.desc()).first()
-    new_version_number = (last_version.version_number + 1) if last_version else 1
-
-    db_policy_version = models.PolicyVersion(
-        **policy_version.dict(),
-        policy_id=policy_id,
-        version_number=new_version_number,
-        created_by=current_user.id
-    )
-    db.add(db_policy_version)
-    db.commit()
-    db.refresh(db_policy_version)
-
-    # Update the policy's current_version_id
-    db_policy.current_version_id = db_policy_version.id
-    db.add(db_policy)
-    db.commit()
-    db.refresh(db_policy)
-
-    return db_policy_version
-
-@router.get("/{policy_id}/versions/", response_model=List[schemas.PolicyVersion])
-def read_policy_versions(policy_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    versions = db.query(models.PolicyVersion).filter(models.PolicyVersion.policy_id == policy_id).offset(skip).limit(limit).all()
-    return versions
-
-@router.get("/{policy_id}/versions/{version_id}", response_model=schemas.PolicyVersion)
-def read_policy_version(policy_id: int, version_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    db_version = db.query(models.PolicyVersion).filter(
-@router.get("/search/", response_model=List[schemas.Policy])
-def search_policies(query: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    if not query:
+    if not query.strip():
         raise HTTPException(status_code=400, detail="Search query cannot be empty")
-    
-    # Use PostgreSQL's full-text search
-    search_term = func.plainto_tsquery('english', query)
-    policies = db.query(models.Policy).filter(
-        models.Policy.search_vector.op('@@')(search_term)
-    ).offset(skip).limit(limit).all()
-    
-    return policies
-        models.PolicyVersion.id == version_id
-    ).first()
-    if db_version is None:
-        raise HTTPException(status_code=404, detail="Policy version not found")
-    return db_version
-
-    tags=["Policies"]
-)
-
-# Helper to get user (placeholder for actual auth)
-def get_current_user_id():
-    # In a real app, this would come from an authentication token
-    return 1 # Assuming admin user for now
-
-# --- Document Types CRUD ---
-
-@router.post("/document-types/", response_model=schemas.DocumentType, status_code=status.HTTP_201_CREATED)
-def create_document_type(doc_type: schemas.DocumentTypeCreate, db: Session = Depends(get_db)):
-    db_doc_type = models.DocumentType(name=doc_type.name, description=doc_type.description)
-    db.add(db_doc_type)
-    db.commit()
-    db.refresh(db_doc_type)
-    return db_doc_type
-
-@router.get("/document-types/", response_model=List[schemas.DocumentType])
-def read_document_types(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    doc_types = db.query(models.DocumentType).offset(skip).limit(limit).all()
-    return doc_types
-
-@router.get("/document-types/{doc_type_id}", response_model=schemas.DocumentType)
-def read_document_type(doc_type_id: int, db: Session = Depends(get_db)):
-    db_doc_type = db.query(models.DocumentType).filter(models.DocumentType.id == doc_type_id).first()
-    if db_doc_type is None:
-        raise HTTPException(status_code=404, detail="Document type not found")
-    return db_doc_type
-
-# --- Content Blobs CRUD (Simplified for MVP) ---
-
-@router.post("/content-blobs/", response_model=schemas.ContentBlob, status_code=status.HTTP_201_CREATED)
-def create_content_blob(content_blob: schemas.ContentBlobCreate, db: Session = Depends(get_db)):
-    # In a real application, file upload logic would be here.
-    # For MVP, we're just storing the path and metadata.
-    db_content_blob = models.ContentBlob(**content_blob.dict())
-    db.add(db_content_blob)
-    db.commit()
-    db.refresh(db_content_blob)
-    return db_content_blob
-
-@router.get("/content-blobs/{content_blob_id}", response_model=schemas.ContentBlob)
-def read_content_blob(content_blob_id: int, db: Session = Depends(get_db)):
-    db_content_blob = db.query(models.ContentBlob).filter(models.ContentBlob.id == content_blob_id).first()
-    if db_content_blob is None:
-        raise HTTPException(status_code=404, detail="Content blob not found")
-    return db_content_blob
+    if isinstance(search_backend, PostgresSearchBackend) and db.bind.dialect.name != "postgresql":
+        raise HTTPException(status_code=501, detail="Full-text search with SEARCH_BACKEND=postgres requires PostgreSQL")
+    try:
+        return await search_backend.search(db, query, status, document_type_id, cursor, limit)
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+@router.get("/typeahead/", response_model=List[schemas.PolicyTitleSuggestion])
+async def typeahead_policy_titles(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=25),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    term = prefix.strip().lower()
+    if not term:
+        return []
+    lower_title = func.lower(models.Policy.title)
+    upper_bound = term[:-1] + chr(ord(term[-1]) + 1)
+    postgresql = db.bind.dialect.name == "postgresql"
+
+    # Titles starting with the input, as a range scan read in index order: the
+    # ~>=~/~<~ operators and ORDER BY ... USING ~<~ belong to the text_pattern_ops
+    # index, so no sort is needed and generic plans can still use the index.
+    statement = select(models.Policy.id, models.Policy.title)
+    if postgresql:
+        statement = statement.where(lower_title.op("~>=~")(term), lower_title.op("~<~")(upper_bound))
+        statement = statement.order_by(lower_title.op("USING")(literal_column("~<~")))
+    else:
+        statement = statement.where(lower_title >= term, lower_title < upper_bound).order_by(lower_title)
+    suggestions = (await db.execute(statement.limit(limit))).all()
+
+    # Then titles with a word starting with each input word.
+    words = re.findall(r"\w+", term)
+    if len(suggestions) < limit and words:
+        if postgresql:
+            ts_query = func.to_tsquery(_TS_SIMPLE_CONFIG, " & ".join(f"{word}:*" for word in words))
+            matches_words = func.to_tsvector(_TS_SIMPLE_CONFIG, models.Policy.title).op("@@")(ts_query)
+        else:
+            matches_words = lower_title.contains(" " + term, autoescape=True)
+        statement = (
+            select(models.Policy.id, models.Policy.title)
+            .where(matches_words, models.Policy.id.notin_([s.id for s in suggestions]))
+            .order_by(lower_title)
+            .limit(limit - len(suggestions))
+        )
+        suggestions += (await db.execute(statement)).all()
+    return [{"id": s.id, "title": s.title} for s in suggestions]
 
 # --- Policies CRUD ---
 
+# schemas.Policy nests these relationships. Clients choose which to embed with
+# ?expand= (default: all of them) and which scalar fields to return with ?fields=.
+POLICY_RELATIONS = ("document_type", "current_version", "versions")
+POLICY_FIELDS = frozenset(schemas.Policy.__fields__) - set(POLICY_RELATIONS)
+
+def _parse_field_list(value: Optional[str], allowed, param: str):
+    if value is None:
+        return None
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown {param}: {', '.join(sorted(unknown))}")
+    return names
+
+def _policy_projection(fields: Optional[str], expand: Optional[str]):
+    expanded = _parse_field_list(expand, POLICY_RELATIONS, "expand")
+    if expanded is None:
+        expanded = set(POLICY_RELATIONS)
+    selected = _parse_field_list(fields, POLICY_FIELDS, "fields") or set(POLICY_FIELDS)
+    return selected | {"id"}, expanded
+
+def _policy_load_options(expanded):
+    # Async sessions can't lazy-load, and a lazy load per row is an N+1 anyway:
+    # many-to-one relations are joined into the main query, the versions
+    # collection is fetched in one extra IN query, and unrequested relations
+    # are never loaded.
+    options = []
+    for name in POLICY_RELATIONS:
+        relationship = getattr(models.Policy, name)
+        if name not in expanded:
+            options.append(noload(relationship))
+        elif name == "versions":
+            options.append(selectinload(relationship))
+        else:
+            options.append(joinedload(relationship))
+    return options
+
+def _policy_out(db_policy: models.Policy, selected, expanded) -> schemas.PolicyView:
+    return _policy_view(schemas.Policy.from_orm(db_policy), selected, expanded)
+
+def _policy_view(full: schemas.Policy, selected, expanded) -> schemas.PolicyView:
+    return schemas.PolicyView(**{key: getattr(full, key) for key in selected | expanded})
+
 @router.post("/", response_model=schemas.Policy, status_code=status.HTTP_201_CREATED)
-def create_policy(policy: schemas.PolicyCreate, db: Session = Depends(get_db), current_user_id: int = Depends(get_current_user_id)):
-    db_policy = models.Policy(**policy.dict(), created_by=current_user_id)
+def create_policy(policy: schemas.PolicyCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_editor_user)):
+    db_policy = models.Policy(**policy.dict(), created_by=current_user.id)
     db.add(db_policy)
+    # Notify the creator; the outbox event commits with the policy and is delivered in the background.
+    enqueue_notification(db, current_user.id, f"You created a new policy: {db_policy.title}")
     db.commit()
     db.refresh(db_policy)
-
-    # Create an initial policy version if content is provided
-    if policy.current_version_id: # This is a bit of a hack for initial creation, will be refined
-        # For now, current_version_id should be None on creation, versions are added separately
-        pass
-
     return db_policy
 
-@router.get("/", response_model=List[schemas.Policy])
-def read_policies(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    policies = db.query(models.Policy).offset(skip).limit(limit).all()
-    return policies
-
-@router.get("/{policy_id}", response_model=schemas.Policy)
-def read_policy(policy_id: int, db: Session = Depends(get_db)):
-    db_policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
-    if db_policy is None:
+@router.post("/bulk-import", response_class=RequestStreamingResponse)
+async def bulk_import_policies(request: Request, current_user: models.User = Depends(get_current_editor_user)):
+    """Import policies with their versions from an NDJSON body.
+
+    Each line is a schemas.PolicyImport; versions refer to content blobs
+    uploaded beforehand by ``content_blob_id``. The body is parsed as it
+    arrives and inserted in transactions of BULK_IMPORT_BATCH_SIZE records;
+    the response streams one NDJSON result per input line, then a summary
+    line.
+    """
+    user_id = current_user.id
+
+    def run_batch(batch):
+        with SessionLocal() as db:
+            return import_policy_batch(db, batch, user_id)
+
+    async def results():
+        created = failed = 0
+        batch = []
+
+        async def flush():
+            nonlocal created, failed
+            outcomes = await anyio.to_thread.run_sync(run_batch, list(batch))
+            batch.clear()
+            created += sum(o["status"] == "created" for o in outcomes)
+            failed += sum(o["status"] == "error" for o in outcomes)
+            return "".join(json.dumps(o) + "\n" for o in outcomes)
+
+        async for line_number, line in iter_ndjson_lines(request.stream(), BULK_IMPORT_MAX_LINE_BYTES):
+            try:
+                if isinstance(line, LineTooLong):
+                    raise line
+                batch.append((line_number, parse_policy_import(line)))
+            except ValueError as e:
+                failed += 1
+                yield json.dumps({"line": line_number, "ref": None, "status": "error", "detail": str(e)}) + "\n"
+                continue
+            if len(batch) >= BULK_IMPORT_BATCH_SIZE:
+                yield await flush()
+        if batch:
+            yield await flush()
+        yield json.dumps({"status": "done", "created": created, "failed": failed}) + "\n"
+
+    return RequestStreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.get("/", response_model=schemas.Page[schemas.PolicyView], response_model_exclude_unset=True)
+async def read_policies(cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), fields: Optional[str] = None, expand: Optional[str] = None, db: AsyncSession = Depends(get_async_read_db), current_user: models.User = Depends(get_current_active_user)):
+    selected, expanded = _policy_projection(fields, expand)
+    keyset = Keyset(models.Policy.id)
+    statement = select(models.Policy).options(*_policy_load_options(expanded))
+    result = await db.execute(keyset.apply(statement, cursor, limit, skip))
+    page = keyset.page(result.scalars().all(), limit)
+    page["items"] = [_policy_out(p, selected, expanded) for p in page["items"]]
+    return page
+
+@router.get("/{policy_id}", response_model=schemas.PolicyView, response_model_exclude_unset=True)
+async def read_policy(policy_id: int, request: Request, response: Response, fields: Optional[str] = None, expand: Optional[str] = None, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    selected, expanded = _policy_projection(fields, expand)
+
+    # The full representation is cached with a hash of it and projected per
+    # request. Cache fills read the primary so they can't pick up a replica's
+    # pre-write row. The ETag hashes the representation itself rather than
+    # updated_at: timestamps have a one-second resolution on SQLite, so two
+    # writes in the same second would otherwise share a validator.
+    async def load():
+        result = await db.execute(select(models.Policy).options(*_policy_load_options(set(POLICY_RELATIONS))).where(models.Policy.id == policy_id))
+        db_policy = result.scalars().first()
+        if db_policy is None:
+            return None
+        full = schemas.Policy.from_orm(db_policy)
+        return full, make_etag("policy", full.json())
+
+    cached = await read_cache.get_or_load(policy_key(policy_id), load)
+    if cached is None:
         raise HTTPException(status_code=404, detail="Policy not found")
-    return db_policy
+    full, full_etag = cached
+    last_modified = full.updated_at or full.created_at
+    etag = make_etag(full_etag, sorted(selected), sorted(expanded))
+    not_modified = conditional_get(request, response, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    return _policy_view(full, selected, expanded)
 
 @router.put("/{policy_id}", response_model=schemas.Policy)
-def update_policy(policy_id: int, policy_update: schemas.PolicyUpdate, db: Session = Depends(get_db)):
+def update_policy(policy_id: int, policy_update: schemas.PolicyUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_editor_user)):
     db_policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
     if db_policy is None:
         raise HTTPException(status_code=404, detail="Policy not found")
@@ -274,7 +492,7 @@ def update_policy(policy_id: int, policy_update: schemas.PolicyUpdate, db: Sessi
     return db_policy
 
 @router.delete("/{policy_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_policy(policy_id: int, db: Session = Depends(get_db)):
+def delete_policy(policy_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
     db_policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
     if db_policy is None:
         raise HTTPException(status_code=404, detail="Policy not found")
@@ -289,45 +507,119 @@ def create_policy_version(
     policy_id: int,
     policy_version: schemas.PolicyVersionCreate,
     db: Session = Depends(get_db),
-    current_user_id: int = Depends(get_current_user_id)
+    current_user: models.User = Depends(get_current_editor_user)
 ):
-    db_policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
-    if db_policy is None:
+    # Allocate the next version number by incrementing the policy's counter. The
+    # UPDATE row-locks the policy until commit, so concurrent editors queue here
+    # and get consecutive numbers; the version, the current_version_id pointer
+    # and the notification are written in the same transaction.
+    allocated = db.execute(
+        update(models.Policy)
+        .where(models.Policy.id == policy_id)
+        .values(version_counter=models.Policy.version_counter + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if allocated.rowcount == 0:
+        db.rollback()
         raise HTTPException(status_code=404, detail="Policy not found")
-
-    # Determine next version number
-    last_version = db.query(models.PolicyVersion).filter(models.PolicyVersion.policy_id == policy_id).order_by(models.PolicyVersion.version_number.desc()).first()
-    new_version_number = (last_version.version_number + 1) if last_version else 1
+    new_version_number, title, created_by = db.execute(
+        select(models.Policy.version_counter, models.Policy.title, models.Policy.created_by).where(models.Policy.id == policy_id)
+    ).one()
 
     db_policy_version = models.PolicyVersion(
         **policy_version.dict(),
         policy_id=policy_id,
         version_number=new_version_number,
-        created_by=current_user_id
+        created_by=current_user.id
     )
     db.add(db_policy_version)
-    db.commit()
-    db.refresh(db_policy_version)
+    db.flush()
 
-    # Update the policy's current_version_id
-    db_policy.current_version_id = db_policy_version.id
-    db.add(db_policy)
+    db.execute(
+        update(models.Policy)
+        .where(models.Policy.id == policy_id)
+        .values(current_version_id=db_policy_version.id)
+        .execution_options(synchronize_session=False)
+    )
+
+    # Notify the policy creator about the new version
+    enqueue_notification(db, created_by, f"A new version ({new_version_number}) of your policy '{title}' has been created.")
     db.commit()
-    db.refresh(db_policy)
 
     return db_policy_version
 
-@router.get("/{policy_id}/versions/", response_model=List[schemas.PolicyVersion])
-def read_policy_versions(policy_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    versions = db.query(models.PolicyVersion).filter(models.PolicyVersion.policy_id == policy_id).offset(skip).limit(limit).all()
-    return versions
+@router.get("/{policy_id}/versions/", response_model=schemas.Page[schemas.PolicyVersion])
+async def read_policy_versions(policy_id: int, cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: AsyncSession = Depends(get_async_read_db), current_user: models.User = Depends(get_current_active_user)):
+    keyset = Keyset(models.PolicyVersion.id)
+    statement = select(models.PolicyVersion).where(models.PolicyVersion.policy_id == policy_id)
+    result = await db.execute(keyset.apply(statement, cursor, limit, skip))
+    return keyset.page(result.scalars().all(), limit)
+
+@router.get("/{policy_id}/versions/{version_a_id}/diff/{version_b_id}", response_class=StreamingResponse)
+async def diff_policy_versions(policy_id: int, version_a_id: int, version_b_id: int, db: AsyncSession = Depends(get_async_read_db), current_user: models.User = Depends(get_current_active_user)):
+    """Stream a paragraph- and word-level diff of two versions' extracted text as NDJSON.
+
+    The first line describes both versions; the hunks and a summary line
+    follow (see core/diff.py). Results are cached by the pair of content
+    hashes, so repeated comparisons of the same documents are served from
+    the cache.
+    """
+    result = await db.execute(
+        select(
+            models.PolicyVersion.id,
+            models.PolicyVersion.version_number,
+            models.PolicyVersion.content_blob_id,
+            models.ContentBlob.file_path,
+            models.ContentBlob.file_hash,
+            models.ContentBlob.storage,
+            models.ContentBlob.extracted_at,
+        )
+        .outerjoin(models.ContentBlob, models.ContentBlob.id == models.PolicyVersion.content_blob_id)
+        .where(models.PolicyVersion.policy_id == policy_id, models.PolicyVersion.id.in_([version_a_id, version_b_id]))
+    )
+    versions = {row.id: row for row in result}
+    if version_a_id not in versions or version_b_id not in versions:
+        raise HTTPException(status_code=404, detail="Policy version not found")
+    version_a, version_b = versions[version_a_id], versions[version_b_id]
+    for version in (version_a, version_b):
+        if version.content_blob_id is not None and version.extracted_at is None:
+            raise HTTPException(status_code=409, detail=f"Text extraction for version {version.id} is still pending", headers={"Retry-After": "10"})
+
+    # Runs in a task shared by concurrent requests for the same pair, which
+    # may outlive this one, so it uses its own session.
+    async def load_texts():
+        blob_ids = [v.content_blob_id for v in (version_a, version_b) if v.content_blob_id is not None]
+        texts = {}
+        if blob_ids:
+            async with AsyncReadSessionLocal() as texts_db:
+                texts = dict((await texts_db.execute(
+                    select(models.ContentBlob.id, models.ContentBlob.extracted_text).where(models.ContentBlob.id.in_(blob_ids))
+                )).all())
+        return texts.get(version_a.content_blob_id) or "", texts.get(version_b.content_blob_id) or ""
+
+    key = diff_engine.cache_key(
+        content_key(version_a.content_blob_id, version_a.file_path, version_a.file_hash, version_a.storage),
+        content_key(version_b.content_blob_id, version_b.file_path, version_b.file_hash, version_b.storage),
+    )
+    diff = await diff_engine.diff(key, load_texts)
+    header = json.dumps({
+        "op": "header",
+        "a": {"version_id": version_a.id, "version_number": version_a.version_number},
+        "b": {"version_id": version_b.id, "version_number": version_b.version_number},
+    }) + "\n"
+    return StreamingResponse(itertools.chain([header.encode()], iter_chunks(diff)), media_type="application/x-ndjson")
 
 @router.get("/{policy_id}/versions/{version_id}", response_model=schemas.PolicyVersion)
-def read_policy_version(policy_id: int, version_id: int, db: Session = Depends(get_db)):
-    db_version = db.query(models.PolicyVersion).filter(
+async def read_policy_version(policy_id: int, version_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db), current_user: models.User = Depends(get_current_active_user)):
+    result = await db.execute(select(models.PolicyVersion).where(
         models.PolicyVersion.policy_id == policy_id,
         models.PolicyVersion.id == version_id
-    ).first()
+    ))
+    db_version = result.scalars().first()
     if db_version is None:
         raise HTTPException(status_code=404, detail="Policy version not found")
+    # Versions are immutable once created.
+    not_modified = conditional_get(request, response, make_etag("policy-version", version_id), db_version.created_at, IMMUTABLE)
+    if not_modified is not None:
+        return not_modified
     return db_version
@@ -3,10 +3,10 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Dict, Any
 
-from backend.src.database import get_db
+from backend.src.database import get_db, get_read_db
 from backend.src.models import policy as models
 from backend.src.schemas import policy as schemas
-from backend.src.api.auth_api import get_current_active_user, get_current_admin_user, get_current_editor_user
+from backend.src.api.auth_api import get_current_active_user, get_current_admin_user, get_current_editor_user, get_current_reviewer_user
 
 router = APIRouter(
     prefix="/reports",
@@ -14,20 +14,14 @@ router = APIRouter(
 )
 
 @router.get("/policy-status-summary", response_model=Dict[str, int])
-def get_policy_status_summary(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    # Only allow admin/editor/reviewer to view this report
-    if not any(role.role.name in ["Admin", "Editor", "Reviewer"] for role in current_user.roles):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this report")
-
+def get_policy_status_summary(db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_reviewer_user)):
+    # Admin/editor/reviewer only; the role check reads the primary, the report the replica.
     summary = db.query(models.Policy.status, func.count(models.Policy.id)).group_by(models.Policy.status).all()
     return {status: count for status, count in summary}
 
 @router.get("/attestation-status/{policy_version_id}", response_model=Dict[str, Any])
-def get_attestation_status_for_version(policy_version_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    # Only allow admin/editor/reviewer to view this report
-    if not any(role.role.name in ["Admin", "Editor", "Reviewer"] for role in current_user.roles):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this report")
-
+def get_attestation_status_for_version(policy_version_id: int, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_reviewer_user)):
+    # Admin/editor/reviewer only; the role check reads the primary, the report the replica.
     db_policy_version = db.query(models.PolicyVersion).filter(models.PolicyVersion.id == policy_version_id).first()
     if not db_policy_version:
         raise HTTPException(status_code=404, detail="Policy version not found")
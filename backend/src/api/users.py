@@ -1,39 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from backend.src.api.auth_api import get_current_active_user, get_current_admin_user, get_current_editor_user
-from backend.src.database import get_db
-from backend.src.database import get_db
+from typing import List, Optional
+from backend.src.database import get_async_db, get_db
 from backend.src.models import policy as models
 from backend.src.schemas import policy as schemas
-from backend.src.auth.auth import get_password_hash # Import password hashing utility
+from backend.src.auth.auth import get_password_hash_async, PasswordHashPoolFull # Import password hashing utility
+from backend.src.core.pagination import PAGE_MAX_LIMIT, Keyset
 from backend.src.api.auth_api import get_current_active_user, get_current_admin_user # Import auth dependencies
 
 router = APIRouter(
     prefix="/users",
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
+    tags=["Users"]
 )
 
 @router.post("/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_admin_user)):
+    db_user = (await db.execute(select(models.User).where(models.User.username == user.username))).scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = (await db.execute(select(models.User).where(models.User.email == user.email))).scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await get_password_hash_async(user.password)
+    except PasswordHashPoolFull:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Password hashing is busy, please retry shortly")
     db_user = models.User(username=user.username, email=user.email, password_hash=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-@router.get("/", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
-    users = db.query(models.User).offset(skip).limit(limit).all()
-    return users
+@router.get("/", response_model=schemas.Page[schemas.User])
+def read_users(cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
+    keyset = Keyset(models.User.id)
+    return keyset.page(keyset.apply(db.query(models.User), cursor, limit, skip).all(), limit)
 
 @router.get("/{user_id}", response_model=schemas.User)
 def read_user(user_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
@@ -55,10 +59,10 @@ def create_role(role: schemas.RoleCreate, db: Session = Depends(get_db), current
     db.refresh(db_role)
     return db_role
 
-@router.get("/roles/", response_model=List[schemas.Role])
-def read_roles(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
-    roles = db.query(models.Role).offset(skip).limit(limit).all()
-    return roles
+@router.get("/roles/", response_model=schemas.Page[schemas.Role])
+def read_roles(cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
+    keyset = Keyset(models.Role.id)
+    return keyset.page(keyset.apply(db.query(models.Role), cursor, limit, skip).all(), limit)
 
 @router.get("/roles/{role_id}", response_model=schemas.Role)
 def read_role(role_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_admin_user)):
@@ -66,61 +70,3 @@ def read_role(role_id: int, db: Session = Depends(get_db), current_user: models.
     if db_role is None:
         raise HTTPException(status_code=404, detail="Role not found")
     return db_role
-
-router = APIRouter(
-    prefix="/users",
-    tags=["Users"]
-)
-
-@router.post("/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    hashed_password = get_password_hash(user.password)
-    db_user = models.User(username=user.username, email=user.email, password_hash=hashed_password)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
-
-@router.get("/", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = db.query(models.User).offset(skip).limit(limit).all()
-    return users
-
-@router.get("/{user_id}", response_model=schemas.User)
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
-
-# --- Roles CRUD (for Admin) ---
-
-@router.post("/roles/", response_model=schemas.Role, status_code=status.HTTP_201_CREATED)
-def create_role(role: schemas.RoleCreate, db: Session = Depends(get_db)):
-    db_role = db.query(models.Role).filter(models.Role.name == role.name).first()
-    if db_role:
-        raise HTTPException(status_code=400, detail="Role with this name already exists")
-    db_role = models.Role(name=role.name)
-    db.add(db_role)
-    db.commit()
-    db.refresh(db_role)
-    return db_role
-
-@router.get("/roles/", response_model=List[schemas.Role])
-def read_roles(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    roles = db.query(models.Role).offset(skip).limit(limit).all()
-    return roles
-
-@router.get("/roles/{role_id}", response_model=schemas.Role)
-def read_role(role_id: int, db: Session = Depends(get_db)):
-    db_role = db.query(models.Role).filter(models.Role.id == role_id).first()
-    if db_role is None:
-        raise HTTPException(status_code=404, detail="Role not found")
-    return db_role
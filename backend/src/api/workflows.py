@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+import json
 
-from backend.src.api.auth_api import get_current_active_user, get_current_admin_user, get_current_editor_user, get_current_reviewer_user
-from backend.src.models.policy import Notification as NotificationModel # Alias to avoid conflict
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+
+from backend.src.database import get_db, get_async_read_db
 from backend.src.models import policy as models
 from backend.src.schemas import policy as schemas
+from backend.src.core.deadlines import deadline_scheduler
+from backend.src.core.fanout import ACTIVE, fanout_worker
+from backend.src.core.outbox import enqueue_notification
+from backend.src.core.pagination import PAGE_MAX_LIMIT, Keyset
+from backend.src.core.workflow_runs import StepNotActive, advance_step, instantiate_template
 from backend.src.api.auth_api import get_current_active_user, get_current_admin_user, get_current_editor_user, get_current_reviewer_user
+from backend.src.auth import permissions
+from backend.src.auth.permissions import permission_resolver
 
 router = APIRouter(
     prefix="/workflows",
@@ -27,10 +37,76 @@ def create_workflow(workflow: schemas.WorkflowCreate, db: Session = Depends(get_
     db.refresh(db_workflow)
     return db_workflow
 
-@router.get("/", response_model=List[schemas.Workflow])
-def read_workflows(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    workflows = db.query(models.Workflow).offset(skip).limit(limit).all()
-    return workflows
+@router.get("/", response_model=schemas.Page[schemas.Workflow])
+async def read_workflows(cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: AsyncSession = Depends(get_async_read_db), current_user: models.User = Depends(get_current_active_user)):
+    keyset = Keyset(models.Workflow.id)
+    result = await db.execute(keyset.apply(select(models.Workflow), cursor, limit, skip))
+    return keyset.page(result.scalars().all(), limit)
+
+@router.get("/deadlines/stats")
+async def read_deadline_stats(current_user: models.User = Depends(get_current_admin_user)):
+    return deadline_scheduler.stats()
+
+# --- Workflow templates ---
+
+@router.post("/templates/", response_model=schemas.WorkflowTemplate, status_code=status.HTTP_201_CREATED)
+def create_workflow_template(template: schemas.WorkflowTemplateCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_editor_user)):
+    if db.query(models.WorkflowTemplate).filter(models.WorkflowTemplate.name == template.name).first():
+        raise HTTPException(status_code=400, detail="Workflow template with this name already exists")
+    names = {step.role for step in template.steps if step.role}
+    roles = dict(db.query(models.Role.name, models.Role.id).filter(models.Role.name.in_(names)).all())
+    unknown = sorted(names - set(roles))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown roles: {', '.join(unknown)}")
+
+    db_template = models.WorkflowTemplate(
+        name=template.name,
+        description=template.description,
+        created_by=current_user.id,
+        steps=[
+            models.WorkflowTemplateStep(step_order=step.step_order, name=step.name, assigned_to_role_id=roles.get(step.role),
+                                        due_offset_hours=step.due_offset_hours)
+            for step in sorted(template.steps, key=lambda step: step.step_order)
+        ],
+    )
+    db.add(db_template)
+    db.commit()
+    db.refresh(db_template)
+    return db_template
+
+@router.get("/templates/", response_model=schemas.Page[schemas.WorkflowTemplate])
+def read_workflow_templates(cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    keyset = Keyset(models.WorkflowTemplate.id)
+    query = db.query(models.WorkflowTemplate).options(selectinload(models.WorkflowTemplate.steps))
+    return keyset.page(keyset.apply(query, cursor, limit, skip).all(), limit)
+
+@router.get("/templates/{template_id}", response_model=schemas.WorkflowTemplate)
+def read_workflow_template(template_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    db_template = db.query(models.WorkflowTemplate).filter(models.WorkflowTemplate.id == template_id).first()
+    if db_template is None:
+        raise HTTPException(status_code=404, detail="Workflow template not found")
+    return db_template
+
+@router.post("/templates/{template_id}/instantiate", response_model=List[schemas.Workflow], status_code=status.HTTP_201_CREATED)
+def instantiate_workflow_template(template_id: int, request: schemas.WorkflowTemplateInstantiate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_editor_user)):
+    """Start the template's workflow on every policy in ``policy_ids``, in one transaction.
+
+    Either all the workflows and their steps are created or, if any policy
+    doesn't exist, none are. Returns the workflows in ``policy_ids`` order.
+    """
+    db_template = db.query(models.WorkflowTemplate).filter(models.WorkflowTemplate.id == template_id).first()
+    if db_template is None:
+        raise HTTPException(status_code=404, detail="Workflow template not found")
+    policy_ids = list(dict.fromkeys(request.policy_ids))
+    policies = {row.id: row for row in db.query(models.Policy.id, models.Policy.title).filter(models.Policy.id.in_(policy_ids))}
+    missing = [str(policy_id) for policy_id in policy_ids if policy_id not in policies]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Policies not found: {', '.join(missing)}")
+
+    workflows = instantiate_template(db, db_template, [policies[policy_id] for policy_id in policy_ids], request.name)
+    workflow_ids = [workflow.id for workflow in workflows]
+    db.commit()
+    return db.query(models.Workflow).filter(models.Workflow.id.in_(workflow_ids)).order_by(models.Workflow.id).all()
 
 @router.get("/{workflow_id}", response_model=schemas.Workflow)
 def read_workflow(workflow_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
@@ -53,10 +129,34 @@ def create_workflow_step(workflow_id: int, step: schemas.WorkflowStepCreate, db:
     db.refresh(db_workflow_step)
     return db_workflow_step
 
-@router.get("/{workflow_id}/steps/", response_model=List[schemas.WorkflowStep])
-def read_workflow_steps(workflow_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    steps = db.query(models.WorkflowStep).filter(models.WorkflowStep.workflow_id == workflow_id).offset(skip).limit(limit).all()
-    return steps
+@router.get("/{workflow_id}/steps/", response_model=schemas.Page[schemas.WorkflowStep])
+async def read_workflow_steps(workflow_id: int, cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: AsyncSession = Depends(get_async_read_db), current_user: models.User = Depends(get_current_active_user)):
+    keyset = Keyset(models.WorkflowStep.step_order, models.WorkflowStep.id)
+    statement = select(models.WorkflowStep).where(models.WorkflowStep.workflow_id == workflow_id)
+    result = await db.execute(keyset.apply(statement, cursor, limit, skip))
+    return keyset.page(result.scalars().all(), limit)
+
+@router.post("/steps/{step_id}/advance", response_model=schemas.WorkflowAdvance)
+def advance_workflow_step(step_id: int, advance: schemas.WorkflowStepAdvance, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    """Complete, approve or reject a step; the next step_order starts once every step of this one is done."""
+    db_step = db.query(models.WorkflowStep).filter(models.WorkflowStep.id == step_id).first()
+    if db_step is None:
+        raise HTTPException(status_code=404, detail="Workflow step not found")
+    # The assignee, any member of the assigned role, or an editor.
+    assigned = db_step.assigned_to_user_id == current_user.id or (
+        db_step.assigned_to_role_id is not None and db.get(models.UserRole, (current_user.id, db_step.assigned_to_role_id)) is not None
+    )
+    if not assigned and not permission_resolver.has_any(db, current_user.id, permissions.EDITOR_OR_ADMIN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not assigned to this step")
+
+    try:
+        workflow, step, activated = advance_step(db, step_id, advance.outcome)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Workflow step not found")
+    except StepNotActive as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    db.commit()
+    return {"workflow": workflow, "step": step, "activated": activated}
 
 # --- Attestation CRUD ---
 
@@ -76,27 +176,23 @@ def create_attestation(attestation: schemas.AttestationCreate, db: Session = Dep
     ).first()
     if existing_attestation:
         raise HTTPException(status_code=409, detail="User has already attested to this policy version")
-    db.refresh(db_attestation)
-
-    # Create a notification for the user who attested
-    db_notification = NotificationModel(user_id=current_user.id, message=f"You have successfully attested to policy version {db_policy_version.version_number} of '{db_policy_version.policy.title}'.")
-    db.add(db_notification)
-    db.commit()
-    db.refresh(db_notification)
 
-    return db_attestation
     db_attestation = models.Attestation(**attestation.dict())
     db.add(db_attestation)
+    # Notify the user who attested, in the same transaction via the outbox.
+    enqueue_notification(db, current_user.id, f"You have successfully attested to policy version {db_policy_version.version_number} of '{db_policy_version.policy.title}'.")
     db.commit()
     db.refresh(db_attestation)
     return db_attestation
 
-@router.get("/attestations/policy-version/{policy_version_id}", response_model=List[schemas.Attestation])
-def read_attestations_for_version(policy_version_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+@router.get("/attestations/policy-version/{policy_version_id}", response_model=schemas.Page[schemas.Attestation])
+def read_attestations_for_version(policy_version_id: int, cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
     # Only admin/editor/reviewer should see all attestations
     # Regular users should only see their own, but for MVP we allow active user to view
-    attestations = db.query(models.Attestation).filter(models.Attestation.policy_version_id == policy_version_id).offset(skip).limit(limit).all()
-    return attestations
+    # Keyed on user_id, which is unique per version and walks the (policy_version_id, user_id) index.
+    keyset = Keyset(models.Attestation.user_id)
+    query = db.query(models.Attestation).filter(models.Attestation.policy_version_id == policy_version_id)
+    return keyset.page(keyset.apply(query, cursor, limit, skip).all(), limit)
 
 @router.get("/attestations/{attestation_id}", response_model=schemas.Attestation)
 def read_attestation(attestation_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
@@ -104,10 +200,77 @@ def read_attestation(attestation_id: int, db: Session = Depends(get_db), current
     if db_attestation is None:
         raise HTTPException(status_code=404, detail="Attestation not found")
     # Ensure user can only view their own attestation unless they are admin/editor/reviewer
-    if db_attestation.user_id != current_user.id and not any(role.role.name in ["Admin", "Editor", "Reviewer"] for role in current_user.roles):
+    if db_attestation.user_id != current_user.id and not permission_resolver.has_any(db, current_user.id, permissions.REVIEWER_OR_ABOVE):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this attestation")
     return db_attestation
 
+# --- Attestation fan-out ---
+
+@router.post("/attestations/fan-outs/", response_model=schemas.AttestationFanOut, status_code=status.HTTP_202_ACCEPTED)
+def create_attestation_fanout(fanout: schemas.AttestationFanOutCreate, response: Response, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_editor_user)):
+    """Assign a policy version to every member of ``roles`` plus ``user_ids`` and notify them.
+
+    Runs in the background; poll the returned fan-out for progress. Users who
+    already have the version assigned are skipped, so repeating a fan-out
+    (e.g. after a failure, or to reach staff who joined a role since) is safe.
+    """
+    row = db.query(models.PolicyVersion.version_number, models.Policy.title).join(
+        models.Policy, models.Policy.id == models.PolicyVersion.policy_id
+    ).filter(models.PolicyVersion.id == fanout.policy_version_id).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Policy version not found")
+    if not fanout.roles and not fanout.user_ids:
+        raise HTTPException(status_code=400, detail="Give roles or user_ids to assign")
+    roles = dict(db.query(models.Role.name, models.Role.id).filter(models.Role.name.in_(fanout.roles)).all())
+    unknown = sorted(set(fanout.roles) - set(roles))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown roles: {', '.join(unknown)}")
+    role_ids = json.dumps(sorted(roles.values()))
+    user_ids = json.dumps(sorted(set(fanout.user_ids)))
+
+    # The same fan-out submitted again while it runs is answered with the running one.
+    active = db.query(models.AttestationFanOut).filter(
+        models.AttestationFanOut.policy_version_id == fanout.policy_version_id,
+        models.AttestationFanOut.status.in_(ACTIVE),
+        models.AttestationFanOut.role_ids == role_ids,
+        models.AttestationFanOut.user_ids == user_ids,
+    ).first()
+    if active is not None:
+        response.status_code = status.HTTP_200_OK
+        return active
+
+    db_fanout = models.AttestationFanOut(
+        policy_version_id=fanout.policy_version_id,
+        role_ids=role_ids,
+        user_ids=user_ids,
+        message=fanout.message or f"Please read and attest to version {row.version_number} of '{row.title}'.",
+        due_at=fanout.due_at,
+        created_by=current_user.id,
+    )
+    db.add(db_fanout)
+    db.commit()
+    db.refresh(db_fanout)
+    return db_fanout
+
+@router.get("/attestations/fan-outs/stats")
+async def read_fanout_stats(current_user: models.User = Depends(get_current_admin_user)):
+    return fanout_worker.stats()
+
+@router.get("/attestations/fan-outs/{fanout_id}", response_model=schemas.AttestationFanOut)
+def read_attestation_fanout(fanout_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_editor_user)):
+    db_fanout = db.query(models.AttestationFanOut).filter(models.AttestationFanOut.id == fanout_id).first()
+    if db_fanout is None:
+        raise HTTPException(status_code=404, detail="Fan-out not found")
+    return db_fanout
+
+@router.get("/attestations/assignments/me", response_model=schemas.Page[schemas.AttestationAssignment])
+async def read_my_attestation_assignments(cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: AsyncSession = Depends(get_async_read_db), current_user: models.User = Depends(get_current_active_user)):
+    # Newest first, on the (user_id, id) index.
+    keyset = Keyset(models.AttestationAssignment.id, descending=True)
+    statement = select(models.AttestationAssignment).where(models.AttestationAssignment.user_id == current_user.id)
+    result = await db.execute(keyset.apply(statement, cursor, limit, skip))
+    return keyset.page(result.scalars().all(), limit)
+
 # --- Review Comment CRUD ---
 
 @router.post("/review-comments/", response_model=schemas.ReviewComment, status_code=status.HTTP_201_CREATED)
@@ -122,7 +285,8 @@ def create_review_comment(comment: schemas.ReviewCommentCreate, db: Session = De
     db.refresh(db_comment)
     return db_comment
 
-@router.get("/review-comments/policy-version/{policy_version_id}", response_model=List[schemas.ReviewComment])
-def read_review_comments_for_version(policy_version_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_reviewer_user)):
-    comments = db.query(models.ReviewComment).filter(models.ReviewComment.policy_version_id == policy_version_id).offset(skip).limit(limit).all()
-    return comments
+@router.get("/review-comments/policy-version/{policy_version_id}", response_model=schemas.Page[schemas.ReviewComment])
+def read_review_comments_for_version(policy_version_id: int, cursor: Optional[str] = None, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_reviewer_user)):
+    keyset = Keyset(models.ReviewComment.id)
+    query = db.query(models.ReviewComment).filter(models.ReviewComment.policy_version_id == policy_version_id)
+    return keyset.page(keyset.apply(query, cursor, limit, skip).all(), limit)
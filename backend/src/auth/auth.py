@@ -1,34 +1,152 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, List, Optional
+import asyncio
+import copy
+import hashlib
+import os
+import threading
+import time
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
+from backend.src.core.cache import TTLCache
+
 SECRET_KEY = "your-super-secret-key" # TODO: Load from environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+# Stateless mode: tokens carry the user's roles and permissions version so that
+# authenticated requests can be served without touching the users/roles tables.
+JWT_STATELESS = os.getenv("JWT_STATELESS", "false").lower() in ("1", "true", "yes")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# bcrypt is deliberately slow (~250ms); it runs on a dedicated, bounded pool so
+# logins never block the event loop or starve Starlette's request threadpool.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "256"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Decoded payloads keyed by token signature, each kept until the token's own exp.
+_decoded_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+class PasswordHashPoolFull(Exception):
+    pass
+
+class PasswordHashPool:
+    """Runs ``pwd_context`` operations on a fixed number of worker threads.
+
+    ``workers`` caps how many hashes run concurrently; once ``max_pending``
+    jobs are queued or running, new submissions are rejected instead of
+    queueing without bound.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+        self._max_wait = 0.0
+
+    def _run(self, fn: Callable, args: tuple, enqueued_at: float):
+        started_at = time.monotonic()
+        with self._lock:
+            self._running += 1
+            wait = started_at - enqueued_at
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                self._completed += 1
+                self._total_run += time.monotonic() - started_at
+
+    def submit(self, fn: Callable, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHashPoolFull("Password hashing queue is full")
+            self._pending += 1
+            self._submitted += 1
+        return self._executor.submit(self._run, fn, args, time.monotonic())
+
+    async def run(self, fn: Callable, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed or 1
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / completed * 1000, 2),
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                "avg_run_ms": round(self._total_run / completed * 1000, 2),
+            }
+
+password_hash_pool = PasswordHashPool()
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+async def verify_password_async(plain_password, hashed_password):
+    return await password_hash_pool.run(pwd_context.verify, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await password_hash_pool.run(pwd_context.hash, password)
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, roles: Optional[List[str]] = None, permissions_version: Optional[int] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    if JWT_STATELESS:
+        to_encode.update({"roles": roles or [], "pv": permissions_version or 0})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_refresh_token(user_id: int, username: str, permissions_version: int, expires_delta: Optional[timedelta] = None):
+    expire = datetime.utcnow() + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    to_encode = {"sub": username, "id": user_id, "pv": permissions_version, "type": "refresh", "exp": expire}
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
 def decode_access_token(token: str):
+    # Keyed by the whole token: a cached signature alone would vouch for any header and claims sent with it.
+    # Callers get a copy, so one request changing its claims can't alter the next one's.
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _decoded_token_cache.get(key)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            return copy.deepcopy(payload)
+        _decoded_token_cache.delete(key)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
+    remaining = payload.get("exp", 0) - time.time()
+    if remaining > 0:
+        _decoded_token_cache.set(key, payload, ttl=remaining)
+    return copy.deepcopy(payload)
@@ -0,0 +1,140 @@
+import os
+import threading
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.src.auth.user_cache import user_cache
+from backend.src.core.cache import TTLCache
+from backend.src.core.session_hooks import FlushChanges, register_commit_hook
+from backend.src.database import async_engine, engine
+from backend.src.models import policy as models
+
+PERMISSION_CACHE_TTL_SECONDS = float(os.getenv("PERMISSION_CACHE_TTL_SECONDS", "300"))
+PERMISSION_CACHE_MAX_USERS = int(os.getenv("PERMISSION_CACHE_MAX_USERS", "50000"))
+
+# One bit per well-known role. Unknown role names resolve to no bits.
+VIEWER = 1 << 0
+REVIEWER = 1 << 1
+EDITOR = 1 << 2
+ADMIN = 1 << 3
+
+ROLE_BITS = {
+    "Viewer": VIEWER,
+    "Reviewer": REVIEWER,
+    "Editor": EDITOR,
+    "Admin": ADMIN,
+}
+
+EDITOR_OR_ADMIN = EDITOR | ADMIN
+REVIEWER_OR_ABOVE = REVIEWER | EDITOR | ADMIN
+
+
+def roles_to_mask(role_names: Iterable[str]) -> int:
+    mask = 0
+    for name in role_names:
+        mask |= ROLE_BITS.get(name, 0)
+    return mask
+
+
+def mask_to_roles(mask: int) -> list:
+    return [name for name, bit in ROLE_BITS.items() if mask & bit]
+
+
+class PermissionResolver:
+    """Resolves a user's roles into a bitmask, cached in-process per user id.
+
+    The first check for a user costs a single ``user_roles``/``roles`` join;
+    subsequent checks are served from the cache until the TTL expires or a
+    ``UserRole`` change for that user is committed.
+
+    Fills are conditional, as in core/read_cache.py: the generation is read
+    before the roles are loaded and the mask is stored only if no
+    invalidation happened in between, so roles read before a revoke commits
+    can't be cached after it. Only sessions on the primary fill the cache; a
+    replica may still return roles the primary has revoked.
+    """
+
+    def __init__(self, ttl: float = PERMISSION_CACHE_TTL_SECONDS, maxsize: int = PERMISSION_CACHE_MAX_USERS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generation = 0 # Bumped by every invalidation
+        self._stale_fills = 0
+
+    def role_mask(self, db: Session, user_id: int) -> int:
+        mask = self._cache.get(user_id)
+        if mask is None:
+            token = self._generation
+            rows = (
+                db.query(models.Role.name)
+                .join(models.UserRole, models.UserRole.role_id == models.Role.id)
+                .filter(models.UserRole.user_id == user_id)
+                .all()
+            )
+            mask = roles_to_mask(name for (name,) in rows)
+            if db.get_bind() in (engine, async_engine.sync_engine):
+                with self._lock:
+                    if token == self._generation:
+                        self._cache.set(user_id, mask)
+                    else:
+                        self._stale_fills += 1
+        return mask
+
+    def has_any(self, db: Session, user_id: int, required: int) -> bool:
+        return bool(self.role_mask(db, user_id) & required)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cache.delete(user_id)
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "stale_fills": self._stale_fills}
+
+
+permission_resolver = PermissionResolver()
+
+
+# --- Cache invalidation ---
+# Role assignments are collected at flush time and only dropped from the cache
+# once the transaction commits; a request that loaded the pre-commit roles
+# before then finds the generation moved and doesn't cache them. The affected
+# users' permissions_version is bumped in the same transaction, which revokes
+# stateless tokens carrying the old role claims.
+
+_PENDING_KEY = "permission_invalidations"
+
+
+def _collect_role_changes(session: Session, changes: FlushChanges) -> None:
+    changed = {obj.user_id for obj in changes.touched(models.UserRole)}
+    role_ids = [obj.id for obj in changes.dirty(models.Role) + changes.deleted(models.Role)]
+    if role_ids:
+        # A renamed role changes the permissions of the users holding it. (The
+        # ORM only deletes a role once its assignments are gone, and those
+        # are counted above.)
+        user_roles = models.UserRole.__table__
+        changed.update(session.connection().execute(
+            select(user_roles.c.user_id).where(user_roles.c.role_id.in_(role_ids))
+        ).scalars())
+    if not changed:
+        return
+    users = models.User.__table__
+    session.connection().execute(
+        users.update().where(users.c.id.in_(changed)).values(permissions_version=users.c.permissions_version + 1)
+    )
+    session.info.setdefault(_PENDING_KEY, set()).update(changed)
+
+
+def _apply_role_changes(user_ids) -> None:
+    for user_id in user_ids:
+        permission_resolver.invalidate(user_id)
+        user_cache.delete(user_id)
+
+
+register_commit_hook(_PENDING_KEY, _collect_role_changes, _apply_role_changes)
@@ -0,0 +1,61 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from backend.src.core.cache import TTLCache
+from backend.src.core.session_hooks import FlushChanges, register_commit_hook
+from backend.src.models import policy as models
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_MAX_USERS = int(os.getenv("USER_CACHE_MAX_USERS", "50000"))
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """Detached snapshot of the columns request handlers need from ``User``.
+
+    Used in stateless JWT mode in place of a per-request ``users`` lookup.
+    ``role_mask`` comes from the token's role claims, which are only trusted
+    while the token's permissions version matches ``permissions_version``.
+    """
+
+    id: int
+    username: str
+    email: str
+    permissions_version: int
+    role_mask: Optional[int] = None
+
+
+user_cache = TTLCache(maxsize=USER_CACHE_MAX_USERS, ttl=USER_CACHE_TTL_SECONDS)
+
+
+def load_user_snapshot(db: Session, user_id: int) -> Optional[AuthenticatedUser]:
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        row = db.query(
+            models.User.id, models.User.username, models.User.email, models.User.permissions_version
+        ).filter(models.User.id == user_id).first()
+        if row is None:
+            return None
+        snapshot = AuthenticatedUser(id=row.id, username=row.username, email=row.email, permissions_version=row.permissions_version)
+        user_cache.set(user_id, snapshot)
+    return snapshot
+
+
+_PENDING_KEY = "user_cache_invalidations"
+
+
+def _collect_user_changes(session: Session, changes: FlushChanges) -> None:
+    user_ids = [obj.id for obj in changes.dirty(models.User) + changes.deleted(models.User)]
+    if user_ids:
+        session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+
+def _apply_user_changes(user_ids) -> None:
+    for user_id in user_ids:
+        user_cache.delete(user_id)
+
+
+register_commit_hook(_PENDING_KEY, _collect_user_changes, _apply_user_changes)
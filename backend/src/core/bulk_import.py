@@ -0,0 +1,186 @@
+import json
+from typing import AsyncIterator, List, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from starlette.responses import StreamingResponse
+
+from backend.src.core.storage import is_server_stored
+from backend.src.models import policy as models
+from backend.src.schemas import policy as schemas
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body iterator is still reading the request body.
+
+    StreamingResponse normally listens for ``http.disconnect`` on ``receive``
+    while it streams, which would swallow the request chunks the iterator is
+    waiting for. Here the iterator owns ``receive``; a client disconnect
+    surfaces from ``request.stream()`` as ClientDisconnect instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Tuple[int, object]]:
+    """Split a streamed NDJSON body into ``(line_number, line)`` pairs.
+
+    Only the current partial line is buffered. Blank lines are skipped; a line
+    longer than ``max_line_bytes`` is yielded as a ``LineTooLong`` instance and
+    the rest of it is discarded.
+    """
+    buffer = bytearray()
+    line_number = 0
+    overflowed = False
+    async for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end == -1:
+                if not overflowed:
+                    buffer += chunk[start:]
+                    if len(buffer) > max_line_bytes:
+                        overflowed = True
+                        buffer.clear()
+                break
+            line_number += 1
+            if overflowed:
+                overflowed = False
+                yield line_number, LineTooLong(f"Line exceeds {max_line_bytes} bytes")
+            else:
+                buffer += chunk[start:end]
+                if len(buffer) > max_line_bytes:
+                    yield line_number, LineTooLong(f"Line exceeds {max_line_bytes} bytes")
+                elif buffer.strip():
+                    yield line_number, bytes(buffer)
+            buffer.clear()
+            start = end + 1
+    if overflowed:
+        yield line_number + 1, LineTooLong(f"Line exceeds {max_line_bytes} bytes")
+    elif buffer.strip():
+        yield line_number + 1, bytes(buffer)
+
+
+def parse_policy_import(line: bytes) -> schemas.PolicyImport:
+    """Parse one NDJSON line; raises ValueError with a client-facing message."""
+    try:
+        return schemas.PolicyImport.parse_obj(json.loads(line))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e.msg}") from e
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())) from e
+
+
+def _build_policy(record: schemas.PolicyImport, user_id: int) -> models.Policy:
+    policy = models.Policy(
+        **record.dict(exclude={"ref", "versions"}),
+        created_by=user_id,
+        version_counter=len(record.versions),
+    )
+    for number, version in enumerate(record.versions, start=1):
+        db_version = models.PolicyVersion(
+            version_number=number,
+            effective_date=version.effective_date,
+            summary_of_changes=version.summary_of_changes,
+            content_blob_id=version.content_blob_id,
+            created_by=user_id,
+        )
+        policy.versions.append(db_version)
+    return policy
+
+
+def _point_at_latest_version(policy: models.Policy) -> None:
+    # Set after the versions have ids; assigning the current_version relationship
+    # up front would make the unit of work insert the latest version first.
+    if policy.versions:
+        policy.current_version_id = policy.versions[-1].id
+
+
+def _created(line_number: int, record: schemas.PolicyImport, policy: models.Policy) -> dict:
+    return {
+        "line": line_number,
+        "ref": record.ref,
+        "status": "created",
+        "policy_id": policy.id,
+        "version_ids": [v.id for v in policy.versions],
+    }
+
+
+def _failed(line_number: int, record: schemas.PolicyImport, detail: str) -> dict:
+    return {"line": line_number, "ref": record.ref, "status": "error", "detail": detail}
+
+
+def _unstored_blob_ids(db: Session, batch: List[Tuple[int, schemas.PolicyImport]]) -> Set[int]:
+    # Versions may only point at blobs the server stored, never at client-registered paths.
+    blob_ids = {v.content_blob_id for _, record in batch for v in record.versions if v.content_blob_id is not None}
+    if not blob_ids:
+        return set()
+    rows = db.execute(
+        select(models.ContentBlob.id, models.ContentBlob.file_path, models.ContentBlob.file_hash, models.ContentBlob.storage)
+        .where(models.ContentBlob.id.in_(blob_ids))
+    ).all()
+    return blob_ids - {row.id for row in rows if is_server_stored(row.file_path, row.file_hash, row.storage)}
+
+
+def import_policy_batch(db: Session, batch: List[Tuple[int, schemas.PolicyImport]], user_id: int) -> List[dict]:
+    """Insert a batch of parsed records in one transaction and return per-record results.
+
+    The unit of work groups the batch's rows per table, so each table gets
+    batched INSERTs rather than a round-trip per row. If the batch violates a
+    constraint (say, an unknown document_type_id) it is rolled back and
+    retried record by record in savepoints, so only the bad records fail.
+    Records whose versions point at unknown or client-registered content
+    blobs fail up front.
+    """
+    unstored = _unstored_blob_ids(db, batch)
+    rejected, accepted = [], []
+    for line_number, record in batch:
+        bad = sorted({v.content_blob_id for v in record.versions} & unstored)
+        if bad:
+            rejected.append(_failed(line_number, record, f"Not an uploaded content blob: {', '.join(map(str, bad))}"))
+        else:
+            accepted.append((line_number, record))
+    if not rejected:
+        return _insert_batch(db, batch, user_id)
+    results = _insert_batch(db, accepted, user_id) if accepted else []
+    return sorted(results + rejected, key=lambda result: result["line"])
+
+
+def _insert_batch(db: Session, batch: List[Tuple[int, schemas.PolicyImport]], user_id: int) -> List[dict]:
+    policies = [(line_number, record, _build_policy(record, user_id)) for line_number, record in batch]
+    try:
+        db.add_all(policy for _, _, policy in policies)
+        db.flush()
+        for _, _, policy in policies:
+            _point_at_latest_version(policy)
+        db.flush()
+        # Read the generated ids before commit expires them.
+        results = [_created(line_number, record, policy) for line_number, record, policy in policies]
+        db.commit()
+        return results
+    except SQLAlchemyError:
+        db.rollback()
+
+    results = []
+    for line_number, record in batch:
+        policy = _build_policy(record, user_id)
+        try:
+            with db.begin_nested():
+                db.add(policy)
+                db.flush()
+                _point_at_latest_version(policy)
+            results.append(_created(line_number, record, policy))
+        except SQLAlchemyError as e:
+            detail = str(getattr(e, "orig", e)).strip().splitlines()[0]
+            results.append(_failed(line_number, record, detail))
+    db.commit()
+    return results
@@ -0,0 +1,273 @@
+import bisect
+import hashlib
+import io
+import os
+import random
+import re
+import uuid
+from typing import AsyncIterator, BinaryIO, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import anyio
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.src.core.storage import UPLOAD_MAX_BYTES, RangeFileResponse, receive_stream, remove_received, resolve
+from backend.src.models import policy as models
+
+# Content-defined chunking parameters. Clients that upload chunks themselves
+# must cut with the same parameters (and GEAR table) to share chunks with
+# files uploaded by others; GET /policies/content-blobs/chunking publishes them.
+CHUNK_MIN_BYTES = 16 * 1024
+CHUNK_AVG_BYTES = 64 * 1024
+CHUNK_MAX_BYTES = 256 * 1024
+CHUNKER_SEED = 0x5EED_C0DE
+
+_CHUNK_DIR = "chunks"
+_HASH = re.compile(r"^[0-9a-f]{64}$")
+_MASK64 = (1 << 64) - 1
+
+# FastCDC-style gear hash: one random 64-bit value per byte value.
+_rng = random.Random(CHUNKER_SEED)
+GEAR = tuple(_rng.getrandbits(64) for _ in range(256))
+del _rng
+
+
+def _mask(bits: int) -> int:
+    # Test the high bits: with a left-shifting gear hash they depend on the last 64 bytes.
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+_AVG_BITS = CHUNK_AVG_BYTES.bit_length() - 1
+# Normalized chunking: a stricter mask before the average size and a looser
+# one after it pulls chunk sizes towards the average.
+_MASK_SMALL = _mask(_AVG_BITS + 2)
+_MASK_LARGE = _mask(_AVG_BITS - 2)
+
+
+def is_chunk_hash(value: str) -> bool:
+    return bool(_HASH.match(value))
+
+
+def chunk_path(chunk_hash: str) -> str:
+    return resolve(os.path.join(_CHUNK_DIR, chunk_hash[:2], chunk_hash[2:4], chunk_hash))
+
+
+def cut_point(data: bytes, start: int = 0, final: bool = True) -> int:
+    """Return the end of the chunk that starts at ``data[start]``.
+
+    With ``final=False`` the data is a prefix of a longer stream, so -1 is
+    returned when no cut point is found before the end of ``data``.
+    """
+    remaining = len(data) - start
+    if remaining <= CHUNK_MIN_BYTES:
+        return len(data) if final else -1
+    end = start + min(remaining, CHUNK_MAX_BYTES)
+    normal = start + min(remaining, CHUNK_AVG_BYTES)
+    gear = GEAR
+    h = 0
+    i = start + CHUNK_MIN_BYTES
+    for byte in data[i:normal]:
+        h = ((h << 1) + gear[byte]) & _MASK64
+        i += 1
+        if not h & _MASK_SMALL:
+            return i
+    for byte in data[normal:end]:
+        h = ((h << 1) + gear[byte]) & _MASK64
+        i += 1
+        if not h & _MASK_LARGE:
+            return i
+    if end - start == CHUNK_MAX_BYTES or final:
+        return end
+    return -1
+
+
+def iter_chunks(stream: BinaryIO, read_size: int = 4 * CHUNK_MAX_BYTES) -> Iterator[bytes]:
+    """Split a binary stream into content-defined chunks."""
+    buffer = b""
+    eof = False
+    while not eof or buffer:
+        if not eof and len(buffer) < CHUNK_MAX_BYTES:
+            block = stream.read(read_size)
+            eof = not block
+            buffer += block
+            continue
+        start = 0
+        while start < len(buffer):
+            end = cut_point(buffer, start, final=eof)
+            if end == -1:
+                break
+            yield buffer[start:end]
+            start = end
+        buffer = buffer[start:]
+
+
+def store_chunk(data: bytes, chunk_hash: Optional[str] = None) -> Tuple[str, bool]:
+    """Write one chunk under its SHA-256; returns ``(hash, written)``. Existing chunks are left alone."""
+    actual = hashlib.sha256(data).hexdigest()
+    if chunk_hash is not None and actual != chunk_hash:
+        raise ValueError("Chunk content does not match its hash")
+    path = chunk_path(actual)
+    if os.path.exists(path):
+        return actual, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return actual, True
+
+
+class ChunkedFile(NamedTuple):
+    file_hash: str # Hex SHA-256 of the whole file
+    size_bytes: int
+    filename: Optional[str]
+    mime_type: Optional[str]
+    chunks: List[Tuple[str, int]] # (hash, size) in file order
+
+
+def _store_file_chunks(path: str) -> List[Tuple[str, int]]:
+    with open(path, "rb") as f:
+        return [(store_chunk(chunk)[0], len(chunk)) for chunk in iter_chunks(f)]
+
+
+async def store_stream_chunked(chunks: AsyncIterator[bytes], filename: Optional[str] = None, mime_type: Optional[str] = None,
+                               max_bytes: int = UPLOAD_MAX_BYTES) -> ChunkedFile:
+    """Receive ``chunks`` like store_stream, then store the file as content-defined chunks.
+
+    The chunking runs on a worker thread once the upload is complete. Only
+    chunks not stored yet are written, so re-uploading a lightly edited file
+    adds just the chunks around the edits.
+    """
+    received = await receive_stream(chunks, max_bytes)
+    try:
+        manifest = await anyio.to_thread.run_sync(_store_file_chunks, received.tmp_path)
+    finally:
+        await anyio.to_thread.run_sync(remove_received, received)
+    return ChunkedFile(received.file_hash, received.size_bytes, filename, mime_type, manifest)
+
+
+def record_chunks(db: Session, chunks: Sequence[Tuple[str, int]]) -> None:
+    """Insert ``content_chunks`` rows for ``(hash, size)`` pairs, skipping those already recorded."""
+    rows = [{"hash": chunk_hash, "size_bytes": size} for chunk_hash, size in dict(chunks).items()]
+    if not rows:
+        return
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    db.execute(dialect.insert(models.ContentChunk).values(rows).on_conflict_do_nothing(index_elements=[models.ContentChunk.hash]))
+
+
+def new_chunked_blob(file_hash: str, chunks: Sequence[Tuple[str, int]], mime_type: Optional[str]) -> models.ContentBlob:
+    """A ``storage="chunks"`` ContentBlob with its manifest, for chunks already recorded."""
+    db_content_blob = models.ContentBlob(
+        file_path=f"chunks/{file_hash}",
+        file_hash=file_hash,
+        size_bytes=sum(size for _, size in chunks),
+        mime_type=mime_type,
+        storage="chunks",
+    )
+    offset = 0
+    for position, (chunk_hash, size) in enumerate(chunks):
+        db_content_blob.chunks.append(models.ContentBlobChunk(position=position, offset=offset, chunk_hash=chunk_hash))
+        offset += size
+    return db_content_blob
+
+
+def verify_manifest(chunk_hashes: Sequence[str]) -> Tuple[str, int]:
+    """Read the chunks in order and return the whole file's ``(sha256, size)``."""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk_hash in chunk_hashes:
+        with open(chunk_path(chunk_hash), "rb") as f:
+            data = f.read()
+        digest.update(data)
+        size += len(data)
+    return digest.hexdigest(), size
+
+
+def manifest_query(content_blob_id: int):
+    """Select a chunked blob's ``(offset, chunk_hash, size_bytes)`` rows in file order."""
+    return (
+        select(models.ContentBlobChunk.offset, models.ContentBlobChunk.chunk_hash, models.ContentChunk.size_bytes)
+        .join(models.ContentChunk, models.ContentChunk.hash == models.ContentBlobChunk.chunk_hash)
+        .where(models.ContentBlobChunk.content_blob_id == content_blob_id)
+        .order_by(models.ContentBlobChunk.position)
+    )
+
+
+def manifest_segments(chunks: Sequence[Tuple[int, str, int]], offset: int, count: int,
+                      starts: Optional[Sequence[int]] = None) -> List[Tuple[str, int, int]]:
+    """Map the byte range ``[offset, offset + count)`` onto ``(path, offset, count)`` reads of chunk files.
+
+    ``chunks`` are ``(file_offset, chunk_hash, size)`` in file order; pass
+    their ``starts`` when mapping many ranges over the same manifest.
+    """
+    if starts is None:
+        starts = [start for start, _, _ in chunks]
+    segments = []
+    index = max(0, bisect.bisect_right(starts, offset) - 1)
+    end = offset + count
+    while offset < end and index < len(chunks):
+        start, chunk_hash, size = chunks[index]
+        within = offset - start
+        length = min(size - within, end - offset)
+        if length > 0:
+            segments.append((chunk_path(chunk_hash), within, length))
+            offset += length
+        index += 1
+    return segments
+
+
+class ChunkedReader(io.RawIOBase):
+    """Seekable read-only file over a chunk manifest, for readers that need a file object."""
+
+    def __init__(self, chunks: Sequence[Tuple[int, str, int]], name: str = ""):
+        self._chunks = [tuple(chunk) for chunk in chunks]
+        self._starts = [start for start, _, _ in self._chunks]
+        self._size = sum(size for _, _, size in self._chunks)
+        self._position = 0
+        self.name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        count = min(len(view), self._size - self._position)
+        if count <= 0:
+            return 0
+        written = 0
+        for path, offset, length in manifest_segments(self._chunks, self._position, count, self._starts):
+            with open(path, "rb") as f:
+                f.seek(offset)
+                written += f.readinto(view[written:written + length])
+        self._position += written
+        return written
+
+
+def open_chunked_blob(db: Session, blob: models.ContentBlob) -> BinaryIO:
+    """Open a chunked blob as a buffered, seekable binary file."""
+    chunks = db.execute(manifest_query(blob.id)).all()
+    return io.BufferedReader(ChunkedReader(chunks, name=blob.file_path), buffer_size=CHUNK_AVG_BYTES)
+
+
+class ChunkedRangeResponse(RangeFileResponse):
+    """RangeFileResponse for a chunked blob: the range is read from the chunk files it spans."""
+
+    def __init__(self, chunks: Sequence[Tuple[int, str, int]], size: int, byte_range: Optional[Tuple[int, int]] = None,
+                 media_type: Optional[str] = None, headers: Optional[dict] = None):
+        self.chunks = list(chunks)
+        super().__init__("", size, byte_range, media_type=media_type, headers=headers)
+
+    def segments(self) -> List[Tuple[str, int, int]]:
+        return manifest_segments(self.chunks, self.offset, self.count)
@@ -0,0 +1,90 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+CACHE_IMMUTABLE_MAX_AGE = int(os.getenv("CACHE_IMMUTABLE_MAX_AGE", str(365 * 24 * 3600)))
+
+# Responses need a login, so only the client's own cache may keep them.
+IMMUTABLE = f"private, max-age={CACHE_IMMUTABLE_MAX_AGE}, immutable"
+REVALIDATE = "private, no-cache"
+
+
+def make_etag(*parts, weak: bool = True) -> str:
+    """An opaque ETag for a representation identified by ``parts``.
+
+    Weak by default: the validators describe the data, not the exact bytes,
+    which may differ with encoding.
+    """
+    digest = hashlib.blake2b("\x1f".join(str(part) for part in parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; the database stores UTC.
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(_as_utc(value).replace(microsecond=0), usegmt=True)
+
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """Compare ``etag`` against an If-None-Match/If-Match style list.
+
+    Weak comparison ignores the ``W/`` prefix (RFC 9110 8.8.3.2); strong
+    comparison, used for If-Range, requires both tags to be strong.
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak:
+            if candidate.removeprefix("W/") == etag.removeprefix("W/"):
+                return True
+        elif candidate == etag and not etag.startswith("W/"):
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when there is none, for a GET or HEAD."""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False # An invalid date is ignored
+    if since.tzinfo is None:
+        return False
+    return _as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def conditional_get(request: Request, response: Response, etag: str, last_modified: Optional[datetime] = None,
+                    cache_control: str = REVALIDATE) -> Optional[Response]:
+    """Set validator headers on ``response``, or return a 304 if the client's copy is current.
+
+    Call it as soon as the validators are known, before the body is loaded
+    or built, and return the 304 as is when one comes back.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
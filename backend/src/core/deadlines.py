@@ -0,0 +1,304 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from backend.src.core.outbox import enqueue_notification, enqueue_notifications
+from backend.src.core.session_hooks import FlushChanges, register_commit_hook
+from backend.src.database import SessionLocal, engine as default_engine
+from backend.src.models import policy as models
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_REMINDER_LEAD_HOURS = float(os.getenv("DEADLINE_REMINDER_LEAD_HOURS", "24")) # Remind this long before a step is due
+DEADLINE_ESCALATION_GRACE_HOURS = float(os.getenv("DEADLINE_ESCALATION_GRACE_HOURS", "0")) # Escalate this long after
+DEADLINE_LOOKAHEAD_SECONDS = float(os.getenv("DEADLINE_LOOKAHEAD_SECONDS", "600")) # How far ahead the heap is loaded
+DEADLINE_REFILL_SECONDS = float(os.getenv("DEADLINE_REFILL_SECONDS", "60")) # Also picks up steps other processes wrote
+DEADLINE_MAX_LOADED = int(os.getenv("DEADLINE_MAX_LOADED", "20000")) # Per kind and refill
+DEADLINE_BATCH_SIZE = int(os.getenv("DEADLINE_BATCH_SIZE", "500")) # Steps fired per transaction
+
+REMINDER = "reminder"
+ESCALATION = "escalation"
+# Steps in these states need no reminder or escalation; they are only marked as handled.
+CLOSED_STATUSES = ("Approved", "Rejected", "Completed", "Cancelled")
+ESCALATED_STATUSES = ("Pending", "In Progress") # Become Overdue when escalated
+
+# Only one process schedules at a time on PostgreSQL; it holds this advisory lock.
+_LEADER_LOCK_ID = 0x646561646C6E
+_MIN_REFILL_INTERVAL = 1.0 # Seconds between refills triggered by step changes
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def notify_assignees(db: Session, user_id: Optional[int], role_id: Optional[int], message: str) -> None:
+    """Queue ``message`` for a step's assignee: its user, or else every member of its role."""
+    if user_id is not None:
+        enqueue_notification(db, user_id, message)
+    elif role_id is not None:
+        enqueue_notifications(db, select(models.UserRole.user_id).where(models.UserRole.role_id == role_id), message)
+
+
+class DeadlineScheduler:
+    """Sends workflow step reminders before the due date and escalations after it.
+
+    Upcoming firings are kept in a min-heap that holds only the next
+    ``lookahead_seconds``. It is refilled from partial indexes that contain
+    just the open steps whose reminder or escalation is still to fire, so a
+    refill reads the window and nothing else, however many steps are open.
+    Between refills the thread sleeps until the earliest firing.
+
+    A firing re-checks the step in the database and sets ``reminded_at`` or
+    ``escalated_at`` in the transaction that queues its notifications, so
+    restarts and stale heap entries never fire twice. On PostgreSQL only the
+    process holding an advisory lock schedules; the others wait to take
+    over.
+    """
+
+    def __init__(self, session_factory=SessionLocal, engine=default_engine,
+                 reminder_lead: timedelta = timedelta(hours=DEADLINE_REMINDER_LEAD_HOURS),
+                 escalation_grace: timedelta = timedelta(hours=DEADLINE_ESCALATION_GRACE_HOURS),
+                 lookahead_seconds: float = DEADLINE_LOOKAHEAD_SECONDS, refill_seconds: float = DEADLINE_REFILL_SECONDS,
+                 max_loaded: int = DEADLINE_MAX_LOADED, batch_size: int = DEADLINE_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.engine = engine
+        self.offsets = {REMINDER: -reminder_lead, ESCALATION: escalation_grace} # Firing time minus due date
+        self.lookahead_seconds = lookahead_seconds
+        self.refill_seconds = refill_seconds
+        self.max_loaded = max_loaded
+        self.batch_size = batch_size
+        self._heap: List[Tuple[float, int, str]] = [] # (fires at, step id, kind)
+        self._queued: Dict[Tuple[int, str], float] = {} # Current firing time; heap entries that differ are stale
+        self._next_refill = 0.0
+        self._last_refill = 0.0
+        self._changed = False
+        self._leader_connection = None
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._fired: Dict[str, int] = {REMINDER: 0, ESCALATION: 0}
+        self._refills = 0
+        self._refill_seconds_total = 0.0
+        self._ticks = 0
+        self._tick_seconds_total = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._loop, name="deadline-scheduler", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopped.set()
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout)
+        self._resign()
+
+    def notify(self) -> None:
+        """Steps were added or changed: refill soon rather than at the next scheduled refill."""
+        self._changed = True
+        self._wakeup.set()
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            try:
+                if not self._lead():
+                    self._wakeup.wait(self.refill_seconds) # Standby: try to take over now and then
+                    continue
+                timeout = self.tick()
+            except Exception:
+                logger.exception("Deadline scheduler tick failed")
+                self._resign()
+                timeout = self.refill_seconds
+            self._wakeup.wait(timeout)
+
+    # --- Leadership ---
+
+    def _lead(self) -> bool:
+        if self.engine.dialect.name != "postgresql":
+            return True
+        if self._leader_connection is not None:
+            try:
+                self._leader_connection.execute(select(1))
+                return True
+            except Exception:
+                logger.warning("Deadline scheduler lost its leader connection", exc_info=True)
+                self._resign()
+        connection = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        if not connection.execute(select(func.pg_try_advisory_lock(_LEADER_LOCK_ID))).scalar():
+            connection.close()
+            return False
+        logger.info("Deadline scheduler is now the leader")
+        self._leader_connection = connection
+        self._reset()
+        return True
+
+    def _resign(self) -> None:
+        connection, self._leader_connection = self._leader_connection, None
+        if connection is not None:
+            try:
+                connection.execute(select(func.pg_advisory_unlock(_LEADER_LOCK_ID)))
+                connection.close()
+            except Exception:
+                connection.invalidate()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._heap.clear()
+        self._queued.clear()
+        self._next_refill = 0.0
+
+    # --- Scheduling ---
+
+    def tick(self) -> float:
+        """Refill if due and fire what is due; returns how long to sleep."""
+        started_at = time.monotonic()
+        now = time.time()
+        if now >= self._next_refill or (self._changed and now >= self._last_refill + _MIN_REFILL_INTERVAL):
+            self.refill(now)
+        while self._heap and self._heap[0][0] <= now and not self._stopped.is_set():
+            batches: Dict[str, List[int]] = {REMINDER: [], ESCALATION: []}
+            while self._heap and self._heap[0][0] <= now and sum(map(len, batches.values())) < self.batch_size:
+                fires_at, step_id, kind = heapq.heappop(self._heap)
+                if self._queued.get((step_id, kind)) != fires_at:
+                    continue # Rescheduled since
+                del self._queued[(step_id, kind)]
+                batches[kind].append(step_id)
+            for kind, step_ids in batches.items():
+                if step_ids:
+                    self.fire(kind, step_ids, datetime.fromtimestamp(now, timezone.utc))
+            now = time.time()
+        with self._lock:
+            self._ticks += 1
+            self._tick_seconds_total += time.monotonic() - started_at
+        wake_at = min(self._heap[0][0] if self._heap else float("inf"), self._next_refill)
+        if self._changed:
+            wake_at = min(wake_at, self._last_refill + _MIN_REFILL_INTERVAL)
+        return max(0.0, wake_at - time.time())
+
+    def refill(self, now: float) -> int:
+        """Load the firings due within the lookahead window that aren't in the heap yet."""
+        started_at = time.monotonic()
+        self._changed = False
+        self._last_refill = now
+        self._next_refill = now + self.refill_seconds
+        horizon = datetime.fromtimestamp(now + self.lookahead_seconds, timezone.utc)
+        loaded = 0
+        with self.session_factory() as db:
+            for kind, offset in self.offsets.items():
+                marker = models.WorkflowStep.reminded_at if kind == REMINDER else models.WorkflowStep.escalated_at
+                rows = db.execute(
+                    select(models.WorkflowStep.id, models.WorkflowStep.due_date)
+                    .where(marker.is_(None), models.WorkflowStep.completed_at.is_(None),
+                           models.WorkflowStep.due_date.isnot(None), models.WorkflowStep.due_date <= horizon - offset)
+                    .order_by(models.WorkflowStep.due_date, models.WorkflowStep.id)
+                    .limit(self.max_loaded)
+                ).all()
+                for step_id, due_date in rows:
+                    fires_at = (_as_utc(due_date) + offset).timestamp()
+                    if self._queued.get((step_id, kind)) != fires_at:
+                        self._queued[(step_id, kind)] = fires_at
+                        heapq.heappush(self._heap, (fires_at, step_id, kind))
+                        loaded += 1
+                if len(rows) == self.max_loaded:
+                    # The window holds more than one load; continue once the loaded part has fired.
+                    self._next_refill = min(self._next_refill, (_as_utc(rows[-1][1]) + offset).timestamp())
+        with self._lock:
+            self._refills += 1
+            self._refill_seconds_total += time.monotonic() - started_at
+        return loaded
+
+    def fire(self, kind: str, step_ids: List[int], now: datetime) -> int:
+        """Send ``kind`` for the steps that still need it, in one transaction; returns how many."""
+        step = models.WorkflowStep
+        marker = step.reminded_at if kind == REMINDER else step.escalated_at
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(step.id, step.name, step.status, step.due_date, step.assigned_to_user_id, step.assigned_to_role_id,
+                       models.Workflow.name.label("workflow_name"), models.Policy.title, models.Policy.created_by)
+                .join(models.Workflow, models.Workflow.id == step.workflow_id)
+                .join(models.Policy, models.Policy.id == models.Workflow.policy_id)
+                .where(step.id.in_(step_ids), marker.is_(None), step.completed_at.is_(None),
+                       step.due_date <= now - self.offsets[kind])
+                .with_for_update(of=step, skip_locked=True)
+            ).all()
+            if not rows:
+                return 0
+            sent = []
+            for row in rows:
+                if row.status in CLOSED_STATUSES:
+                    continue
+                if kind == REMINDER and _as_utc(row.due_date) + self.offsets[ESCALATION] <= now:
+                    continue # Already overdue: the escalation says it
+                sent.append(row.id)
+                due = _as_utc(row.due_date).strftime("%Y-%m-%d %H:%M UTC")
+                where = f"step '{row.name}' of workflow '{row.workflow_name}'"
+                if kind == REMINDER:
+                    notify_assignees(db, row.assigned_to_user_id, row.assigned_to_role_id, f"Reminder: {where} is due {due}.")
+                else:
+                    notify_assignees(db, row.assigned_to_user_id, row.assigned_to_role_id, f"Overdue: {where} was due {due}.")
+                    if row.created_by is not None and row.created_by != row.assigned_to_user_id:
+                        enqueue_notification(db, row.created_by, f"Escalation: {where} for policy '{row.title}' was due {due} and is not done.")
+            db.execute(
+                update(step).where(step.id.in_([row.id for row in rows])).values({marker.key: now})
+                .execution_options(synchronize_session=False)
+            )
+            if kind == ESCALATION and sent:
+                db.execute(
+                    update(step).where(step.id.in_(sent), step.status.in_(ESCALATED_STATUSES)).values(status="Overdue")
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+        with self._lock:
+            self._fired[kind] += len(sent)
+        return len(sent)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "leader": self.engine.dialect.name != "postgresql" or self._leader_connection is not None,
+                "scheduled": len(self._queued),
+                "next_firing_in_seconds": round(max(0.0, self._heap[0][0] - time.time()), 1) if self._heap else None,
+                "reminders_sent": self._fired[REMINDER],
+                "escalations_sent": self._fired[ESCALATION],
+                "refills": self._refills,
+                "avg_refill_ms": round(self._refill_seconds_total / (self._refills or 1) * 1000, 2),
+                "ticks": self._ticks,
+                "avg_tick_ms": round(self._tick_seconds_total / (self._ticks or 1) * 1000, 2),
+            }
+
+
+deadline_scheduler = DeadlineScheduler()
+
+
+# --- Wakeups ---
+
+_PENDING_KEY = "workflow_steps_changed"
+
+
+def steps_written(db: Session) -> None:
+    """Wake the scheduler when ``db`` commits; for steps written with Core statements."""
+    db.info[_PENDING_KEY] = True
+
+
+def _collect_step_changes(session: Session, changes: FlushChanges) -> None:
+    if changes.written(models.WorkflowStep):
+        session.info[_PENDING_KEY] = True
+
+
+register_commit_hook(_PENDING_KEY, _collect_step_changes, lambda _: deadline_scheduler.notify())
@@ -0,0 +1,315 @@
+import asyncio
+import difflib
+import gzip
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from backend.src.core.storage import CONTENT_ROOT, is_server_stored
+
+logger = logging.getLogger(__name__)
+
+DIFF_WORKERS = int(os.getenv("DIFF_WORKERS", "2")) # Worker processes; diffs are CPU-bound
+DIFF_CACHE_MAX_BYTES = int(os.getenv("DIFF_CACHE_MAX_BYTES", str(64 * 1024 * 1024))) # In-memory LRU tier
+# On-disk tier shared by all workers of a host; empty disables it.
+DIFF_CACHE_DIR = os.getenv("DIFF_CACHE_DIR", os.path.join(CONTENT_ROOT, "diff-cache"))
+DIFF_CACHE_DIR_MAX_BYTES = int(os.getenv("DIFF_CACHE_DIR_MAX_BYTES", str(1024 * 1024 * 1024)))
+DIFF_STREAM_CHUNK_BYTES = 64 * 1024
+
+# Bump when the output format or the cache keys change so stale cache entries are ignored.
+DIFF_FORMAT = 2
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n|\n(?=\s*(?:[-*•]|\d+[.)])\s)")
+_WORD = re.compile(r"\s+|\w+|[^\w\s]")
+_TERM = re.compile(r"\w+")
+# A changed paragraph is shown as a word diff only if it still shares this much with its counterpart.
+_PAIR_MIN_SIMILARITY = 0.5
+_PAIR_LOOKAHEAD = 8
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split on blank lines and list items; whitespace inside a paragraph is normalized."""
+    paragraphs = (" ".join(p.split()) for p in _PARAGRAPH_BREAK.split(text or ""))
+    return [p for p in paragraphs if p]
+
+
+def _similarity(a: str, b: str) -> float:
+    matcher = difflib.SequenceMatcher(None, _TERM.findall(a.lower()), _TERM.findall(b.lower()), autojunk=False)
+    if matcher.real_quick_ratio() < _PAIR_MIN_SIMILARITY or matcher.quick_ratio() < _PAIR_MIN_SIMILARITY:
+        return 0.0
+    return matcher.ratio()
+
+
+def _word_diff(a: str, b: str) -> List[list]:
+    # Tokens keep their whitespace so the segments concatenate back to each side's text.
+    a_words, b_words = _WORD.findall(a), _WORD.findall(b)
+    segments = []
+    matcher = difflib.SequenceMatcher(None, a_words, b_words, autojunk=False)
+    for op, a1, a2, b1, b2 in matcher.get_opcodes():
+        if op == "equal":
+            segments.append(["equal", "".join(a_words[a1:a2])])
+        else:
+            if a1 < a2:
+                segments.append(["delete", "".join(a_words[a1:a2])])
+            if b1 < b2:
+                segments.append(["insert", "".join(b_words[b1:b2])])
+    return segments
+
+
+def compute_diff(text_a: str, text_b: str) -> bytes:
+    """Diff two documents and return the hunks as NDJSON.
+
+    Paragraphs are aligned first. Within a changed block, similar paragraphs
+    are paired in order and each pair gets a word-level diff; the rest are
+    plain deletes or inserts. The last line is a summary. Runs in a worker
+    process, so it only takes and returns plain data.
+    """
+    paragraphs_a, paragraphs_b = split_paragraphs(text_a), split_paragraphs(text_b)
+    lines = []
+    counts = {"equal": 0, "insert": 0, "delete": 0, "replace": 0}
+
+    def emit(op, a_index, b_index, a=None, b=None, words=None):
+        counts[op] += 1
+        hunk = {"op": op, "a_index": a_index, "b_index": b_index}
+        if a is not None:
+            hunk["a"] = a
+        if b is not None:
+            hunk["b"] = b
+        if words is not None:
+            hunk["words"] = words
+        lines.append(json.dumps(hunk, separators=(",", ":")))
+
+    matcher = difflib.SequenceMatcher(None, paragraphs_a, paragraphs_b, autojunk=False)
+    for op, a1, a2, b1, b2 in matcher.get_opcodes():
+        if op == "equal":
+            for offset in range(a2 - a1):
+                emit("equal", a1 + offset, b1 + offset, a=paragraphs_a[a1 + offset])
+            continue
+        # Pair each old paragraph with the next sufficiently similar new one
+        # (looking a few paragraphs ahead); anything unpaired is a plain delete or insert.
+        b_next = b1
+        for a_index in range(a1, a2):
+            match = None
+            for b_index in range(b_next, min(b2, b_next + _PAIR_LOOKAHEAD)):
+                if _similarity(paragraphs_a[a_index], paragraphs_b[b_index]) >= _PAIR_MIN_SIMILARITY:
+                    match = b_index
+                    break
+            if match is None:
+                emit("delete", a_index, None, a=paragraphs_a[a_index])
+                continue
+            for b_index in range(b_next, match):
+                emit("insert", None, b_index, b=paragraphs_b[b_index])
+            emit("replace", a_index, match, words=_word_diff(paragraphs_a[a_index], paragraphs_b[match]))
+            b_next = match + 1
+        for b_index in range(b_next, b2):
+            emit("insert", None, b_index, b=paragraphs_b[b_index])
+    lines.append(json.dumps({"op": "summary", "paragraphs_a": len(paragraphs_a), "paragraphs_b": len(paragraphs_b), **counts}))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def content_key(blob_id: Optional[int], file_path: Optional[str], file_hash: Optional[str], storage: Optional[str]) -> str:
+    """Cache identity of one side of a diff: the blob's content hash if the server computed it, else the blob."""
+    if blob_id is None:
+        return "empty"
+    if is_server_stored(file_path, file_hash, storage):
+        return file_hash
+    return f"blob-{blob_id}"
+
+
+class DiffEngine:
+    """Computes version diffs in a process pool behind a two-tier cache.
+
+    Results are keyed by the pair of content hashes, which is stable because
+    versions and their blobs are immutable. Only hashes the server computed
+    are used; other blobs are keyed by id, so a blob claiming someone
+    else's hash can't share (or poison) their cached diffs. The memory tier is an LRU bounded
+    by DIFF_CACHE_MAX_BYTES; the disk tier keeps gzipped results in
+    DIFF_CACHE_DIR and evicts the least recently used files past
+    DIFF_CACHE_DIR_MAX_BYTES. Concurrent requests for the same pair share one
+    computation.
+    """
+
+    def __init__(self, workers: int = DIFF_WORKERS, max_bytes: int = DIFF_CACHE_MAX_BYTES,
+                 cache_dir: str = DIFF_CACHE_DIR, cache_dir_max_bytes: int = DIFF_CACHE_DIR_MAX_BYTES):
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.cache_dir_max_bytes = cache_dir_max_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._total_compute = 0.0
+        self._disk_written = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is None:
+                # Spawned rather than forked: the app process runs other thread pools.
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def cache_key(key_a: str, key_b: str) -> str:
+        return hashlib.sha256(f"{DIFF_FORMAT}:{key_a}:{key_b}".encode()).hexdigest()
+
+    def _remember(self, key: str, result: bytes) -> None:
+        if len(result) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = result
+            self._memory_bytes += len(result)
+            while self._memory_bytes > self.max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".ndjson.gz")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            with gzip.open(path, "rb") as f:
+                result = f.read()
+        except (FileNotFoundError, OSError, EOFError):
+            return None
+        os.utime(path) # Recency for eviction
+        return result
+
+    def _write_disk(self, key: str, result: bytes) -> None:
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=5) as f:
+            f.write(result)
+        os.replace(tmp_path, path)
+        # Walking the directory is the expensive part, so only prune every ~5% of the budget written.
+        with self._lock:
+            self._disk_written += len(result)
+            due = self._disk_written >= self.cache_dir_max_bytes // 20
+            if due:
+                self._disk_written = 0
+        if due:
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.cache_dir_max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.cache_dir_max_bytes * 0.9:
+                break
+
+    def cached(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+        return result
+
+    async def diff(self, key: str, load_texts) -> bytes:
+        """Return the NDJSON diff for ``key``, computing it from ``await load_texts()`` on a miss."""
+        result = self.cached(key)
+        if result is not None:
+            return result
+        if self.cache_dir:
+            result = await asyncio.get_running_loop().run_in_executor(None, self._read_disk, key)
+            if result is not None:
+                with self._lock:
+                    self._disk_hits += 1
+                self._remember(key, result)
+                return result
+
+        # The computation runs in its own task that every request for the key
+        # awaits through a shield, so a client that disconnects cancels only
+        # its own wait, not the diff the others are waiting for.
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, load_texts))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._finished(key, task))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception() # Waiters get it re-raised; don't warn if they all went away
+
+    async def _compute(self, key: str, load_texts) -> bytes:
+        text_a, text_b = await load_texts()
+        self.start()
+        started_at = time.monotonic()
+        try:
+            result = await asyncio.wrap_future(self._executor.submit(compute_diff, text_a, text_b))
+        except BrokenProcessPool:
+            self.shutdown() # A worker died (e.g. OOM); the next diff starts a fresh pool
+            raise
+        with self._lock:
+            self._misses += 1
+            self._total_compute += time.monotonic() - started_at
+        self._remember(key, result)
+        if self.cache_dir:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, result)
+            except OSError:
+                logger.warning("Could not write diff cache entry %s", key, exc_info=True)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            misses = self._misses or 1
+            return {
+                "workers": self.workers,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "computed": self._misses,
+                "avg_compute_ms": round(self._total_compute / misses * 1000, 2),
+            }
+
+
+diff_engine = DiffEngine()
+
+
+def iter_chunks(result: bytes, size: int = DIFF_STREAM_CHUNK_BYTES):
+    view = memoryview(result)
+    for start in range(0, len(result), size):
+        yield bytes(view[start:start + size])
@@ -0,0 +1,318 @@
+import io
+import logging
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import BinaryIO, Optional
+from xml.etree import ElementTree
+
+from sqlalchemy import or_, select, text
+from sqlalchemy.orm import Session
+
+from backend.src.core.chunking import open_chunked_blob
+from backend.src.core.session_hooks import FlushChanges, register_commit_hook
+from backend.src.core.storage import content_path, is_server_stored, resolve
+from backend.src.database import SessionLocal
+from backend.src.models import policy as models
+
+try:
+    from pypdf import PdfReader
+except ImportError: # PDF extraction is skipped (and retried on the next backfill) without pypdf
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))
+# to_tsvector rejects input over 1MB; longer documents are indexed by their prefix.
+EXTRACTION_MAX_CHARS = int(os.getenv("EXTRACTION_MAX_CHARS", "500000"))
+EXTRACTION_BACKFILL_ON_STARTUP = os.getenv("EXTRACTION_BACKFILL_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+_DOCX_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class UnsupportedContent(Exception):
+    pass
+
+
+def _content_kind(path: str, mime_type: Optional[str]) -> str:
+    mime_type = (mime_type or "").lower()
+    extension = os.path.splitext(path)[1].lower()
+    if mime_type == "application/pdf" or extension == ".pdf":
+        return "pdf"
+    if mime_type.endswith("wordprocessingml.document") or extension == ".docx":
+        return "docx"
+    if mime_type.startswith("text/") or extension in (".txt", ".md", ".text"):
+        return "txt"
+    raise UnsupportedContent(mime_type or extension or "unknown type")
+
+
+def _extract_docx(source) -> str:
+    parts = []
+    with zipfile.ZipFile(source) as archive, archive.open("word/document.xml") as document:
+        for _, element in ElementTree.iterparse(document):
+            if element.tag == _DOCX_NS + "t" and element.text:
+                parts.append(element.text)
+            elif element.tag == _DOCX_NS + "tab":
+                parts.append("\t")
+            elif element.tag == _DOCX_NS + "p":
+                parts.append("\n")
+                element.clear()
+    return "".join(parts)
+
+
+def _extract_pdf(source) -> str:
+    if PdfReader is None:
+        raise UnsupportedContent("PDF extraction needs the pypdf package")
+    reader = PdfReader(source)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def extract_text(path: str, mime_type: Optional[str] = None, fileobj: Optional[BinaryIO] = None) -> str:
+    """Return the plain text of a PDF, DOCX or text file.
+
+    ``fileobj``, if given, is read instead of opening ``path`` (which then
+    only helps identify the type).
+    """
+    kind = _content_kind(path, mime_type)
+    source = fileobj if fileobj is not None else path
+    if kind == "pdf":
+        return _extract_pdf(source)
+    if kind == "docx":
+        return _extract_docx(source)
+    if fileobj is not None:
+        return io.TextIOWrapper(fileobj, encoding="utf-8", errors="replace").read(EXTRACTION_MAX_CHARS)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read(EXTRACTION_MAX_CHARS)
+
+
+# Vectors are weighted so ranking prefers title (A) and description (B) matches
+# over the version summary (C) and the document body (D). The policy vector is
+# rebuilt the same way by the trigger in database/init.sql.
+_VERSION_VECTOR_SQL = text(
+    "UPDATE policy_versions SET search_vector = "
+    "setweight(to_tsvector('english', COALESCE(summary_of_changes, '')), 'C') || "
+    "setweight(to_tsvector('english', :content), 'D') "
+    "WHERE id = :version_id"
+)
+_POLICY_VECTOR_SQL = text(
+    "UPDATE policies SET search_vector = "
+    "setweight(to_tsvector('english', COALESCE(policies.title, '')), 'A') || "
+    "setweight(to_tsvector('english', COALESCE(policies.description, '')), 'B') || "
+    "COALESCE(policy_versions.search_vector, ''::tsvector) "
+    "FROM policy_versions WHERE policy_versions.id = :version_id AND policies.current_version_id = policy_versions.id"
+)
+
+
+class ExtractionPipeline:
+    """Extracts text from content blobs and indexes policy versions in the background.
+
+    Jobs are queued after the transaction that created a blob or version
+    commits and run on ``workers`` threads, each with its own session. A blob
+    is extracted at most once, and a blob whose ``file_hash`` matches one that
+    was already extracted reuses that text instead of reading the file again.
+    Only blobs the server stored itself are read, and only their hashes,
+    which the server computed, are matched; blobs registered by path get no
+    text.
+    """
+
+    def __init__(self, workers: int = EXTRACTION_WORKERS, session_factory=SessionLocal):
+        self.workers = workers
+        self.session_factory = session_factory
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queued = set()
+        self._completed = 0
+        self._failed = 0
+        self._reused = 0
+        self._total_run = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="extraction")
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._queued.clear()
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _submit(self, job: tuple) -> None:
+        self.start()
+        with self._lock:
+            if job in self._queued:
+                return
+            self._queued.add(job)
+            self._executor.submit(self._run, job)
+
+    def submit_blob(self, blob_id: int) -> None:
+        self._submit(("blob", blob_id))
+
+    def submit_version(self, version_id: int) -> None:
+        self._submit(("version", version_id))
+
+    def backfill(self) -> None:
+        """Queue every blob that hasn't been extracted and every version without a vector."""
+        self.start()
+        self._executor.submit(self._backfill)
+
+    def _backfill(self) -> None:
+        with self.session_factory() as db:
+            blob_ids = db.execute(select(models.ContentBlob.id).where(models.ContentBlob.extracted_at.is_(None))).scalars().all()
+            # Versions whose blob is still pending are indexed by that blob's job.
+            version_ids = db.execute(
+                select(models.PolicyVersion.id)
+                .outerjoin(models.ContentBlob, models.ContentBlob.id == models.PolicyVersion.content_blob_id)
+                .where(models.PolicyVersion.search_vector.is_(None))
+                .where((models.PolicyVersion.content_blob_id.is_(None)) | (models.ContentBlob.extracted_at.isnot(None)))
+            ).scalars().all()
+        for blob_id in blob_ids:
+            self.submit_blob(blob_id)
+        for version_id in version_ids:
+            self.submit_version(version_id)
+
+    def _run(self, job: tuple) -> None:
+        with self._lock:
+            self._queued.discard(job)
+        started_at = time.monotonic()
+        kind, object_id = job
+        try:
+            with self.session_factory() as db:
+                if kind == "blob":
+                    self._index_blob(db, object_id)
+                else:
+                    self._index_version(db, object_id)
+            failed = False
+        except Exception:
+            logger.exception("Text extraction failed for %s %s", kind, object_id)
+            failed = True
+        with self._lock:
+            self._completed += not failed
+            self._failed += failed
+            self._total_run += time.monotonic() - started_at
+
+    def _extract_blob(self, db: Session, blob: models.ContentBlob) -> Optional[str]:
+        """Fill in ``blob.extracted_text`` if needed; None means try again later."""
+        if blob.extracted_at is not None:
+            return blob.extracted_text or ""
+        if not is_server_stored(blob.file_path, blob.file_hash, blob.storage):
+            logger.info("Not extracting content blob %s: not stored by the server", blob.id)
+            content = ""
+        else:
+            # Only from blobs whose matching hash the server computed too.
+            content = db.execute(
+                select(models.ContentBlob.extracted_text).where(
+                    models.ContentBlob.file_hash == blob.file_hash,
+                    or_(models.ContentBlob.storage == "chunks", models.ContentBlob.file_path == content_path(blob.file_hash)),
+                    models.ContentBlob.extracted_at.isnot(None),
+                    models.ContentBlob.id != blob.id,
+                ).limit(1)
+            ).scalar()
+            if content is not None:
+                with self._lock:
+                    self._reused += 1
+        if content is None:
+            path = blob.file_path
+            try:
+                path = resolve(blob.file_path)
+                if blob.storage == "chunks":
+                    content = extract_text(path, blob.mime_type, fileobj=open_chunked_blob(db, blob))
+                else:
+                    content = extract_text(path, blob.mime_type)
+            except UnsupportedContent as e:
+                if PdfReader is None and "pypdf" in str(e):
+                    logger.warning("Skipping content blob %s: %s", blob.id, e)
+                    return None
+                logger.info("Not extracting content blob %s: unsupported content (%s)", blob.id, e)
+                content = ""
+            except FileNotFoundError:
+                logger.warning("Content blob %s file %s not found; will retry on backfill", blob.id, path)
+                return None
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+                logger.warning("Could not extract content blob %s: %s", blob.id, e)
+                content = ""
+        blob.extracted_text = content[:EXTRACTION_MAX_CHARS]
+        blob.extracted_at = datetime.now(timezone.utc)
+        db.commit()
+        return blob.extracted_text
+
+    def _index_blob(self, db: Session, blob_id: int) -> None:
+        blob = db.get(models.ContentBlob, blob_id)
+        if blob is None or self._extract_blob(db, blob) is None:
+            return
+        version_ids = db.execute(
+            select(models.PolicyVersion.id).where(models.PolicyVersion.content_blob_id == blob_id)
+        ).scalars().all()
+        for version_id in version_ids:
+            self._index_version(db, version_id)
+
+    def _index_version(self, db: Session, version_id: int) -> None:
+        version = db.get(models.PolicyVersion, version_id)
+        if version is None:
+            return
+        content = ""
+        if version.content_blob_id is not None:
+            blob = db.get(models.ContentBlob, version.content_blob_id)
+            content = self._extract_blob(db, blob) if blob is not None else ""
+            if content is None:
+                return
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(_VERSION_VECTOR_SQL, {"content": content, "version_id": version_id})
+            db.execute(_POLICY_VECTOR_SQL, {"version_id": version_id})
+        else:
+            # No tsvector outside PostgreSQL: keep the plain text so it can still be matched.
+            version.search_vector = "\n".join(filter(None, [version.summary_of_changes, content]))
+            policy = db.get(models.Policy, version.policy_id)
+            if policy is not None and policy.current_version_id == version_id:
+                policy.search_vector = "\n".join(filter(None, [policy.title, policy.description, version.search_vector]))
+        db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed or 1
+            return {
+                "workers": self.workers,
+                "queued": len(self._queued),
+                "completed": self._completed,
+                "failed": self._failed,
+                "reused_by_hash": self._reused,
+                "avg_run_ms": round(self._total_run / completed * 1000, 2),
+                "pdf_supported": PdfReader is not None,
+            }
+
+
+extraction_pipeline = ExtractionPipeline()
+
+
+# --- Job queueing ---
+# New blobs and versions are collected at flush time and queued only once the
+# transaction commits, so workers never look for rows that aren't visible yet
+# (or were rolled back).
+
+_PENDING_KEY = "extraction_jobs"
+
+
+def _collect_new_content(session: Session, changes: FlushChanges) -> None:
+    blob_ids = {obj.id for obj in changes.new(models.ContentBlob)}
+    versions = {obj.id: obj.content_blob_id for obj in changes.new(models.PolicyVersion)}
+    if blob_ids or versions:
+        pending = session.info.setdefault(_PENDING_KEY, ({}, set()))
+        pending[0].update(versions)
+        pending[1].update(blob_ids)
+
+
+def _queue_new_content(pending) -> None:
+    versions, blob_ids = pending
+    for blob_id in sorted(blob_ids):
+        extraction_pipeline.submit_blob(blob_id)
+    # A version whose blob is new too is indexed by that blob's job.
+    for version_id, blob_id in sorted(versions.items()):
+        if blob_id not in blob_ids:
+            extraction_pipeline.submit_version(version_id)
+
+
+register_commit_hook(_PENDING_KEY, _collect_new_content, _queue_new_content)
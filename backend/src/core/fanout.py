@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import DateTime, exists, func, literal, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.src.core.outbox import enqueue_notifications
+from backend.src.core.session_hooks import FlushChanges, register_commit_hook
+from backend.src.database import SessionLocal
+from backend.src.models import policy as models
+
+logger = logging.getLogger(__name__)
+
+FANOUT_CHUNK_SIZE = int(os.getenv("FANOUT_CHUNK_SIZE", "2000")) # Users per transaction
+FANOUT_POLL_SECONDS = float(os.getenv("FANOUT_POLL_SECONDS", "5")) # For fan-outs created by other processes
+
+ACTIVE = ("Pending", "Running")
+
+
+def audience(fanout: models.AttestationFanOut):
+    """Condition on users.id selecting ``fanout``'s audience: members of its roles plus its users."""
+    role_ids = json.loads(fanout.role_ids)
+    user_ids = json.loads(fanout.user_ids)
+    conditions = []
+    if role_ids:
+        conditions.append(exists().where(models.UserRole.user_id == models.User.id, models.UserRole.role_id.in_(role_ids)))
+    if user_ids:
+        conditions.append(models.User.id.in_(user_ids))
+    return or_(*conditions)
+
+
+class FanOutWorker:
+    """Assigns policy versions to their fan-out audiences in the background.
+
+    A fan-out walks its audience in user id order, ``chunk_size`` users per
+    transaction. Each transaction creates the chunk's attestation
+    assignments with one INSERT ... SELECT that skips users who already have
+    one, queues a notification for exactly the users it assigned, and moves
+    the fan-out's ``last_user_id`` past the chunk. A restart resumes after
+    the last committed chunk, and running a fan-out for the same version
+    again only reaches users who weren't assigned, so nobody is notified
+    twice. The fan-out row is locked for each chunk, so several processes
+    can run the worker.
+    """
+
+    def __init__(self, session_factory=SessionLocal, chunk_size: int = FANOUT_CHUNK_SIZE,
+                 poll_seconds: float = FANOUT_POLL_SECONDS):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.poll_seconds = poll_seconds
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._chunks = 0
+        self._users = 0
+        self._assigned = 0
+        self._completed = 0
+        self._failed = 0
+        self._busy_seconds = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._loop, name="attestation-fanout", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopped.set()
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def notify(self) -> None:
+        """Look for new fan-outs now rather than at the next poll."""
+        self._wakeup.set()
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            try:
+                self.run_pending()
+            except Exception:
+                logger.exception("Attestation fan-out poll failed")
+            self._wakeup.wait(self.poll_seconds)
+
+    def run_pending(self) -> None:
+        """Run every unfinished fan-out to completion, oldest first."""
+        with self.session_factory() as db:
+            fanout_ids = db.execute(
+                select(models.AttestationFanOut.id)
+                .where(models.AttestationFanOut.status.in_(ACTIVE))
+                .order_by(models.AttestationFanOut.id)
+            ).scalars().all()
+        for fanout_id in fanout_ids:
+            if self._stopped.is_set():
+                return
+            self.run(fanout_id)
+
+    def run(self, fanout_id: int) -> None:
+        try:
+            while not self._stopped.is_set() and self.run_chunk(fanout_id):
+                pass
+        except Exception as exc:
+            logger.exception("Attestation fan-out %s failed", fanout_id)
+            with self.session_factory() as db:
+                db.execute(
+                    update(models.AttestationFanOut)
+                    .where(models.AttestationFanOut.id == fanout_id)
+                    .values(status="Failed", error=f"{type(exc).__name__}: {exc}"[:2000], finished_at=datetime.now(timezone.utc))
+                )
+                db.commit()
+            with self._lock:
+                self._failed += 1
+
+    def run_chunk(self, fanout_id: int) -> bool:
+        """Process the next chunk of a fan-out; returns False once there is nothing (left) to do."""
+        started_at = time.monotonic()
+        with self.session_factory() as db:
+            fanout = db.execute(
+                select(models.AttestationFanOut)
+                .where(models.AttestationFanOut.id == fanout_id, models.AttestationFanOut.status.in_(ACTIVE))
+                .with_for_update(skip_locked=True)
+            ).scalar()
+            if fanout is None: # Finished, or another process is on this chunk
+                return False
+            now = datetime.now(timezone.utc)
+            users = audience(fanout)
+            if fanout.status == "Pending":
+                fanout.status = "Running"
+                fanout.started_at = now
+                fanout.total = db.execute(select(func.count()).select_from(models.User).where(users)).scalar()
+
+            chunk = (
+                select(models.User.id)
+                .where(users, models.User.id > fanout.last_user_id)
+                .order_by(models.User.id)
+                .limit(self.chunk_size)
+                .subquery()
+            )
+            upper, size = db.execute(select(func.max(chunk.c.id), func.count())).one()
+            if upper is None:
+                fanout.status = "Completed"
+                fanout.finished_at = now
+                db.commit()
+                with self._lock:
+                    self._completed += 1
+                return False
+
+            in_chunk = (users, models.User.id > fanout.last_user_id, models.User.id <= upper)
+            dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+            assigned = db.execute(
+                dialect.insert(models.AttestationAssignment)
+                .from_select(
+                    ["policy_version_id", "user_id", "fanout_id", "due_at"],
+                    select(literal(fanout.policy_version_id), models.User.id, literal(fanout.id),
+                           literal(fanout.due_at, DateTime(timezone=True))).where(*in_chunk),
+                )
+                .on_conflict_do_nothing(index_elements=["policy_version_id", "user_id"])
+            ).rowcount
+            if assigned:
+                # Only the users this chunk assigned; the others were notified when they were.
+                enqueue_notifications(db, select(models.AttestationAssignment.user_id).where(
+                    models.AttestationAssignment.policy_version_id == fanout.policy_version_id,
+                    models.AttestationAssignment.user_id > fanout.last_user_id,
+                    models.AttestationAssignment.user_id <= upper,
+                    models.AttestationAssignment.fanout_id == fanout.id,
+                ), fanout.message)
+            fanout.last_user_id = upper
+            fanout.processed += size
+            fanout.assigned += assigned
+            db.commit()
+
+        with self._lock:
+            self._chunks += 1
+            self._users += size
+            self._assigned += assigned
+            self._busy_seconds += time.monotonic() - started_at
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "chunk_size": self.chunk_size,
+                "chunks": self._chunks,
+                "users": self._users,
+                "assigned": self._assigned,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_chunk_ms": round(self._busy_seconds / (self._chunks or 1) * 1000, 2),
+                "users_per_second": round(self._users / self._busy_seconds, 1) if self._busy_seconds else 0.0,
+            }
+
+
+fanout_worker = FanOutWorker()
+
+
+# --- Wakeups ---
+
+_PENDING_KEY = "attestation_fanouts_created"
+
+
+def _collect_fanouts(session: Session, changes: FlushChanges) -> None:
+    if changes.new(models.AttestationFanOut):
+        session.info[_PENDING_KEY] = True
+
+
+register_commit_hook(_PENDING_KEY, _collect_fanouts, lambda _: fanout_worker.notify())
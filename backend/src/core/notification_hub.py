@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend.src.core.session_hooks import FlushChanges, register_commit_hook
+from backend.src.database import async_engine
+from backend.src.models import policy as models
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL NOTIFY channel that carries the ids of users with new notifications.
+NOTIFY_CHANNEL = os.getenv("NOTIFICATION_NOTIFY_CHANNEL", "user_notifications")
+NOTIFY_LISTEN_CHECK_SECONDS = float(os.getenv("NOTIFY_LISTEN_CHECK_SECONDS", "30"))
+_NOTIFY_MAX_PAYLOAD = 7900 # PostgreSQL caps payloads just under 8000 bytes
+
+
+class NotificationHub:
+    """Wakes the SSE streams of users who have new notifications.
+
+    Each stream registers an asyncio.Event for its user and re-reads the
+    user's notifications past the last id it sent when the event fires, so a
+    wakeup carries no data and duplicate or merged wakeups are harmless.
+    Publishing only touches the streams of the users named, and idle streams
+    cost one Event each.
+
+    On PostgreSQL, committed notifications are announced with NOTIFY and
+    every process LISTENs, so a stream is woken whichever process wrote the
+    row. Elsewhere the hub is woken in-process after commit.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Event]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._published = 0
+        self._wakeups = 0
+
+    def subscribe(self, user_id: int) -> asyncio.Event:
+        self._loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        self._subscribers.setdefault(user_id, set()).add(wakeup)
+        return wakeup
+
+    def unsubscribe(self, user_id: int, wakeup: asyncio.Event) -> None:
+        subscribers = self._subscribers.get(user_id)
+        if subscribers is not None:
+            subscribers.discard(wakeup)
+            if not subscribers:
+                del self._subscribers[user_id]
+
+    def publish(self, user_ids: Iterable[int]) -> None:
+        """Wake ``user_ids``' streams; safe to call from any thread."""
+        loop = self._loop
+        if loop is None: # No stream has connected to this process yet
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake, list(user_ids))
+        except RuntimeError: # Loop closed
+            pass
+
+    def _wake(self, user_ids) -> None:
+        self._published += 1
+        for user_id in user_ids:
+            for wakeup in self._subscribers.get(user_id, ()):
+                wakeup.set()
+                self._wakeups += 1
+
+    def _wake_all(self) -> None:
+        self._wake(list(self._subscribers))
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._wake(int(user_id) for user_id in payload.split(",") if user_id)
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        if async_engine.dialect.name == "postgresql" and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def shutdown(self) -> None:
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.cancel()
+            try:
+                await listener
+            except asyncio.CancelledError:
+                pass
+
+    async def _listen(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                async with async_engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    driver = raw.driver_connection # The asyncpg connection; no transaction is open on it
+                    await driver.add_listener(NOTIFY_CHANNEL, self._on_notify)
+                    delay = 1.0
+                    # Anything committed while we weren't listening is picked up by a re-read.
+                    self._wake_all()
+                    try:
+                        while True:
+                            await asyncio.sleep(NOTIFY_LISTEN_CHECK_SECONDS)
+                            await driver.execute("SELECT 1") # Notice a dropped connection
+                    finally:
+                        if not driver.is_closed():
+                            await driver.remove_listener(NOTIFY_CHANNEL, self._on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Notification listener lost its connection; reconnecting in %.0fs", delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+
+    def stats(self) -> dict:
+        return {
+            "streams": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "users": len(self._subscribers),
+            "listening": self._listener is not None and not self._listener.done(),
+            "published": self._published,
+            "wakeups": self._wakeups,
+        }
+
+
+notification_hub = NotificationHub()
+
+
+# --- Announcing new notifications ---
+# On PostgreSQL NOTIFY is transactional: it is sent when the transaction
+# commits and dropped on rollback, so it can be issued right away. Otherwise
+# the user ids wait in the session until after_commit.
+
+_PENDING_KEY = "notification_hub_users"
+
+
+def announce_notifications(session: Session, user_ids: Iterable[int]) -> None:
+    """Wake ``user_ids``' streams once ``session``'s transaction commits."""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    if session.get_bind().dialect.name == "postgresql":
+        payload = ""
+        for user_id in user_ids:
+            if len(payload) + len(str(user_id)) + 1 > _NOTIFY_MAX_PAYLOAD:
+                session.connection().execute(select(func.pg_notify(NOTIFY_CHANNEL, payload)))
+                payload = ""
+            payload += f"{user_id},"
+        session.connection().execute(select(func.pg_notify(NOTIFY_CHANNEL, payload)))
+    else:
+        session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+
+def _collect_new_notifications(session: Session, changes: FlushChanges) -> None:
+    announce_notifications(session, (obj.user_id for obj in changes.new(models.Notification)))
+
+
+register_commit_hook(_PENDING_KEY, _collect_new_notifications, notification_hub.publish)
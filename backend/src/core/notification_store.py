@@ -0,0 +1,246 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Mapping, Optional
+
+from sqlalchemy import delete, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.src.core.session_hooks import FlushChanges, register_flush_hook
+from backend.src.database import SessionLocal
+from backend.src.models import policy as models
+
+logger = logging.getLogger(__name__)
+
+# Read notifications older than this are removed by the retention job; 0 keeps them forever.
+NOTIFICATION_RETENTION_DAYS = float(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+# delete: drop them; archive: move them to notifications_archive.
+NOTIFICATION_RETENTION_MODE = os.getenv("NOTIFICATION_RETENTION_MODE", "delete").lower()
+NOTIFICATION_RETENTION_BATCH_SIZE = int(os.getenv("NOTIFICATION_RETENTION_BATCH_SIZE", "1000"))
+NOTIFICATION_RETENTION_INTERVAL_SECONDS = float(os.getenv("NOTIFICATION_RETENTION_INTERVAL_SECONDS", "3600"))
+NOTIFICATION_RETENTION_PAUSE_SECONDS = float(os.getenv("NOTIFICATION_RETENTION_PAUSE_SECONDS", "0.05")) # Between batches
+
+# A notification counts as unread unless read is TRUE (the column is nullable).
+_UNREAD = models.Notification.read.isnot(True)
+_READ = models.Notification.read.is_(True)
+
+
+# --- Unread counters ---
+# notification_counters.unread changes by exactly the number of rows each
+# statement flipped, inserted or deleted, in the same transaction, so
+# concurrent writers never need to recount.
+
+def add_unread(db: Session, deltas: Mapping[int, int]) -> None:
+    """Add ``deltas`` (user id -> change) to the users' unread counters."""
+    rows = [{"user_id": user_id, "unread": delta} for user_id, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    # Sorted by user, so concurrent batches lock counters in the same order.
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(models.NotificationCounter).values(rows)
+    db.connection().execute(statement.on_conflict_do_update(
+        index_elements=[models.NotificationCounter.user_id],
+        set_={"unread": models.NotificationCounter.unread + statement.excluded.unread},
+    ))
+
+
+def count_new_notifications(db: Session, user_ids: Iterable[int]) -> None:
+    """Count notifications inserted (unread) with Core statements, one per user id."""
+    add_unread(db, Counter(user_ids))
+
+
+def unread_count(db: Session, user_id: int) -> int:
+    return db.execute(
+        select(models.NotificationCounter.unread).where(models.NotificationCounter.user_id == user_id)
+    ).scalar() or 0
+
+
+def _selection(user_id: int, ids: Optional[Iterable[int]], before: Optional[datetime]):
+    clauses = [models.Notification.user_id == user_id]
+    if ids is not None:
+        clauses.append(models.Notification.id.in_(list(ids)))
+    if before is not None:
+        clauses.append(models.Notification.created_at < before)
+    return clauses
+
+
+def set_read(db: Session, user_id: int, read: bool, ids: Optional[Iterable[int]] = None,
+             before: Optional[datetime] = None) -> int:
+    """Mark ``user_id``'s notifications (by id, or created before ``before``) read or unread.
+
+    One UPDATE that only touches rows whose state changes; returns how many did.
+    """
+    result = db.execute(
+        update(models.Notification)
+        .where(*_selection(user_id, ids, before), _UNREAD if read else _READ)
+        .values(read=read)
+        .execution_options(synchronize_session=False)
+    )
+    add_unread(db, {user_id: -result.rowcount if read else result.rowcount})
+    return result.rowcount
+
+
+def delete_notifications(db: Session, user_id: int, ids: Optional[Iterable[int]] = None,
+                         before: Optional[datetime] = None) -> int:
+    """Delete ``user_id``'s notifications (by id, or created before ``before``); returns how many."""
+    selection = _selection(user_id, ids, before)
+    # Unread and read rows separately, so the counter drops by exactly the unread ones deleted.
+    unread = db.execute(
+        delete(models.Notification).where(*selection, _UNREAD).execution_options(synchronize_session=False)
+    ).rowcount
+    read = db.execute(
+        delete(models.Notification).where(*selection, _READ).execution_options(synchronize_session=False)
+    ).rowcount
+    add_unread(db, {user_id: -unread})
+    return unread + read
+
+
+def _count_orm_changes(session: Session, changes: FlushChanges) -> None:
+    # Notifications added, deleted or flipped through the ORM; bulk statements count themselves.
+    deltas = Counter()
+    for obj in changes.new(models.Notification):
+        if obj.read is not True:
+            deltas[obj.user_id] += 1
+    for obj in changes.deleted(models.Notification):
+        if obj.read is not True:
+            deltas[obj.user_id] -= 1
+    for obj in changes.dirty(models.Notification):
+        history = inspect(obj).attrs.read.history
+        if history.added and history.deleted:
+            deltas[obj.user_id] += (history.added[0] is not True) - (history.deleted[0] is not True)
+    add_unread(session, deltas)
+
+
+register_flush_hook(_count_orm_changes)
+
+
+# --- Retention ---
+
+class NotificationRetention:
+    """Removes read notifications older than ``retention_days`` in the background.
+
+    Every ``interval_seconds`` a thread deletes (or, in archive mode, moves
+    to notifications_archive) due rows in batches of ``batch_size``, each
+    its own short transaction with a pause in between, so no lock is held
+    for long. On PostgreSQL a batch skips rows other transactions have
+    locked. Unread notifications are never removed, so the unread counters
+    are unaffected.
+    """
+
+    def __init__(self, session_factory=SessionLocal, retention_days: float = NOTIFICATION_RETENTION_DAYS,
+                 mode: str = NOTIFICATION_RETENTION_MODE, batch_size: int = NOTIFICATION_RETENTION_BATCH_SIZE,
+                 interval_seconds: float = NOTIFICATION_RETENTION_INTERVAL_SECONDS,
+                 pause_seconds: float = NOTIFICATION_RETENTION_PAUSE_SECONDS):
+        if mode not in ("delete", "archive"):
+            raise ValueError(f"Unknown NOTIFICATION_RETENTION_MODE: {mode}")
+        self.session_factory = session_factory
+        self.retention_days = retention_days
+        self.mode = mode
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.pause_seconds = pause_seconds
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._batches = 0
+        self._removed = 0
+        self._last_run_at: Optional[datetime] = None
+        self._last_run_removed = 0
+        self._last_run_seconds = 0.0
+
+    def start(self) -> None:
+        if self.retention_days <= 0:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._loop, name="notification-retention", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopped.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Notification retention run failed")
+            self._stopped.wait(self.interval_seconds)
+
+    def run_once(self) -> int:
+        """Remove everything currently due, batch by batch; returns how many rows went."""
+        started_at = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        removed = 0
+        while not self._stopped.is_set():
+            count = self.compact_batch(cutoff)
+            removed += count
+            with self._lock:
+                self._batches += 1
+            if count < self.batch_size:
+                break
+            time.sleep(self.pause_seconds)
+        with self._lock:
+            self._runs += 1
+            self._removed += removed
+            self._last_run_at = datetime.now(timezone.utc)
+            self._last_run_removed = removed
+            self._last_run_seconds = time.monotonic() - started_at
+        if removed:
+            logger.info("Notification retention removed %s read notifications created before %s", removed, cutoff)
+        return removed
+
+    def compact_batch(self, cutoff: datetime) -> int:
+        """Remove up to ``batch_size`` read notifications created before ``cutoff``."""
+        with self.session_factory() as db:
+            ids = db.execute(
+                select(models.Notification.id)
+                .where(_READ, models.Notification.created_at < cutoff)
+                .order_by(models.Notification.created_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not ids:
+                return 0
+            # The row locks keep the batch read on PostgreSQL; repeating the filter covers other databases.
+            batch = [models.Notification.id.in_(ids), _READ]
+            if self.mode == "archive":
+                db.execute(insert(models.ArchivedNotification).from_select(
+                    ["id", "user_id", "message", "read", "created_at"],
+                    select(models.Notification.id, models.Notification.user_id, models.Notification.message,
+                           models.Notification.read, models.Notification.created_at).where(*batch),
+                ))
+            removed = db.execute(
+                delete(models.Notification).where(*batch).execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.retention_days > 0,
+                "mode": self.mode,
+                "retention_days": self.retention_days,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "runs": self._runs,
+                "batches": self._batches,
+                "removed": self._removed,
+                "last_run_at": self._last_run_at,
+                "last_run_removed": self._last_run_removed,
+                "last_run_ms": round(self._last_run_seconds * 1000, 1),
+            }
+
+
+notification_retention = NotificationRetention()
@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql import Select
+
+from backend.src.core.notification_hub import announce_notifications
+from backend.src.core.notification_store import count_new_notifications
+from backend.src.core.session_hooks import FlushChanges, register_commit_hook
+from backend.src.database import SessionLocal
+from backend.src.models import policy as models
+
+logger = logging.getLogger(__name__)
+
+# Channels every notification is queued on; email and push are logging stand-ins for now.
+OUTBOX_CHANNELS = [name.strip() for name in os.getenv("OUTBOX_CHANNELS", "in_app").split(",") if name.strip()]
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2")) # For events committed by other processes and retries
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "5")) # Doubles with every attempt
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "900"))
+
+# On PostgreSQL only one process dispatches at a time, which keeps per-user order across workers.
+_DISPATCH_LOCK_ID = 0x6F7574626F78
+
+
+def enqueue_notification(db: Session, user_id: int, message: str) -> None:
+    """Queue ``message`` for ``user_id`` on every channel, as part of ``db``'s transaction."""
+    payload = json.dumps({"message": message}, separators=(",", ":"))
+    for channel in OUTBOX_CHANNELS:
+        db.add(models.OutboxEvent(channel=channel, user_id=user_id, payload=payload))
+
+
+def enqueue_notifications(db: Session, user_ids: Select, message: str) -> None:
+    """Queue ``message`` for every user id ``user_ids`` (a one-column SELECT) returns.
+
+    One INSERT ... SELECT per channel, part of ``db``'s transaction.
+    """
+    payload = json.dumps({"message": message}, separators=(",", ":"))
+    users = user_ids.subquery()
+    for channel in OUTBOX_CHANNELS:
+        db.execute(insert(models.OutboxEvent).from_select(
+            ["channel", "user_id", "payload"],
+            select(literal(channel), *users.c, literal(payload)),
+        ))
+    # Core inserts bypass the flush hook below.
+    db.info[_PENDING_KEY] = True
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class Channel(ABC):
+    """Delivers outbox events of one channel."""
+
+    name = ""
+
+    @abstractmethod
+    def deliver(self, db: Session, events: Sequence[models.OutboxEvent]) -> Dict[int, Optional[str]]:
+        """Deliver ``events`` (in id order) and return the ids of those that weren't delivered.
+
+        The value is the error, or None for an event held back because an
+        earlier one for the same user failed; held-back events are retried
+        without using up an attempt. Raising fails the whole batch. Runs
+        inside a savepoint of the dispatcher's transaction.
+        """
+
+
+class InAppChannel(Channel):
+    """Writes ``notifications`` rows, one multi-row INSERT per batch."""
+
+    name = "in_app"
+
+    def deliver(self, db, events):
+        db.execute(insert(models.Notification), [
+            {"user_id": e.user_id, "message": json.loads(e.payload)["message"], "created_at": e.created_at} for e in events
+        ])
+        count_new_notifications(db, (e.user_id for e in events))
+        announce_notifications(db, (e.user_id for e in events))
+        return {}
+
+
+class PerEventChannel(Channel):
+    """Channel for external services that take one message at a time."""
+
+    @abstractmethod
+    def send(self, event: models.OutboxEvent, payload: dict) -> None:
+        ...
+
+    def deliver(self, db, events):
+        undelivered = {}
+        failed_users = set()
+        for e in events:
+            if e.user_id in failed_users:
+                undelivered[e.id] = None
+                continue
+            try:
+                self.send(e, json.loads(e.payload))
+            except Exception as exc:
+                undelivered[e.id] = f"{type(exc).__name__}: {exc}"
+                failed_users.add(e.user_id)
+        return undelivered
+
+
+class LogChannel(PerEventChannel):
+    """Stand-in for an email or push provider: logs each message."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def send(self, event, payload):
+        logger.info("%s notification for user %s: %s", self.name, event.user_id, payload["message"])
+
+
+def _channel(name: str) -> Channel:
+    if name == "in_app":
+        return InAppChannel()
+    if name in ("email", "push"):
+        return LogChannel(name)
+    raise ValueError(f"Unknown outbox channel: {name}")
+
+
+class OutboxDispatcher:
+    """Delivers committed outbox events in the background.
+
+    A single thread claims up to ``batch_size`` due events in id order,
+    hands each channel its share in one call and deletes what was delivered,
+    all in one transaction. It runs when a transaction that queued events
+    commits in this process, and otherwise every ``poll_seconds``. Failed
+    events are retried with exponential backoff, and a user's later events
+    on the same channel wait behind them, so each user sees their
+    notifications in order. Events that fail OUTBOX_MAX_ATTEMPTS times are
+    kept with ``dead_at`` set.
+    """
+
+    def __init__(self, channels: Optional[Iterable[Channel]] = None, session_factory=SessionLocal,
+                 batch_size: int = OUTBOX_BATCH_SIZE, poll_seconds: float = OUTBOX_POLL_SECONDS,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+        channels = list(channels) if channels is not None else [_channel(name) for name in OUTBOX_CHANNELS]
+        self.channels = {channel.name: channel for channel in channels}
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._dispatched: Dict[str, int] = {}
+        self._batches = 0
+        self._retried = 0
+        self._dead = 0
+        self._busy_seconds = 0.0
+        self._total_lag = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._loop, name="outbox-dispatcher", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopped.set()
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def notify(self) -> None:
+        """Dispatch now rather than at the next poll."""
+        self._wakeup.set()
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.clear() # Commits from here on wake the next round
+            try:
+                claimed = self.dispatch_once()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                claimed = 0
+            if claimed < self.batch_size: # Caught up
+                self._wakeup.wait(self.poll_seconds)
+
+    def dispatch_once(self) -> int:
+        """Deliver one batch of due events; returns how many were claimed."""
+        started_at = time.monotonic()
+        now = datetime.now(timezone.utc)
+        with self.session_factory() as db:
+            if db.get_bind().dialect.name == "postgresql":
+                if not db.execute(select(func.pg_try_advisory_xact_lock(_DISPATCH_LOCK_ID))).scalar():
+                    return 0 # Another process is dispatching
+            # Skip events queued behind an earlier one for the same (channel, user) that waits for a retry.
+            earlier = aliased(models.OutboxEvent)
+            waiting_before = (
+                select(earlier.id)
+                .where(
+                    earlier.channel == models.OutboxEvent.channel,
+                    earlier.user_id == models.OutboxEvent.user_id,
+                    earlier.id < models.OutboxEvent.id,
+                    earlier.dead_at.is_(None),
+                    earlier.available_at > now,
+                )
+                .exists()
+            )
+            events = db.execute(
+                select(models.OutboxEvent)
+                .where(models.OutboxEvent.dead_at.is_(None), models.OutboxEvent.available_at <= now, ~waiting_before)
+                .order_by(models.OutboxEvent.id)
+                .limit(self.batch_size)
+            ).scalars().all()
+            if not events:
+                return 0
+            by_channel: Dict[str, List[models.OutboxEvent]] = {}
+            for e in events:
+                by_channel.setdefault(e.channel, []).append(e)
+
+            delivered = []
+            delivered_by_channel = {}
+            retried = dead = 0
+            for name, batch in by_channel.items():
+                undelivered = self._deliver(db, name, batch)
+                for e in batch:
+                    if e.id not in undelivered:
+                        delivered.append(e)
+                    elif undelivered[e.id] is not None:
+                        if self._fail(e, undelivered[e.id], now):
+                            dead += 1
+                        else:
+                            retried += 1
+                delivered_by_channel[name] = len(batch) - len(undelivered)
+            lag = sum((now - _as_utc(e.created_at)).total_seconds() for e in delivered if e.created_at is not None)
+            if delivered:
+                db.execute(delete(models.OutboxEvent).where(models.OutboxEvent.id.in_([e.id for e in delivered])))
+            db.commit()
+
+        with self._lock:
+            self._batches += 1
+            for name, count in delivered_by_channel.items():
+                self._dispatched[name] = self._dispatched.get(name, 0) + count
+            self._retried += retried
+            self._dead += dead
+            self._total_lag += lag
+            self._busy_seconds += time.monotonic() - started_at
+        return len(events)
+
+    def _deliver(self, db: Session, name: str, batch: List[models.OutboxEvent]) -> Dict[int, Optional[str]]:
+        channel = self.channels.get(name)
+        if channel is None:
+            return {e.id: f"Channel {name} is not enabled" for e in batch}
+        try:
+            with db.begin_nested():
+                return channel.deliver(db, batch)
+        except Exception as exc:
+            logger.warning("Outbox channel %s failed a batch of %s events", name, len(batch), exc_info=True)
+            return {e.id: f"{type(exc).__name__}: {exc}" for e in batch}
+
+    def _fail(self, e: models.OutboxEvent, error: str, now: datetime) -> bool:
+        """Schedule a retry, or give up; returns True if the event is now dead."""
+        e.attempts += 1
+        e.last_error = error[:2000]
+        if e.attempts >= self.max_attempts:
+            e.dead_at = now
+            logger.error("Giving up on outbox event %s (%s, user %s) after %s attempts: %s", e.id, e.channel, e.user_id, e.attempts, error)
+            return True
+        delay = min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * 2 ** (e.attempts - 1))
+        e.available_at = now + timedelta(seconds=delay)
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            dispatched = sum(self._dispatched.values())
+            return {
+                "channels": sorted(self.channels),
+                "running": self._thread is not None and self._thread.is_alive(),
+                "batches": self._batches,
+                "dispatched": dispatched,
+                "dispatched_by_channel": dict(self._dispatched),
+                "retried": self._retried,
+                "dead": self._dead,
+                "avg_batch_ms": round(self._busy_seconds / (self._batches or 1) * 1000, 2),
+                "events_per_second": round(dispatched / self._busy_seconds, 1) if self._busy_seconds else 0.0,
+                "avg_lag_ms": round(self._total_lag / (dispatched or 1) * 1000, 1),
+            }
+
+
+outbox_dispatcher = OutboxDispatcher()
+
+
+# --- Wakeups ---
+# Events only become visible to the dispatcher once their transaction
+# commits, so the dispatcher is woken from after_commit.
+
+_PENDING_KEY = "outbox_events_queued"
+
+
+def _collect_outbox_events(session: Session, changes: FlushChanges) -> None:
+    if changes.new(models.OutboxEvent):
+        session.info[_PENDING_KEY] = True
+
+
+register_commit_hook(_PENDING_KEY, _collect_outbox_events, lambda _: outbox_dispatcher.notify())
@@ -0,0 +1,273 @@
+import logging
+import os
+import pickle
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.src.core.cache import TTLCache
+from backend.src.core.session_hooks import FlushChanges, register_commit_hook
+from backend.src.models import policy as models
+
+try:
+    import redis
+    import redis.asyncio as redis_asyncio
+except ImportError: # Only needed for READ_CACHE_BACKEND=redis
+    redis = redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+# memory: per-process LRU; redis: shared by all workers; off: always read the database.
+# The memory backend only sees its own process's writes, so run several
+# workers with the redis backend.
+READ_CACHE_BACKEND = os.getenv("READ_CACHE_BACKEND", "memory").lower()
+READ_CACHE_URL = os.getenv("READ_CACHE_URL", "redis://localhost:6379/0")
+READ_CACHE_PREFIX = os.getenv("READ_CACHE_PREFIX", "power-policy:read-cache:")
+# Redis entries are invalidated for all workers, so the TTL only bounds
+# memory use; a memory entry can miss another worker's write until it expires.
+READ_CACHE_TTL_SECONDS = float(os.getenv("READ_CACHE_TTL_SECONDS", "300" if READ_CACHE_BACKEND == "redis" else "10"))
+READ_CACHE_MAX_ENTRIES = int(os.getenv("READ_CACHE_MAX_ENTRIES", "10000"))
+
+DOCUMENT_TYPES_KEY = "document-types"
+
+
+def policy_key(policy_id: int) -> str:
+    return f"policy:{policy_id}"
+
+
+class CacheBackend(ABC):
+    """Storage behind ReadCache.
+
+    Fills are conditional: ``fill_token`` is taken before the value is
+    loaded and ``set`` stores it only if no invalidation happened in
+    between, so a value read before a commit can't be cached after it.
+    """
+
+    name = "none"
+
+    @abstractmethod
+    async def get(self, key: str) -> Any:
+        ...
+
+    @abstractmethod
+    async def fill_token(self) -> Any:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, token: Any) -> bool:
+        ...
+
+    @abstractmethod
+    def invalidate(self, keys: Iterable[str]) -> None:
+        """Drop ``keys``; called after commit, from sync code."""
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU with a TTL, bounded to ``maxsize`` entries."""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int = READ_CACHE_MAX_ENTRIES, ttl: float = READ_CACHE_TTL_SECONDS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generation = 0 # Bumped by every invalidation
+        self._invalidations = 0
+        self._stale_fills = 0
+
+    async def get(self, key: str) -> Any:
+        return self._cache.get(key)
+
+    async def fill_token(self) -> int:
+        return self._generation
+
+    async def set(self, key: str, value: Any, token: int) -> bool:
+        with self._lock:
+            if token != self._generation:
+                self._stale_fills += 1
+                return False
+            self._cache.set(key, value)
+        return True
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._cache.delete(key)
+                self._invalidations += 1
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self._cache.stats(), "invalidations": self._invalidations, "stale_fills": self._stale_fills}
+
+
+# Store the value only if the generation counter hasn't moved since the fill started.
+_SET_IF_CURRENT = """
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class RedisBackend(CacheBackend):
+    """Shared backend: entries and the invalidation counter live in Redis.
+
+    Reads and fills use the asyncio client; invalidations run in
+    after_commit hooks, which are synchronous, so they use a blocking one.
+    Values are pickled, so the Redis instance must only be reachable by
+    this application.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = READ_CACHE_URL, ttl: float = READ_CACHE_TTL_SECONDS, prefix: str = READ_CACHE_PREFIX):
+        if redis is None:
+            raise RuntimeError("READ_CACHE_BACKEND=redis needs the redis package")
+        self._client = redis_asyncio.Redis.from_url(url, socket_timeout=1.0)
+        self._sync_client = redis.Redis.from_url(url, socket_timeout=1.0)
+        self._set_if_current = self._client.register_script(_SET_IF_CURRENT)
+        self._prefix = prefix
+        self._generation_key = prefix + "generation"
+        self._ttl_ms = int(ttl * 1000)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._invalidations = 0
+        self._stale_fills = 0
+
+    async def get(self, key: str) -> Any:
+        raw = await self._client.get(self._prefix + key)
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if raw is None else pickle.loads(raw)
+
+    async def fill_token(self) -> bytes:
+        return await self._client.get(self._generation_key) or b"0"
+
+    async def set(self, key: str, value: Any, token: bytes) -> bool:
+        stored = await self._set_if_current(
+            keys=[self._prefix + key, self._generation_key],
+            args=[pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), token, self._ttl_ms],
+        )
+        if not stored:
+            with self._lock:
+                self._stale_fills += 1
+        return bool(stored)
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        keys = [self._prefix + key for key in keys]
+        pipeline = self._sync_client.pipeline(transaction=True)
+        pipeline.incr(self._generation_key)
+        pipeline.delete(*keys)
+        pipeline.execute()
+        with self._lock:
+            self._invalidations += len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"backend": self.name, "hits": self.hits, "misses": self.misses,
+                     "invalidations": self._invalidations, "stale_fills": self._stale_fills}
+        try:
+            stats["evictions"] = self._sync_client.info("stats").get("evicted_keys") # Server-wide
+        except redis.RedisError:
+            stats["evictions"] = None
+        return stats
+
+
+class ReadCache:
+    """Read-through cache for rarely written rows, invalidated when writes commit.
+
+    Values are detached pydantic models, or tuples of them and data derived
+    from them, that callers must not modify. A
+    failing backend is treated as a miss: the value is loaded from the
+    database and not cached.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend]):
+        self.backend = backend
+
+    async def get_or_load(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for ``key``, or ``await load()`` and cache it. None is never cached."""
+        backend = self.backend
+        if backend is None:
+            return await load()
+        token = None
+        try:
+            value = await backend.get(key)
+            if value is not None:
+                return value
+            token = await backend.fill_token()
+        except Exception:
+            logger.warning("Read cache lookup for %s failed", key, exc_info=True)
+        value = await load()
+        if value is not None and token is not None:
+            try:
+                await backend.set(key, value, token)
+            except Exception:
+                logger.warning("Read cache fill for %s failed", key, exc_info=True)
+        return value
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if self.backend is None or not keys:
+            return
+        try:
+            self.backend.invalidate(keys)
+        except Exception:
+            # Entries expire after READ_CACHE_TTL_SECONDS at the latest.
+            logger.error("Read cache invalidation of %s failed", keys, exc_info=True)
+
+    def stats(self) -> dict:
+        if self.backend is None:
+            return {"backend": "off"}
+        return self.backend.stats()
+
+
+def _make_backend() -> Optional[CacheBackend]:
+    if READ_CACHE_BACKEND == "off":
+        return None
+    if READ_CACHE_BACKEND == "redis":
+        return RedisBackend()
+    if READ_CACHE_BACKEND == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown READ_CACHE_BACKEND: {READ_CACHE_BACKEND}")
+
+
+read_cache = ReadCache(_make_backend())
+
+
+# --- Invalidation ---
+# Affected keys are collected at flush time and dropped once the transaction
+# commits. Together with the conditional fills above, a reader can't put a
+# pre-commit row back into the cache after the invalidation.
+
+_PENDING_KEY = "read_cache_invalidations"
+
+
+def _collect_cached_changes(session: Session, changes: FlushChanges) -> None:
+    keys = {policy_key(obj.id) for obj in changes.touched(models.Policy)}
+    # A policy's entry embeds its versions and current_version.
+    keys.update(policy_key(obj.policy_id) for obj in changes.touched(models.PolicyVersion))
+    if changes.touched(models.DocumentType):
+        keys.add(DOCUMENT_TYPES_KEY)
+    changed_document_types = [obj.id for obj in changes.dirty(models.DocumentType) + changes.deleted(models.DocumentType)]
+    if changed_document_types:
+        # Policies embed their document type.
+        policy_ids = session.connection().execute(
+            select(models.Policy.id).where(models.Policy.document_type_id.in_(changed_document_types))
+        ).scalars()
+        keys.update(policy_key(policy_id) for policy_id in policy_ids)
+    if keys:
+        session.info.setdefault(_PENDING_KEY, set()).update(keys)
+
+
+register_commit_hook(_PENDING_KEY, _collect_cached_changes, read_cache.invalidate)
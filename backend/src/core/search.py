@@ -0,0 +1,634 @@
+import heapq
+import logging
+import math
+import os
+import pickle
+import re
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import anyio
+from sqlalchemy import Float, Integer, case, cast, column, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.src.core.pagination import Keyset
+from backend.src.core.session_hooks import FlushChanges, register_commit_hook
+from backend.src.database import SessionLocal, engine
+from backend.src.models import policy as models
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto") # auto | postgres | bm25; auto picks postgres on PostgreSQL
+# ts_rank_cd weights for the vector's {D, C, B, A} labels: document body,
+# version summary, description, title (see core/extraction.py).
+SEARCH_RANK_WEIGHTS = os.getenv("SEARCH_RANK_WEIGHTS", "0.1,0.2,0.4,1.0")
+# ts_headline re-parses the text it highlights, so snippets only look at a prefix of long documents.
+SEARCH_SNIPPET_MAX_CHARS = int(os.getenv("SEARCH_SNIPPET_MAX_CHARS", "50000"))
+# BM25 backend: where to keep the index snapshot (empty disables snapshots) and
+# how often to pick up changes made by other processes (0 disables).
+SEARCH_INDEX_SNAPSHOT = os.getenv("SEARCH_INDEX_SNAPSHOT", "")
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "60"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+_TS_CONFIG = literal_column("'english'::regconfig")
+_HIGHLIGHT = "StartSel=<mark>, StopSel=</mark>"
+
+
+class SearchUnavailable(Exception):
+    pass
+
+
+class _Hit(NamedTuple):
+    rank: float
+    id: int
+
+
+def _hit_keyset() -> Keyset:
+    # Hits are ordered by (rank, id) descending and paged on that key.
+    return Keyset(column("rank", Float), column("id", Integer), descending=True)
+
+
+class SearchBackend(ABC):
+    """Ranks policies for GET /policies/search/.
+
+    ``search`` returns a page (``{"items", "next_cursor"}``) of dicts shaped
+    like schemas.PolicySearchHit. Backends that keep their own index also
+    receive ``start``/``shutdown`` from the app lifespan and the ids of
+    policies changed by committed transactions.
+    """
+
+    tracks_changes = False
+
+    def start(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+    def policies_changed(self, policy_ids: Iterable[int], blob_ids: Iterable[int], removed_ids: Iterable[int]) -> None:
+        pass
+
+    @abstractmethod
+    async def search(self, db: AsyncSession, query: str, status: Optional[str], document_type_id: Optional[int],
+                     cursor: Optional[str], limit: int) -> dict:
+        ...
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__}
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Ranks with ts_rank_cd over policies.search_vector and highlights with ts_headline."""
+
+    async def search(self, db, query, status, document_type_id, cursor, limit):
+        ts_query = func.websearch_to_tsquery(_TS_CONFIG, query)
+        weights = literal_column(f"'{{{SEARCH_RANK_WEIGHTS}}}'::real[]")
+        # Normalization 1 divides by 1 + log(length) so long documents don't win on volume alone.
+        rank = cast(func.ts_rank_cd(weights, models.Policy.search_vector, ts_query, 1), Float).label("rank")
+        keyset = Keyset(rank, models.Policy.id, descending=True)
+
+        matches = select(models.Policy.id, rank).where(models.Policy.search_vector.op("@@")(ts_query))
+        if status is not None:
+            matches = matches.where(models.Policy.status == status)
+        if document_type_id is not None:
+            matches = matches.where(models.Policy.document_type_id == document_type_id)
+        matches = keyset.apply(matches, cursor, limit).subquery()
+
+        # Snippets are computed only for the page of hits, not for every match.
+        document = func.concat_ws(" ", models.Policy.description, func.left(models.ContentBlob.extracted_text, SEARCH_SNIPPET_MAX_CHARS))
+        statement = (
+            select(
+                models.Policy.id,
+                models.Policy.title,
+                models.Policy.status,
+                models.Policy.document_type_id,
+                models.Policy.current_version_id,
+                models.Policy.updated_at,
+                matches.c.rank,
+                func.ts_headline(_TS_CONFIG, models.Policy.title, ts_query, f"HighlightAll=true, {_HIGHLIGHT}").label("title_highlight"),
+                func.ts_headline(_TS_CONFIG, document, ts_query, f"MaxFragments=2, MaxWords=30, MinWords=10, {_HIGHLIGHT}").label("snippet"),
+            )
+            .join(matches, matches.c.id == models.Policy.id)
+            .outerjoin(models.PolicyVersion, models.PolicyVersion.id == models.Policy.current_version_id)
+            .outerjoin(models.ContentBlob, models.ContentBlob.id == models.PolicyVersion.content_blob_id)
+            .order_by(matches.c.rank.desc(), models.Policy.id.desc())
+        )
+        result = await db.execute(statement)
+        return keyset.page(result.all(), limit)
+
+
+# --- BM25 ---
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such that the their then there these "
+    "they this to was will with".split()
+)
+# Term frequencies are weighted per field, in the same order as the Postgres
+# vector weights: title, description, version summary, document body.
+_FIELD_WEIGHTS = (4, 2, 1, 1)
+
+
+def _normalize(token: str) -> str:
+    # Light plural folding so "employees" matches "employee"; no full stemming.
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [_normalize(t) for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def highlight(text: Optional[str], terms: Sequence[str], max_words: Optional[int] = None) -> Optional[str]:
+    """Wrap words matching ``terms`` in <mark>; with ``max_words``, keep a window around the first match."""
+    if not text:
+        return None
+    words = text.split()
+    wanted = set(terms)
+    marked = []
+    first = None
+    for i, word in enumerate(words):
+        if max_words is not None and first is not None and i >= first + max_words:
+            break
+        if any(_normalize(t) in wanted for t in _TOKEN.findall(word.lower()) if t not in _STOPWORDS):
+            first = i if first is None else first
+            word = f"<mark>{word}</mark>"
+        marked.append(word)
+    if max_words is None:
+        return " ".join(marked)
+    if first is None:
+        return " ".join(marked[:max_words])
+    start = max(0, first - max_words // 3)
+    return " ".join(marked[start:start + max_words])
+
+
+class BM25Index:
+    """In-memory inverted index with BM25 scoring.
+
+    Documents occupy dense integer slots. Each term's postings are two
+    parallel ``array('I')`` columns (slots and field-weighted term
+    frequencies), so a posting costs 8 bytes rather than a Python object.
+    Updating a document tombstones its old slot and appends a new one;
+    tombstoned postings are dropped by ``compact`` once they make up a
+    quarter of the index. All methods are thread-safe.
+    """
+
+    SNAPSHOT_FORMAT = 1
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._slot_policy = array("q")
+        self._slot_length = array("I")
+        self._slot_doc_type = array("q") # -1 when the policy has no document type
+        self._slot_status: List[str] = []
+        self._slot_alive = bytearray()
+        self._policy_slot: Dict[int, int] = {}
+        self._total_length = 0
+        self._dead = 0
+        self.watermark = None # Latest policy or extraction change seen, for catching up on changes
+
+    def __len__(self) -> int:
+        return len(self._policy_slot)
+
+    def upsert(self, policy_id: int, fields: Sequence[Optional[str]], status: str, document_type_id: Optional[int]) -> None:
+        frequencies: Dict[str, int] = {}
+        for text, weight in zip(fields, _FIELD_WEIGHTS):
+            for token in tokenize(text):
+                frequencies[token] = frequencies.get(token, 0) + weight
+        length = sum(frequencies.values())
+        with self._lock:
+            self._remove(policy_id)
+            slot = len(self._slot_policy)
+            self._slot_policy.append(policy_id)
+            self._slot_length.append(length)
+            self._slot_doc_type.append(-1 if document_type_id is None else document_type_id)
+            self._slot_status.append(sys.intern(status or ""))
+            self._slot_alive.append(1)
+            self._policy_slot[policy_id] = slot
+            self._total_length += length
+            for term, frequency in frequencies.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = (array("I"), array("I"))
+                posting[0].append(slot)
+                posting[1].append(frequency)
+            self._maybe_compact()
+
+    def remove(self, policy_id: int) -> None:
+        with self._lock:
+            self._remove(policy_id)
+            self._maybe_compact()
+
+    def _remove(self, policy_id: int) -> None:
+        slot = self._policy_slot.pop(policy_id, None)
+        if slot is not None:
+            self._slot_alive[slot] = 0
+            self._total_length -= self._slot_length[slot]
+            self._dead += 1
+
+    def policy_ids(self) -> set:
+        with self._lock:
+            return set(self._policy_slot)
+
+    def _maybe_compact(self) -> None:
+        if self._dead > 1000 and self._dead * 4 > len(self._slot_alive):
+            self.compact()
+
+    def compact(self) -> None:
+        """Drop tombstoned slots and renumber the live ones."""
+        with self._lock:
+            alive = self._slot_alive
+            remap = array("q", [-1]) * len(alive)
+            slot_policy, slot_length, slot_doc_type = array("q"), array("I"), array("q")
+            slot_status = []
+            for old, is_alive in enumerate(alive):
+                if is_alive:
+                    remap[old] = len(slot_policy)
+                    slot_policy.append(self._slot_policy[old])
+                    slot_length.append(self._slot_length[old])
+                    slot_doc_type.append(self._slot_doc_type[old])
+                    slot_status.append(self._slot_status[old])
+            postings = {}
+            for term, (slots, frequencies) in self._postings.items():
+                new_slots, new_frequencies = array("I"), array("I")
+                for slot, frequency in zip(slots, frequencies):
+                    if alive[slot]:
+                        new_slots.append(remap[slot])
+                        new_frequencies.append(frequency)
+                if new_slots:
+                    postings[term] = (new_slots, new_frequencies)
+            self._postings = postings
+            self._slot_policy, self._slot_length, self._slot_doc_type = slot_policy, slot_length, slot_doc_type
+            self._slot_status = slot_status
+            self._slot_alive = bytearray(b"\x01") * len(slot_policy)
+            self._policy_slot = {policy_id: slot for slot, policy_id in enumerate(slot_policy)}
+            self._dead = 0
+
+    def search(self, terms: Sequence[str], status: Optional[str] = None, document_type_id: Optional[int] = None,
+               after: Optional[Tuple[float, int]] = None, limit: int = 20) -> List[Tuple[float, int]]:
+        """Return up to ``limit`` ``(score, policy_id)`` pairs matching every term, best first."""
+        terms = list(dict.fromkeys(terms))
+        if not terms:
+            return []
+        with self._lock:
+            documents = len(self._policy_slot)
+            if not documents:
+                return []
+            postings = [self._postings.get(term) for term in terms]
+            if any(p is None for p in postings):
+                return []
+            # Score the rarest term first so later terms only touch its candidates.
+            postings.sort(key=lambda p: len(p[0]))
+            k1, b = self.k1, self.b
+            average_length = self._total_length / documents
+            lengths, alive = self._slot_length, self._slot_alive
+            scores: Dict[int, float] = {}
+            for i, (slots, frequencies) in enumerate(postings):
+                # Document frequency counts live postings only, so updates don't skew idf.
+                matching = 0
+                term_scores = {}
+                for slot, frequency in zip(slots, frequencies):
+                    if not alive[slot]:
+                        continue
+                    matching += 1
+                    if i and slot not in scores:
+                        continue
+                    norm = k1 * (1 - b + b * lengths[slot] / average_length)
+                    term_scores[slot] = frequency * (k1 + 1) / (frequency + norm)
+                idf = math.log(1 + (documents - matching + 0.5) / (matching + 0.5))
+                scores = {slot: scores.get(slot, 0.0) + idf * score for slot, score in term_scores.items()}
+                if not scores:
+                    return []
+            hits = []
+            for slot, score in scores.items():
+                if status is not None and self._slot_status[slot] != status:
+                    continue
+                if document_type_id is not None and self._slot_doc_type[slot] != document_type_id:
+                    continue
+                hit = (score, self._slot_policy[slot])
+                if after is not None and hit >= after:
+                    continue
+                hits.append(hit)
+        return heapq.nlargest(limit, hits)
+
+    def stats(self) -> dict:
+        with self._lock:
+            postings = sum(len(slots) for slots, _ in self._postings.values())
+            array_bytes = sum(
+                slots.itemsize * slots.buffer_info()[1] * 2 for slots, _ in self._postings.values()
+            ) + sum(a.itemsize * len(a) for a in (self._slot_policy, self._slot_length, self._slot_doc_type))
+            return {
+                "documents": len(self._policy_slot),
+                "slots": len(self._slot_alive),
+                "terms": len(self._postings),
+                "postings": postings,
+                "postings_bytes": array_bytes,
+            }
+
+    def save(self, path: str) -> None:
+        """Write the index to ``path`` atomically."""
+        with self._lock:
+            self.compact()
+            state = {
+                "format": self.SNAPSHOT_FORMAT,
+                "postings": self._postings,
+                "slot_policy": self._slot_policy,
+                "slot_length": self._slot_length,
+                "slot_doc_type": self._slot_doc_type,
+                "slot_status": self._slot_status,
+                "watermark": self.watermark,
+            }
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """Replace the index with the snapshot at ``path``; False if there is no usable snapshot."""
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        if state.get("format") != self.SNAPSHOT_FORMAT:
+            logger.warning("Ignoring search index snapshot %s with unknown format", path)
+            return False
+        with self._lock:
+            self._postings = state["postings"]
+            self._slot_policy = state["slot_policy"]
+            self._slot_length = state["slot_length"]
+            self._slot_doc_type = state["slot_doc_type"]
+            self._slot_status = [sys.intern(s) for s in state["slot_status"]]
+            self._slot_alive = bytearray(b"\x01") * len(self._slot_policy)
+            self._policy_slot = {policy_id: slot for slot, policy_id in enumerate(self._slot_policy)}
+            self._total_length = sum(self._slot_length)
+            self._dead = 0
+            self.watermark = state["watermark"]
+        return True
+
+
+def _document_rows(db: Session, policy_ids: Optional[Iterable[int]] = None, since=None):
+    # Extracted text lands on the blob without touching the policy row, so a
+    # document changes at the later of the two; CASE stands in for GREATEST,
+    # which SQLite lacks, and skips a NULL extracted_at.
+    policy_changed_at = func.coalesce(models.Policy.updated_at, models.Policy.created_at)
+    changed_at = case(
+        (models.ContentBlob.extracted_at > policy_changed_at, models.ContentBlob.extracted_at),
+        else_=policy_changed_at,
+    )
+    statement = (
+        select(
+            models.Policy.id,
+            models.Policy.title,
+            models.Policy.description,
+            models.PolicyVersion.summary_of_changes,
+            models.ContentBlob.extracted_text,
+            models.Policy.status,
+            models.Policy.document_type_id,
+            changed_at.label("changed_at"),
+        )
+        .outerjoin(models.PolicyVersion, models.PolicyVersion.id == models.Policy.current_version_id)
+        .outerjoin(models.ContentBlob, models.ContentBlob.id == models.PolicyVersion.content_blob_id)
+    )
+    if policy_ids is not None:
+        statement = statement.where(models.Policy.id.in_(list(policy_ids)))
+    if since is not None:
+        statement = statement.where(changed_at >= since)
+    return db.execute(statement.execution_options(yield_per=1000))
+
+
+class BM25SearchBackend(SearchBackend):
+    """Search without PostgreSQL: a BM25Index kept in sync with the database.
+
+    The index is loaded from SEARCH_INDEX_SNAPSHOT (or built from the
+    database) on a background thread at startup. Policies changed by commits
+    in this process are re-indexed right after the commit; changes committed
+    by other processes are picked up every SEARCH_INDEX_REFRESH_SECONDS
+    from the change-time watermark, and their deletes when a search returns
+    a policy that is gone. All index maintenance runs on a single thread, so
+    updates apply in order.
+    """
+
+    tracks_changes = True
+
+    def __init__(self, session_factory=SessionLocal, snapshot_path: str = SEARCH_INDEX_SNAPSHOT,
+                 refresh_seconds: float = SEARCH_INDEX_REFRESH_SECONDS):
+        self.session_factory = session_factory
+        self.snapshot_path = snapshot_path
+        self.refresh_seconds = refresh_seconds
+        self.index = BM25Index()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._build_seconds = None
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        self._stopped.clear()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+        self._executor.submit(self._warm_up)
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        self._stopped.set()
+        if executor is None:
+            return
+        executor.shutdown(wait=True, cancel_futures=True)
+        if self.snapshot_path and self._ready.is_set():
+            self.index.save(self.snapshot_path)
+
+    def _warm_up(self) -> None:
+        started_at = time.monotonic()
+        try:
+            if self.snapshot_path and self.index.load(self.snapshot_path):
+                self._catch_up()
+                self._drop_deleted()
+            else:
+                self._rebuild()
+        except Exception:
+            logger.exception("Building the search index failed")
+            return
+        if self._stopped.is_set():
+            return
+        self._build_seconds = time.monotonic() - started_at
+        self._ready.set()
+        if self.snapshot_path:
+            self.index.save(self.snapshot_path)
+        if self.refresh_seconds > 0:
+            threading.Thread(target=self._refresh_loop, name="search-index-refresh", daemon=True).start()
+
+    def _refresh_loop(self) -> None:
+        while not self._stopped.wait(self.refresh_seconds):
+            self._submit(self._catch_up)
+
+    def _apply(self, rows) -> None:
+        for row in rows:
+            if self._stopped.is_set(): # Don't hold up shutdown for a build nobody will use
+                return
+            self.index.upsert(
+                row.id,
+                (row.title, row.description, row.summary_of_changes, row.extracted_text),
+                row.status,
+                row.document_type_id,
+            )
+            if row.changed_at is not None and (self.index.watermark is None or row.changed_at > self.index.watermark):
+                self.index.watermark = row.changed_at
+
+    def _rebuild(self) -> None:
+        self.index = BM25Index()
+        with self.session_factory() as db:
+            self._apply(_document_rows(db))
+
+    def _catch_up(self) -> None:
+        """Re-index policies changed since the watermark."""
+        with self.session_factory() as db:
+            self._apply(_document_rows(db, since=self.index.watermark))
+
+    def _drop_deleted(self) -> None:
+        """Remove policies that no longer exist; only needed after loading a snapshot.
+
+        Later, deletes in this process arrive through policies_changed, and
+        those made elsewhere are dropped when a search turns them up.
+        """
+        with self.session_factory() as db:
+            existing = set(db.execute(select(models.Policy.id)).scalars())
+        for policy_id in self.index.policy_ids() - existing:
+            self.index.remove(policy_id)
+
+    def _reindex(self, policy_ids: set, blob_ids: set, removed_ids: set) -> None:
+        with self.session_factory() as db:
+            if blob_ids:
+                policy_ids |= set(db.execute(
+                    select(models.Policy.id)
+                    .join(models.PolicyVersion, models.PolicyVersion.id == models.Policy.current_version_id)
+                    .where(models.PolicyVersion.content_blob_id.in_(blob_ids))
+                ).scalars())
+            found = set()
+            if policy_ids:
+                rows = _document_rows(db, policy_ids=policy_ids).all()
+                found = {row.id for row in rows}
+                self._apply(rows)
+        for policy_id in removed_ids | (policy_ids - found):
+            self.index.remove(policy_id)
+
+    def _submit(self, fn, *args) -> None:
+        executor = self._executor
+        if executor is None:
+            return
+        try:
+            executor.submit(self._run, fn, *args)
+        except RuntimeError: # Shut down in the meantime
+            pass
+
+    def _run(self, fn, *args) -> None:
+        try:
+            fn(*args)
+        except Exception:
+            logger.exception("Updating the search index failed")
+
+    def policies_changed(self, policy_ids, blob_ids, removed_ids) -> None:
+        self._submit(self._reindex, set(policy_ids), set(blob_ids), set(removed_ids))
+
+    async def search(self, db, query, status, document_type_id, cursor, limit):
+        if not self._ready.is_set():
+            raise SearchUnavailable("Search index is still loading")
+        keyset = _hit_keyset()
+        after = tuple(keyset.decode(cursor)) if cursor else None
+        terms = tokenize(query)
+        hits = await anyio.to_thread.run_sync(self.index.search, terms, status, document_type_id, after, limit + 1)
+        page = keyset.page([_Hit(score, policy_id) for score, policy_id in hits], limit)
+        if not page["items"]:
+            return page
+
+        result = await db.execute(
+            select(
+                models.Policy.id,
+                models.Policy.title,
+                models.Policy.status,
+                models.Policy.document_type_id,
+                models.Policy.current_version_id,
+                models.Policy.updated_at,
+                models.Policy.description,
+                func.substr(models.ContentBlob.extracted_text, 1, SEARCH_SNIPPET_MAX_CHARS).label("content"),
+            )
+            .outerjoin(models.PolicyVersion, models.PolicyVersion.id == models.Policy.current_version_id)
+            .outerjoin(models.ContentBlob, models.ContentBlob.id == models.PolicyVersion.content_blob_id)
+            .where(models.Policy.id.in_([hit.id for hit in page["items"]]))
+        )
+        rows = {row.id: row for row in result}
+        deleted = {hit.id for hit in page["items"]} - set(rows)
+        if deleted: # Deleted by another process since they were indexed
+            self._submit(self._reindex, set(), set(), deleted)
+        items = []
+        for hit in page["items"]:
+            row = rows.get(hit.id)
+            if row is None:
+                continue
+            document = " ".join(filter(None, [row.description, row.content]))
+            items.append({
+                "id": row.id,
+                "title": row.title,
+                "status": row.status,
+                "document_type_id": row.document_type_id,
+                "current_version_id": row.current_version_id,
+                "updated_at": row.updated_at,
+                "rank": hit.rank,
+                "title_highlight": highlight(row.title, terms),
+                "snippet": highlight(document, terms, max_words=30),
+            })
+        return {"items": items, "next_cursor": page["next_cursor"]}
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "ready": self._ready.is_set(),
+            "build_seconds": self._build_seconds,
+            **self.index.stats(),
+        }
+
+
+def _create_backend() -> SearchBackend:
+    if SEARCH_BACKEND == "bm25" or (SEARCH_BACKEND == "auto" and engine.dialect.name != "postgresql"):
+        return BM25SearchBackend()
+    return PostgresSearchBackend()
+
+
+search_backend = _create_backend()
+
+
+# --- Change tracking ---
+# Like the extraction queue, changed policies are collected at flush time and
+# handed to the backend only after the transaction commits.
+
+_PENDING_KEY = "search_index_changes"
+
+
+def _collect_search_changes(session: Session, changes: FlushChanges) -> None:
+    if not search_backend.tracks_changes:
+        return
+    policy_ids = {obj.id for obj in changes.written(models.Policy)}
+    policy_ids.update(obj.policy_id for obj in changes.written(models.PolicyVersion))
+    blob_ids = {obj.id for obj in changes.written(models.ContentBlob)}
+    removed_ids = {obj.id for obj in changes.deleted(models.Policy)}
+    if policy_ids or blob_ids or removed_ids:
+        pending = session.info.setdefault(_PENDING_KEY, (set(), set(), set()))
+        pending[0].update(policy_ids)
+        pending[1].update(blob_ids)
+        pending[2].update(removed_ids)
+
+
+register_commit_hook(_PENDING_KEY, _collect_search_changes, lambda pending: search_backend.policies_changed(*pending))
@@ -0,0 +1,83 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Work that must wait for a transaction to commit (waking a worker, dropping
+# cache entries) is collected at flush time into session.info under a key
+# and run from after_commit, or discarded on rollback. The modules doing so
+# register here, so each flush walks the session's changes once for all of them.
+
+
+class FlushChanges:
+    """The objects a flush wrote, grouped by class."""
+
+    def __init__(self, session: Session):
+        self._objects: Dict[str, Dict[type, List[Any]]] = {}
+        for state, objects in (("new", session.new), ("dirty", session.dirty), ("deleted", session.deleted)):
+            by_class = defaultdict(list)
+            for obj in objects:
+                by_class[type(obj)].append(obj)
+            self._objects[state] = by_class
+
+    def new(self, cls: type) -> List[Any]:
+        return self._objects["new"].get(cls, [])
+
+    def dirty(self, cls: type) -> List[Any]:
+        return self._objects["dirty"].get(cls, [])
+
+    def deleted(self, cls: type) -> List[Any]:
+        return self._objects["deleted"].get(cls, [])
+
+    def written(self, cls: type) -> List[Any]:
+        """New and dirty objects of ``cls``."""
+        return self.new(cls) + self.dirty(cls)
+
+    def touched(self, cls: type) -> List[Any]:
+        """New, dirty and deleted objects of ``cls``."""
+        return self.new(cls) + self.dirty(cls) + self.deleted(cls)
+
+
+_flush_hooks: List[Callable[[Session, FlushChanges], None]] = []
+_commit_hooks: List[Tuple[str, Callable[[Any], None]]] = []
+
+
+def register_flush_hook(collect: Callable[[Session, FlushChanges], None]) -> None:
+    """Call ``collect(session, changes)`` after every flush."""
+    _flush_hooks.append(collect)
+
+
+def register_commit_hook(key: str, collect: Optional[Callable[[Session, FlushChanges], None]],
+                         on_commit: Callable[[Any], None]) -> None:
+    """Run ``on_commit(session.info[key])`` once a transaction that set ``key`` commits.
+
+    ``collect(session, changes)`` is called after every flush to record work
+    in ``session.info[key]``; code that writes with Core statements can set
+    the key itself, in which case ``collect`` may be None. A falsy value
+    counts as nothing to do. The key is dropped on rollback.
+    """
+    if collect is not None:
+        _flush_hooks.append(collect)
+    _commit_hooks.append((key, on_commit))
+
+
+@event.listens_for(Session, "after_flush")
+def _run_flush_hooks(session, flush_context):
+    changes = FlushChanges(session)
+    for collect in _flush_hooks:
+        collect(session, changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_commit_hooks(session):
+    for key, on_commit in _commit_hooks:
+        pending = session.info.pop(key, None)
+        if pending:
+            on_commit(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_commit_hooks(session):
+    for key, _ in _commit_hooks:
+        session.info.pop(key, None)
@@ -0,0 +1,309 @@
+import hashlib
+import os
+import re
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+import anyio
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.responses import Response
+
+# ContentBlob.file_path values are relative to this directory and never leave it.
+CONTENT_ROOT = os.getenv("CONTENT_ROOT", "./content")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024 ** 3)))
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("DOWNLOAD_CHUNK_BYTES", str(256 * 1024)))
+
+# Uploads are stored under their SHA-256, so identical files share one copy.
+_CONTENT_DIR = "sha256"
+_TMP_DIR = "tmp"
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+_SHA256 = re.compile(r"[0-9a-f]{64}$")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+class OutsideContentRoot(ValueError):
+    pass
+
+
+class ReceivedFile(NamedTuple):
+    tmp_path: str # Absolute; the caller moves or removes it
+    file_hash: str # Hex SHA-256
+    size_bytes: int
+
+
+class StoredFile(NamedTuple):
+    file_path: str # Relative to CONTENT_ROOT
+    file_hash: str # Hex SHA-256
+    size_bytes: int
+    filename: Optional[str]
+    mime_type: Optional[str]
+
+
+def resolve(file_path: str) -> str:
+    """Absolute path of ``file_path`` inside CONTENT_ROOT.
+
+    Raises OutsideContentRoot for absolute paths and for paths that leave
+    the root, through ``..`` or a symlink.
+    """
+    if os.path.isabs(file_path):
+        raise OutsideContentRoot(file_path)
+    root = os.path.realpath(CONTENT_ROOT)
+    path = os.path.realpath(os.path.join(root, file_path))
+    if os.path.commonpath([root, path]) != root:
+        raise OutsideContentRoot(file_path)
+    return path
+
+
+def content_path(file_hash: str) -> str:
+    return os.path.join(_CONTENT_DIR, file_hash[:2], file_hash[2:4], file_hash)
+
+
+def is_server_stored(file_path: str, file_hash: Optional[str], storage: str) -> bool:
+    """Whether a blob's bytes were written, and its ``file_hash`` computed, by this server.
+
+    Uploads live at content_path(file_hash), and chunked blobs were checked
+    against their chunks when they were created. Blobs registered by path
+    carry whatever path and hash the client sent.
+    """
+    if not file_hash or not _SHA256.match(file_hash):
+        return False
+    return storage == "chunks" or file_path == content_path(file_hash)
+
+
+def _commit_file(tmp_path: str, file_hash: str) -> str:
+    relative_path = content_path(file_hash)
+    final_path = resolve(relative_path)
+    if os.path.exists(final_path):
+        os.remove(tmp_path) # Same content is already stored
+    else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+    return relative_path
+
+
+def remove_received(received: ReceivedFile) -> None:
+    if os.path.exists(received.tmp_path):
+        os.remove(received.tmp_path)
+
+
+async def receive_stream(chunks: AsyncIterator[bytes], max_bytes: int = UPLOAD_MAX_BYTES) -> ReceivedFile:
+    """Write ``chunks`` to a temporary file under CONTENT_ROOT, hashing and counting as they arrive.
+
+    Only one chunk is held in memory at a time. The file is removed again
+    if the stream fails or exceeds ``max_bytes``.
+    """
+    tmp_dir = resolve(_TMP_DIR)
+    await anyio.to_thread.run_sync(lambda: os.makedirs(tmp_dir, exist_ok=True))
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        await anyio.to_thread.run_sync(lambda: os.path.exists(tmp_path) and os.remove(tmp_path))
+        raise
+    return ReceivedFile(tmp_path, digest.hexdigest(), size)
+
+
+async def store_stream(chunks: AsyncIterator[bytes], filename: Optional[str] = None, mime_type: Optional[str] = None,
+                       max_bytes: int = UPLOAD_MAX_BYTES) -> StoredFile:
+    """Write ``chunks`` to content-addressed storage as one file.
+
+    The file is received under a temporary name and renamed once its hash is
+    known; if a file with that hash is already stored the copy is discarded.
+    """
+    received = await receive_stream(chunks, max_bytes)
+    try:
+        relative_path = await anyio.to_thread.run_sync(_commit_file, received.tmp_path, received.file_hash)
+    except BaseException:
+        await anyio.to_thread.run_sync(remove_received, received)
+        raise
+    return StoredFile(relative_path, received.file_hash, received.size_bytes, filename, mime_type)
+
+
+async def iter_multipart_file(chunks: AsyncIterator[bytes], content_type: str) -> AsyncIterator[Tuple[str, object]]:
+    """Stream the first file part of a multipart/form-data body.
+
+    Yields ``("headers", (filename, mime_type))`` once the part's headers are
+    parsed, then ``("data", bytes)`` for its content. Other parts are
+    skipped without being buffered.
+    """
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise InvalidUpload("Missing multipart boundary")
+
+    events = []
+    state = {"field": b"", "headers": {}, "in_file": False, "done": False}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        key = state["field"].lower()
+        state["headers"][key] = state["headers"].get(key, b"") + data[start:end]
+
+    def on_header_end():
+        state["field"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if not state["done"] and b"filename" in disposition:
+            state["in_file"] = True
+            mime_type = state["headers"].get(b"content-type")
+            events.append(("headers", (
+                disposition[b"filename"].decode("utf-8", "replace"),
+                mime_type.decode("latin-1") if mime_type else None,
+            )))
+        state["headers"] = {}
+
+    def on_part_data(data, start, end):
+        if state["in_file"]:
+            events.append(("data", data[start:end]))
+
+    def on_part_end():
+        if state["in_file"]:
+            state["in_file"] = False
+            state["done"] = True
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    async for chunk in chunks:
+        parser.write(chunk)
+        for event in events:
+            yield event
+        events.clear()
+    parser.finalize()
+    for event in events:
+        yield event
+    if not state["done"]:
+        raise InvalidUpload("No file part in multipart body")
+
+
+async def store_multipart(chunks: AsyncIterator[bytes], content_type: str, max_bytes: int = UPLOAD_MAX_BYTES,
+                          store: Callable[..., Awaitable] = store_stream):
+    """Store the first file part of a multipart/form-data body with ``store`` (``store_stream`` by default)."""
+    events = iter_multipart_file(chunks, content_type)
+    async for kind, value in events:
+        if kind == "headers":
+            filename, mime_type = value
+            break
+    else:
+        raise InvalidUpload("No file part in multipart body")
+    data = (value async for kind, value in events if kind == "data")
+    return await store(data, filename, mime_type, max_bytes)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range ``Range`` header into an inclusive ``(start, end)``.
+
+    Returns None when the whole file should be sent (no header, a unit other
+    than bytes, or several ranges, which servers may ignore). Raises
+    ValueError for a range that can't be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first: # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """Sends a file, or one byte range of it, with ``Accept-Ranges: bytes``.
+
+    If the server offers the ASGI ``http.response.zerocopy`` extension the
+    file descriptor is handed to it so the kernel can sendfile() the bytes;
+    otherwise the range is read with pread() in chunks of
+    DOWNLOAD_CHUNK_BYTES on a worker thread. Subclasses that assemble the
+    body from several files override ``segments``.
+    """
+
+    def __init__(self, path: str, size: int, byte_range: Optional[Tuple[int, int]] = None,
+                 media_type: Optional[str] = None, headers: Optional[dict] = None):
+        self.path = path
+        self.offset, end = byte_range if byte_range is not None else (0, size - 1)
+        self.count = end - self.offset + 1
+        super().__init__(
+            status_code=206 if byte_range is not None else 200,
+            headers=headers,
+            media_type=media_type or "application/octet-stream",
+        )
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["content-length"] = str(self.count)
+        if byte_range is not None:
+            self.headers["content-range"] = f"bytes {self.offset}-{end}/{size}"
+
+    def init_headers(self, headers=None) -> None:
+        super().init_headers(headers)
+        # The body isn't in memory; the real Content-Length is set in __init__.
+        self.raw_headers = [(k, v) for k, v in self.raw_headers if k != b"content-length"]
+
+    def segments(self) -> List[Tuple[str, int, int]]:
+        """The ``(path, offset, count)`` reads that make up the body, in order."""
+        return [(self.path, self.offset, self.count)]
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or self.count <= 0:
+            await send({"type": "http.response.body", "body": b""})
+        else:
+            zerocopy = "http.response.zerocopy" in scope.get("extensions", {})
+            segments = self.segments()
+            complete = True
+            for index, (path, offset, count) in enumerate(segments):
+                more = index < len(segments) - 1
+                if zerocopy:
+                    with open(path, "rb") as f:
+                        await send({"type": "http.response.zerocopy", "file": f.fileno(), "offset": offset, "count": count, "more_body": more})
+                    continue
+                fd = await anyio.to_thread.run_sync(os.open, path, os.O_RDONLY)
+                try:
+                    position, remaining = offset, count
+                    while remaining:
+                        chunk = await anyio.to_thread.run_sync(os.pread, fd, min(DOWNLOAD_CHUNK_BYTES, remaining), position)
+                        if not chunk: # Truncated underneath us
+                            break
+                        position += len(chunk)
+                        remaining -= len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": more or bool(remaining)})
+                finally:
+                    os.close(fd)
+                if remaining:
+                    complete = False
+                    break
+            if not complete:
+                await send({"type": "http.response.body", "body": b""})
+        if self.background is not None:
+            await self.background()
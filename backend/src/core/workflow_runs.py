@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from backend.src.core.deadlines import CLOSED_STATUSES, notify_assignees, steps_written
+from backend.src.models import policy as models
+
+ACTIVE = "In Progress" # Status of a running workflow and of the steps it waits on
+WAITING = "Pending" # Steps whose turn hasn't come
+
+
+class StepNotActive(ValueError):
+    pass
+
+
+def _due(offset_hours: Optional[int], now: datetime) -> Optional[datetime]:
+    return None if offset_hours is None else now + timedelta(hours=offset_hours)
+
+
+def instantiate_template(db: Session, template: models.WorkflowTemplate, policies: Sequence,
+                         name: Optional[str] = None, now: Optional[datetime] = None) -> List[models.Workflow]:
+    """Create a workflow with all of ``template``'s steps for each of ``policies``, in ``db``'s transaction.
+
+    ``policies`` are rows with ``id`` and ``title``. The workflows go in with
+    one flush (the ORM batches the INSERTs on PostgreSQL) and the steps with
+    one executemany INSERT, whatever the batch size. Steps of the first
+    order start In Progress, due their offset from ``now``; the others wait
+    as Pending without a due date until advance_step activates them. Each
+    assignee of a first step gets one notification for the whole batch.
+    """
+    now = now or datetime.now(timezone.utc)
+    name = name or template.name
+    steps = template.steps # In step_order
+    first = steps[0].step_order
+    workflows = [
+        models.Workflow(policy_id=policy.id, template_id=template.id, name=name, status=ACTIVE)
+        for policy in policies
+    ]
+    db.add_all(workflows)
+    db.flush()
+    db.execute(insert(models.WorkflowStep), [
+        {
+            "workflow_id": workflow.id,
+            "step_order": step.step_order,
+            "name": step.name,
+            "assigned_to_role_id": step.assigned_to_role_id,
+            "status": ACTIVE if step.step_order == first else WAITING,
+            "due_date": _due(step.due_offset_hours, now) if step.step_order == first else None,
+            "due_offset_hours": step.due_offset_hours,
+        }
+        for workflow in workflows for step in steps
+    ])
+    steps_written(db)
+
+    for step in steps:
+        if step.step_order != first:
+            break
+        if len(policies) == 1:
+            message = f"Step '{step.name}' of workflow '{name}' for policy '{policies[0].title}' is ready for you."
+        else:
+            message = f"Step '{step.name}' of workflow '{name}' is ready for you on {len(policies)} policies."
+        notify_assignees(db, None, step.assigned_to_role_id, message)
+    return workflows
+
+
+def advance_step(db: Session, step_id: int, outcome: str = "Completed",
+                 now: Optional[datetime] = None) -> Tuple[models.Workflow, models.WorkflowStep, List[models.WorkflowStep]]:
+    """Close step ``step_id`` with ``outcome`` and, once its order is done, activate the next one.
+
+    Only a step of the lowest order that still has open steps can be
+    advanced. When the last open step of that order closes, the steps of
+    the next order become In Progress, get their due dates and notify their
+    assignees; after the last order the workflow is Completed. Rejecting a
+    step cancels the steps still open and marks the workflow Rejected. The
+    workflow row is locked first, so parallel steps finishing together
+    activate the next order exactly once. Part of ``db``'s transaction;
+    returns the workflow, the step and the steps activated.
+    """
+    now = now or datetime.now(timezone.utc)
+    workflow_id = db.execute(select(models.WorkflowStep.workflow_id).where(models.WorkflowStep.id == step_id)).scalar()
+    if workflow_id is None:
+        raise LookupError(step_id)
+    workflow = db.execute(
+        select(models.Workflow).where(models.Workflow.id == workflow_id).with_for_update()
+        .execution_options(populate_existing=True)
+    ).scalar_one()
+    steps = db.execute(
+        select(models.WorkflowStep).where(models.WorkflowStep.workflow_id == workflow_id)
+        .order_by(models.WorkflowStep.step_order, models.WorkflowStep.id).with_for_update()
+        .execution_options(populate_existing=True)
+    ).scalars().all()
+
+    step = next(s for s in steps if s.id == step_id)
+    open_steps = [s for s in steps if s.status not in CLOSED_STATUSES]
+    if step not in open_steps:
+        raise StepNotActive(f"Step is already {step.status}")
+    current = open_steps[0].step_order
+    if step.step_order != current:
+        raise StepNotActive("Earlier steps of this workflow are still open")
+
+    step.status = outcome
+    step.completed_at = now
+    open_steps.remove(step)
+    activated = []
+    if outcome == "Rejected":
+        for other in open_steps:
+            other.status = "Cancelled"
+            other.completed_at = now
+        workflow.status = "Rejected"
+    elif not open_steps:
+        workflow.status = "Completed"
+    elif open_steps[0].step_order != current: # This order is done
+        activated = [s for s in open_steps if s.step_order == open_steps[0].step_order]
+        title = workflow.policy.title
+        for next_step in activated:
+            next_step.status = ACTIVE
+            if next_step.due_date is None:
+                next_step.due_date = _due(next_step.due_offset_hours, now)
+            notify_assignees(db, next_step.assigned_to_user_id, next_step.assigned_to_role_id,
+                             f"Step '{next_step.name}' of workflow '{workflow.name}' for policy '{title}' is ready for you.")
+        workflow.status = ACTIVE
+    return workflow, step, activated
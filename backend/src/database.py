@@ -1,12 +1,70 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/power_policy_db")
+# Optional replica for read-only traffic; falls back to the primary when unset.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT_SECONDS = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")) # 0 disables the timeout
+
+def _engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        # SQLite has no server-side pool or statement timeout; sessions may be
+        # used from the request threadpool, so allow cross-thread connections.
+        return {"connect_args": {"check_same_thread": False}}
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+def _async_url(url: str) -> str:
+    # Same database, async driver: asyncpg for Postgres, aiosqlite for SQLite.
+    for prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+def _async_engine_options(url: str) -> dict:
+    options = _engine_options(url)
+    if url.startswith("sqlite"):
+        return {}
+    if DB_STATEMENT_TIMEOUT_MS:
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return options
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+read_engine = create_engine(READ_DATABASE_URL, **_engine_options(READ_DATABASE_URL)) if READ_DATABASE_URL else engine
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+ASYNC_READ_DATABASE_URL = os.getenv("ASYNC_READ_DATABASE_URL", _async_url(READ_DATABASE_URL) if READ_DATABASE_URL else None)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_async_engine_options(ASYNC_DATABASE_URL))
+async_read_engine = create_async_engine(ASYNC_READ_DATABASE_URL, **_async_engine_options(ASYNC_READ_DATABASE_URL)) if ASYNC_READ_DATABASE_URL else async_engine
 
-engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+# Async sessions keep attributes loaded after commit: lazy loads aren't possible
+# outside the greenlet, so handlers must eager-load what they serialize.
+AsyncSessionLocal = sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = sessionmaker(bind=async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 def get_db():
@@ -15,3 +73,20 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    # For GET endpoints only: the replica may lag the primary slightly, so
+    # anything that writes or must read its own writes should use get_db.
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
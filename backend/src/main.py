@@ -1,61 +1,112 @@
-from fastapi import FastAPI, Depends
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import anyio
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from backend.src.database import engine, Base, get_db
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.src.database import engine, get_async_db
 from backend.src.models import policy as models
+from backend.src.core.pagination import InvalidCursor
+from backend.src.core.extraction import EXTRACTION_BACKFILL_ON_STARTUP, extraction_pipeline
+from backend.src.core.deadlines import deadline_scheduler
+from backend.src.core.diff import diff_engine
+from backend.src.core.fanout import fanout_worker
+from backend.src.core.notification_hub import notification_hub
+from backend.src.core.notification_store import notification_retention
+from backend.src.core.outbox import outbox_dispatcher
+from backend.src.core.search import search_backend
 from backend.src.api import policies, users, auth_api, workflows, notifications, reports
 
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
-
-# Set up CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "https://dev-apex-prong-f6a5f564-service-jwr1.onrender.com"], # Adjust as needed for your frontend URL
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
+# Sync handlers and dependencies run on AnyIO's default thread limiter (40 by default).
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+# Schema creation is an explicit deployment step (`python -m backend.src.main migrate`);
+# set AUTO_MIGRATE for local development to run it on startup instead.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() in ("1", "true", "yes")
+FRONTEND_DIST_DIR = os.getenv("FRONTEND_DIST_DIR", "./frontend/dist")
+CORS_ALLOWED_ORIGINS = os.getenv(
+    "CORS_ALLOWED_ORIGINS",
+    "http://localhost:3000,https://dev-apex-prong-f6a5f564-service-jwr1.onrender.com",
+).split(",")
 
-app.include_router(auth_api.router)
-app.include_router(policies.router)
-app.include_router(users.router)
-app.include_router(workflows.router)
-app.include_router(notifications.router)
-app.include_router(reports.router)
+def run_migrations(bind=None):
+    models.Base.metadata.create_all(bind=bind or engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    if AUTO_MIGRATE:
+        await anyio.to_thread.run_sync(run_migrations)
+    extraction_pipeline.start()
+    if EXTRACTION_BACKFILL_ON_STARTUP:
+        extraction_pipeline.backfill() # Runs on the pipeline's own threads
+    search_backend.start() # The BM25 backend builds its index in the background
+    outbox_dispatcher.start()
+    await notification_hub.start() # LISTENs for new notifications on PostgreSQL
+    notification_retention.start()
+    fanout_worker.start() # Resumes fan-outs a previous run left unfinished
+    deadline_scheduler.start() # Leads on one process at a time under PostgreSQL
+    yield
+    deadline_scheduler.shutdown()
+    fanout_worker.shutdown()
+    notification_retention.shutdown()
+    await notification_hub.shutdown()
+    outbox_dispatcher.shutdown()
+    extraction_pipeline.shutdown()
+    search_backend.shutdown()
+    diff_engine.shutdown()
 
-@app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
-    try:
-        db.execute("SELECT 1")
-        return {"status": "ok", "database": "connected"}
-    except Exception as e:
-        return {"status": "error", "database": "disconnected", "detail": str(e)}
+def create_app() -> FastAPI:
+    app = FastAPI(title="Power Policy API", lifespan=lifespan)
 
-# Serve static files for the frontend
-app.mount("/", StaticFiles(directory="./frontend/dist", html=True), name="frontend")
+    # Set up CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ALLOWED_ORIGINS, # Adjust as needed for your frontend URL
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"]
+    )
 
-app.include_router(policies.router)
+    @app.exception_handler(InvalidCursor)
+    async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+        return JSONResponse(status_code=400, content={"detail": str(exc)})
 
+    app.include_router(auth_api.router)
+    app.include_router(policies.router)
+    app.include_router(users.router)
+    app.include_router(workflows.router)
+    app.include_router(notifications.router)
+    app.include_router(reports.router)
 
-app = FastAPI()
+    @app.get("/health")
+    async def health_check(db: AsyncSession = Depends(get_async_db)):
+        try:
+            await db.execute(text("SELECT 1"))
+            return {"status": "ok", "database": "connected"}
+        except Exception as e:
+            return {"status": "error", "database": "disconnected", "detail": str(e)}
 
-@app.get("/")
-async def read_root():
-    return {"message": "Power Policy Backend is running!"}
+    # Serve static files for the frontend; mounted last so it never shadows the API routes.
+    if os.path.isdir(FRONTEND_DIST_DIR):
+        app.mount("/", StaticFiles(directory=FRONTEND_DIST_DIR, html=True), name="frontend")
+    else:
+        @app.get("/")
+        async def read_root():
+            return {"message": "Power Policy Backend is running!"}
 
-@app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
-    try:
-        db.execute("SELECT 1")
-        return {"status": "ok", "database": "connected"}
-    except Exception as e:
-        return {"status": "error", "database": "disconnected", "detail": str(e)}
+    return app
 
+app = create_app()
 
-@app.get("/")
-async def read_root():
-    return {"message": "Power Policy Backend is running!"}
+if __name__ == "__main__":
+    if sys.argv[1:] == ["migrate"]:
+        run_migrations()
+        print("Database schema is up to date.")
+    else:
+        import uvicorn
+        uvicorn.run("backend.src.main:app", host="0.0.0.0", port=8000)
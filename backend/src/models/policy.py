@@ -1,8 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index, UniqueConstraint, DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.sql import func, text
 from backend.src.database import Base
 
+# Full-text search vectors are tsvector on PostgreSQL and plain text elsewhere.
+# They are only read by search queries, so the columns are deferred.
+SearchVector = Text().with_variant(TSVECTOR(), "postgresql")
+
 class User(Base):
     __tablename__ = "users"
 
@@ -10,6 +15,7 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
+    permissions_version = Column(Integer, default=0, server_default="0", nullable=False) # Bumped whenever the user's roles change; invalidates stateless tokens
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -49,15 +55,41 @@ class ContentBlob(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     file_path = Column(String, nullable=False) # Path to the stored file (e.g., S3 URL, local path)
-    file_hash = Column(String, nullable=True) # For integrity check
+    file_hash = Column(String, nullable=True, index=True) # For integrity check; also lets extraction reuse text of identical files
     size_bytes = Column(Integer, nullable=True)
     mime_type = Column(String, nullable=True)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+    extracted_text = deferred(Column(Text, nullable=True)) # Plain text of the file, filled in by the extraction pipeline
+    extracted_at = Column(DateTime(timezone=True), nullable=True) # Set once extraction has run; null means pending
+    storage = Column(String(16), default="file", server_default="file", nullable=False) # "file": file_path is the file; "chunks": reassembled from content_blob_chunks
 
     policy_versions = relationship("PolicyVersion", back_populates="content_blob")
+    chunks = relationship("ContentBlobChunk", order_by="ContentBlobChunk.position", cascade="all, delete-orphan", passive_deletes=True)
+
+class ContentChunk(Base):
+    # One unique, content-defined piece of file content, stored once under its SHA-256
+    __tablename__ = "content_chunks"
+
+    hash = Column(String(64), primary_key=True)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ContentBlobChunk(Base):
+    # Manifest entry: the chunk at ``position`` of a chunked blob, starting at byte ``offset``
+    __tablename__ = "content_blob_chunks"
+
+    content_blob_id = Column(Integer, ForeignKey("content_blobs.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    offset = Column(BigInteger, nullable=False)
+    chunk_hash = Column(String(64), ForeignKey("content_chunks.hash"), nullable=False, index=True)
+
+    chunk = relationship("ContentChunk")
 
 class Policy(Base):
     __tablename__ = "policies"
+    __table_args__ = (
+        Index("policies_search_idx", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
@@ -65,9 +97,11 @@ class Policy(Base):
     document_type_id = Column(Integer, ForeignKey("document_types.id"))
     current_version_id = Column(Integer, ForeignKey("policy_versions.id"), nullable=True)
     status = Column(String, default="Draft", nullable=False) # e.g., Draft, In Review, Approved, Published, Archived
+    version_counter = Column(Integer, default=0, server_default="0", nullable=False) # Last allocated version_number; incremented atomically per new version
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    search_vector = deferred(Column(SearchVector)) # Title, description and the current version's content
 
     document_type = relationship("DocumentType", back_populates="policies")
     current_version = relationship("PolicyVersion", foreign_keys=[current_version_id], post_update=True)
@@ -75,11 +109,28 @@ class Policy(Base):
     created_by_user = relationship("User", back_populates="policies")
     workflows = relationship("Workflow", back_populates="policy")
 
+# Title typeahead: a text_pattern_ops btree answers (and orders) whole-title
+# prefixes, and a GIN index on the title's words answers word prefixes
+# ("hand" -> "Employee Handbook"). The word index is PostgreSQL-only.
+Index(
+    "ix_policies_lower_title_prefix",
+    func.lower(Policy.title).label("lower_title"),
+    postgresql_ops={"lower_title": "text_pattern_ops"},
+)
+event.listen(
+    Policy.__table__,
+    "after_create",
+    DDL("CREATE INDEX IF NOT EXISTS ix_policies_title_words ON policies USING GIN (to_tsvector('simple'::regconfig, title))").execute_if(dialect="postgresql"),
+)
+
 class PolicyVersion(Base):
     __tablename__ = "policy_versions"
+    __table_args__ = (
+        UniqueConstraint("policy_id", "version_number", name="uq_policy_versions_policy_id_version_number"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    policy_id = Column(Integer, ForeignKey("policies.id"), nullable=False)
+    policy_id = Column(Integer, ForeignKey("policies.id"), nullable=False, index=True)
     version_number = Column(Integer, nullable=False)
     effective_date = Column(DateTime(timezone=True), nullable=True)
     content_blob_id = Column(Integer, ForeignKey("content_blobs.id"))
@@ -88,18 +139,47 @@ class PolicyVersion(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     policy = relationship("Policy", back_populates="versions", foreign_keys=[policy_id])
-    search_vector = Column(Text) # PostgreSQL's TSVECTOR type is mapped to Text in SQLAlchemy, but handled by DB-specific functions
+    search_vector = deferred(Column(SearchVector)) # Summary and extracted content; filled in by the extraction pipeline
     created_by_user = relationship("User", back_populates="policy_versions")
+    content_blob = relationship("ContentBlob", back_populates="policy_versions")
     attestations = relationship("Attestation", back_populates="policy_version")
     review_comments = relationship("ReviewComment", back_populates="policy_version")
 
+class WorkflowTemplate(Base):
+    # A named, reusable sequence of steps, instantiated per policy
+    __tablename__ = "workflow_templates"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    description = Column(Text, nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    steps = relationship("WorkflowTemplateStep", back_populates="template", order_by="WorkflowTemplateStep.step_order")
+
+class WorkflowTemplateStep(Base):
+    __tablename__ = "workflow_template_steps"
+    __table_args__ = (
+        Index("ix_workflow_template_steps_template_id_step_order", "template_id", "step_order"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    template_id = Column(Integer, ForeignKey("workflow_templates.id", ondelete="CASCADE"), nullable=False)
+    step_order = Column(Integer, nullable=False) # Steps sharing an order run in parallel
+    name = Column(String, nullable=False)
+    assigned_to_role_id = Column(Integer, ForeignKey("roles.id"), nullable=True)
+    due_offset_hours = Column(Integer, nullable=True) # Due this long after the step becomes active
+
+    template = relationship("WorkflowTemplate", back_populates="steps")
+
 class Workflow(Base):
     __tablename__ = "workflows"
 
     id = Column(Integer, primary_key=True, index=True)
-    policy_id = Column(Integer, ForeignKey("policies.id"), nullable=False)
+    policy_id = Column(Integer, ForeignKey("policies.id"), nullable=False, index=True)
+    template_id = Column(Integer, ForeignKey("workflow_templates.id", ondelete="SET NULL"), nullable=True) # The template it was instantiated from
     name = Column(String, nullable=False)
-    status = Column(String, default="Pending", nullable=False) # e.g., Pending, In Progress, Completed, Cancelled
+    status = Column(String, default="Pending", nullable=False) # e.g., Pending, In Progress, Completed, Rejected, Cancelled
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -108,6 +188,17 @@ class Workflow(Base):
 
 class WorkflowStep(Base):
     __tablename__ = "workflow_steps"
+    __table_args__ = (
+        Index("ix_workflow_steps_workflow_id_step_order", "workflow_id", "step_order"),
+        Index("ix_workflow_steps_assigned_to_user_id_status", "assigned_to_user_id", "status"),
+        # Open steps whose reminder / escalation hasn't fired, by due date, for core/deadlines.py.
+        Index("ix_workflow_steps_reminder_due", "due_date", "id",
+              postgresql_where=text("reminded_at IS NULL AND completed_at IS NULL AND due_date IS NOT NULL"),
+              sqlite_where=text("reminded_at IS NULL AND completed_at IS NULL AND due_date IS NOT NULL")),
+        Index("ix_workflow_steps_escalation_due", "due_date", "id",
+              postgresql_where=text("escalated_at IS NULL AND completed_at IS NULL AND due_date IS NOT NULL"),
+              sqlite_where=text("escalated_at IS NULL AND completed_at IS NULL AND due_date IS NOT NULL")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=False)
@@ -115,9 +206,12 @@ class WorkflowStep(Base):
     name = Column(String, nullable=False)
     assigned_to_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     assigned_to_role_id = Column(Integer, ForeignKey("roles.id"), nullable=True)
-    status = Column(String, default="Pending", nullable=False) # e.g., Pending, In Progress, Approved, Rejected, Completed
+    status = Column(String, default="Pending", nullable=False) # e.g., Pending, In Progress, Overdue, Approved, Rejected, Completed
     due_date = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
+    reminded_at = Column(DateTime(timezone=True), nullable=True) # Set when the due-date reminder went out
+    escalated_at = Column(DateTime(timezone=True), nullable=True) # Set when the step was escalated as overdue
+    due_offset_hours = Column(Integer, nullable=True) # From the template; sets due_date when the step becomes active
 
     workflow = relationship("Workflow", back_populates="steps")
     assigned_to_user = relationship("User")
@@ -125,9 +219,13 @@ class WorkflowStep(Base):
 
 class Attestation(Base):
     __tablename__ = "attestations"
+    __table_args__ = (
+        # One attestation per user and version; also serves version/user lookups.
+        UniqueConstraint("policy_version_id", "user_id", name="uq_attestations_policy_version_id_user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     policy_version_id = Column(Integer, ForeignKey("policy_versions.id"), nullable=False)
     attested_at = Column(DateTime(timezone=True), server_default=func.now())
     signature_data = Column(Text, nullable=True) # e.g., username/password hash, biometric ID
@@ -135,11 +233,49 @@ class Attestation(Base):
     user = relationship("User", back_populates="attestations")
     policy_version = relationship("PolicyVersion", back_populates="attestations")
 
+class AttestationAssignment(Base):
+    # A user's task to attest to a policy version; created in bulk by core/fanout.py
+    __tablename__ = "attestation_assignments"
+    __table_args__ = (
+        # One per user and version, which makes fan-outs safe to repeat.
+        UniqueConstraint("policy_version_id", "user_id", name="uq_attestation_assignments_policy_version_id_user_id"),
+        Index("ix_attestation_assignments_user_id_id", "user_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    policy_version_id = Column(Integer, ForeignKey("policy_versions.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    fanout_id = Column(Integer, ForeignKey("attestation_fanouts.id", ondelete="SET NULL"), nullable=True) # The fan-out that created it
+    assigned_at = Column(DateTime(timezone=True), server_default=func.now())
+    due_at = Column(DateTime(timezone=True), nullable=True)
+
+class AttestationFanOut(Base):
+    # Assigning a policy version to an audience of roles and users, processed
+    # in the background in user id order
+    __tablename__ = "attestation_fanouts"
+
+    id = Column(Integer, primary_key=True)
+    policy_version_id = Column(Integer, ForeignKey("policy_versions.id", ondelete="CASCADE"), nullable=False, index=True)
+    role_ids = Column(Text, nullable=False, default="[]") # JSON list
+    user_ids = Column(Text, nullable=False, default="[]") # JSON list
+    message = Column(Text, nullable=False)
+    due_at = Column(DateTime(timezone=True), nullable=True)
+    status = Column(String(20), default="Pending", nullable=False) # Pending, Running, Completed, Failed
+    last_user_id = Column(Integer, default=0, nullable=False) # Users up to this id are done
+    total = Column(Integer, nullable=True) # Audience size, counted when the fan-out starts
+    processed = Column(Integer, default=0, nullable=False)
+    assigned = Column(Integer, default=0, nullable=False) # Users who weren't assigned the version before
+    error = Column(Text, nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
 class ReviewComment(Base):
     __tablename__ = "review_comments"
 
     id = Column(Integer, primary_key=True, index=True)
-    policy_version_id = Column(Integer, ForeignKey("policy_versions.id"), nullable=False)
+    policy_version_id = Column(Integer, ForeignKey("policy_versions.id"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     comment_text = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -149,6 +285,13 @@ class ReviewComment(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_id_read_created_at", "user_id", "read", "created_at"),
+        Index("ix_notifications_user_id_id", "user_id", "id"), # Newest-first keyset pagination
+        # Read notifications by age, for the retention job.
+        Index("ix_notifications_read_created_at", "created_at",
+              postgresql_where=text("read IS TRUE"), sqlite_where=text("read IS 1")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -156,4 +299,45 @@ class Notification(Base):
     read = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+class NotificationCounter(Base):
+    # Unread notifications per user, kept in step with notifications by
+    # core/notification_store.py; rows are created on a user's first notification
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread = Column(Integer, default=0, server_default="0", nullable=False)
+
+class ArchivedNotification(Base):
+    # Read notifications moved out of notifications by the retention job
+    # (NOTIFICATION_RETENTION_MODE=archive); ids are kept
+    __tablename__ = "notifications_archive"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    message = Column(Text, nullable=False)
+    read = Column(Boolean, default=True)
+    created_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class OutboxEvent(Base):
+    # A side effect (e.g. a notification on one channel) committed together with
+    # the write that caused it and delivered later by core/outbox.py
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        # Pending events in delivery order; delivered events are deleted.
+        Index("ix_outbox_events_pending", "available_at", "id",
+              postgresql_where=text("dead_at IS NULL"), sqlite_where=text("dead_at IS NULL")),
+        Index("ix_outbox_events_channel_user_id_id", "channel", "user_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    channel = Column(String(32), nullable=False) # in_app, email, push
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False) # Events are delivered in id order per (channel, user)
+    payload = Column(Text, nullable=False) # Compact JSON
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False) # Not before; pushed back on retry
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    last_error = Column(Text, nullable=True)
+    dead_at = Column(DateTime(timezone=True), nullable=True) # Set once OUTBOX_MAX_ATTEMPTS is used up
@@ -1,6 +1,15 @@
-from pydantic import BaseModel, Field
+import json
+
+from pydantic import BaseModel, Field, validator
+from pydantic.generics import GenericModel
 from datetime import datetime
-from typing import Optional, List
+from typing import Generic, Optional, List, TypeVar
+
+T = TypeVar("T")
+
+class Page(GenericModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
 
 class DocumentTypeBase(BaseModel):
     name: str = Field(..., example="Standard Operating Procedure")
@@ -15,24 +24,46 @@ class DocumentType(DocumentTypeBase):
     class Config:
         orm_mode = True
 
-class ContentBlobBase(BaseModel):
-    file_path: str = Field(..., example="/path/to/policy.pdf")
-    file_hash: Optional[str] = Field(None, example="a1b2c3d4e5f6g7h8i9j0")
+class ContentBlob(BaseModel):
+    # Blobs are only created by the upload endpoints, which set the path and hash.
+    id: int
+    file_path: str = Field(..., example="sha256/9f/86/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08")
+    file_hash: Optional[str] = Field(None, example="9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08")
     size_bytes: Optional[int] = Field(None, example=102400)
     mime_type: Optional[str] = Field(None, example="application/pdf")
+    uploaded_at: datetime
+    storage: str = "file"
 
-class ContentBlobCreate(ContentBlobBase):
-    pass
+    class Config:
+        orm_mode = True
 
-class ContentBlob(ContentBlobBase):
-    id: int
-    uploaded_at: datetime
+class ChunkingParameters(BaseModel):
+    algorithm: str = Field(..., example="fastcdc-gear64")
+    min_bytes: int
+    avg_bytes: int
+    max_bytes: int
+    gear: List[str] # 256 hex-encoded 64-bit values, indexed by byte value
+
+class ChunkHashes(BaseModel):
+    hashes: List[str] = Field(..., max_items=10000)
+
+class MissingChunks(BaseModel):
+    missing: List[str]
+
+class ContentChunk(BaseModel):
+    hash: str
+    size_bytes: int
 
     class Config:
         orm_mode = True
 
+class ChunkedContentBlobCreate(BaseModel):
+    chunks: List[str] = Field(..., max_items=100000, description="SHA-256 of each chunk, in file order")
+    file_hash: str = Field(..., description="SHA-256 of the whole file")
+    filename: Optional[str] = None
+    mime_type: Optional[str] = None
+
 class PolicyVersionBase(BaseModel):
-    version_number: int = Field(..., example=1)
     effective_date: Optional[datetime] = None
     summary_of_changes: Optional[str] = Field(None, example="Initial draft of the policy.")
     content_blob_id: Optional[int] = None
@@ -41,6 +72,7 @@ class PolicyVersionCreate(PolicyVersionBase):
     pass
 
 class PolicyVersion(PolicyVersionBase):
+    version_number: int = Field(..., example=1) # Allocated by the server
     id: int
     policy_id: int
     created_by: int
@@ -69,7 +101,7 @@ class Policy(PolicyBase):
     id: int
     created_by: int
     created_at: datetime
-    updated_at: datetime
+    updated_at: Optional[datetime] = None
     current_version_id: Optional[int] = None
 
     document_type: Optional[DocumentType] = None
@@ -79,6 +111,47 @@ class Policy(PolicyBase):
     class Config:
         orm_mode = True
 
+class PolicyVersionImport(BaseModel):
+    effective_date: Optional[datetime] = None
+    summary_of_changes: Optional[str] = None
+    content_blob_id: Optional[int] = None # A blob stored through the upload endpoints
+
+class PolicyImport(PolicyCreate):
+    ref: Optional[str] = Field(None, example="binder-00042") # Caller's identifier, echoed back in the import result
+    versions: List[PolicyVersionImport] = [] # Oldest first; numbered 1..n
+
+class PolicyView(BaseModel):
+    # Sparse projection of Policy for ?fields=/?expand=; only the fields that were
+    # set are serialized (response_model_exclude_unset).
+    id: int
+    title: Optional[str] = None
+    description: Optional[str] = None
+    document_type_id: Optional[int] = None
+    status: Optional[str] = None
+    created_by: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    current_version_id: Optional[int] = None
+
+    document_type: Optional[DocumentType] = None
+    current_version: Optional[PolicyVersion] = None
+    versions: Optional[List[PolicyVersion]] = None
+
+class PolicySearchHit(BaseModel):
+    id: int
+    title: str
+    status: str
+    document_type_id: Optional[int] = None
+    current_version_id: Optional[int] = None
+    updated_at: Optional[datetime] = None
+    rank: float
+    title_highlight: str # Title with matched terms wrapped in <mark>
+    snippet: Optional[str] = None # Best matching fragments of the description and current version's text
+
+class PolicyTitleSuggestion(BaseModel):
+    id: int
+    title: str
+
 class UserBase(BaseModel):
     username: str
     email: str
@@ -87,19 +160,21 @@ class UserCreate(UserBase):
     password: str
 
 class User(UserBase):
-class Token(BaseModel):
-    access_token: str
-    token_type: str
-
-class UserBase(BaseModel):
-    username: str
-    email: str
+    id: int
     created_at: datetime
-    updated_at: datetime
+    updated_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
 
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 class RoleBase(BaseModel):
     name: str
 
@@ -128,6 +203,41 @@ class Attestation(AttestationBase):
     class Config:
         orm_mode = True
 
+class WorkflowTemplateStepBase(BaseModel):
+    step_order: int = Field(..., example=1) # Steps sharing an order run in parallel
+    name: str = Field(..., example="Legal review")
+    due_offset_hours: Optional[int] = Field(None, ge=0, example=72) # After the step becomes active
+
+class WorkflowTemplateStepCreate(WorkflowTemplateStepBase):
+    role: Optional[str] = Field(None, example="Reviewer") # Any member may complete the step
+
+class WorkflowTemplateStep(WorkflowTemplateStepBase):
+    id: int
+    assigned_to_role_id: Optional[int] = None
+
+    class Config:
+        orm_mode = True
+
+class WorkflowTemplateBase(BaseModel):
+    name: str = Field(..., example="Annual Policy Review")
+    description: Optional[str] = None
+
+class WorkflowTemplateCreate(WorkflowTemplateBase):
+    steps: List[WorkflowTemplateStepCreate] = Field(..., min_items=1, max_items=100)
+
+class WorkflowTemplate(WorkflowTemplateBase):
+    id: int
+    created_by: Optional[int] = None
+    created_at: datetime
+    steps: List[WorkflowTemplateStep]
+
+    class Config:
+        orm_mode = True
+
+class WorkflowTemplateInstantiate(BaseModel):
+    policy_ids: List[int] = Field(..., min_items=1, max_items=1000) # One workflow each, created together
+    name: Optional[str] = None # Defaults to the template's name
+
 class WorkflowBase(BaseModel):
     policy_id: int
     name: str = Field(..., example="Policy Review Workflow")
@@ -138,8 +248,9 @@ class WorkflowCreate(WorkflowBase):
 
 class Workflow(WorkflowBase):
     id: int
+    template_id: Optional[int] = None
     created_at: datetime
-    updated_at: datetime
+    updated_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
@@ -152,6 +263,7 @@ class WorkflowStepBase(BaseModel):
     assigned_to_role_id: Optional[int] = None
     status: str = Field("Pending", example="Pending")
     due_date: Optional[datetime] = None
+    due_offset_hours: Optional[int] = Field(None, ge=0) # Sets due_date when the step becomes active, if unset
     completed_at: Optional[datetime] = None
 
 class WorkflowStepCreate(WorkflowStepBase):
@@ -159,10 +271,26 @@ class WorkflowStepCreate(WorkflowStepBase):
 
 class WorkflowStep(WorkflowStepBase):
     id: int
+    reminded_at: Optional[datetime] = None
+    escalated_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
 
+class WorkflowStepAdvance(BaseModel):
+    outcome: str = Field("Completed", example="Approved") # Completed, Approved or Rejected
+
+    @validator("outcome")
+    def known_outcome(cls, value):
+        if value not in ("Completed", "Approved", "Rejected"):
+            raise ValueError("outcome must be Completed, Approved or Rejected")
+        return value
+
+class WorkflowAdvance(BaseModel):
+    workflow: Workflow
+    step: WorkflowStep
+    activated: List[WorkflowStep] # Steps of the next order, now In Progress
+
 class AttestationBase(BaseModel):
     signature_data: Optional[str] = None
 
@@ -178,6 +306,46 @@ class Attestation(AttestationBase):
 
     class Config:
         orm_mode = True
+
+class AttestationAssignment(BaseModel):
+    id: int
+    policy_version_id: int
+    user_id: int
+    assigned_at: datetime
+    due_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class AttestationFanOutCreate(BaseModel):
+    policy_version_id: int
+    roles: List[str] = Field([], example=["Editor", "Viewer"]) # Every member of these roles
+    user_ids: List[int] = Field([], max_items=10000) # Plus these users
+    message: Optional[str] = None # Defaults to a request to attest to the version
+    due_at: Optional[datetime] = None
+
+class AttestationFanOut(BaseModel):
+    id: int
+    policy_version_id: int
+    role_ids: List[int]
+    user_ids: List[int]
+    message: str
+    due_at: Optional[datetime] = None
+    status: str
+    total: Optional[int] = None
+    processed: int
+    assigned: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @validator("role_ids", "user_ids", pre=True)
+    def _decode_ids(cls, value):
+        return json.loads(value) if isinstance(value, str) else value
+
+    class Config:
+        orm_mode = True
 class NotificationBase(BaseModel):
     user_id: int
     message: str
@@ -195,6 +363,21 @@ class Notification(NotificationBase):
 
     class Config:
         orm_mode = True
+
+class NotificationSelection(BaseModel):
+    # Exactly one of the two
+    ids: Optional[List[int]] = Field(None, max_items=1000)
+    before: Optional[datetime] = Field(None, description="Every notification created before this time")
+
+class NotificationBulkUpdate(NotificationSelection):
+    read: bool = True
+
+class NotificationBulkResult(BaseModel):
+    affected: int
+    unread: int
+
+class UnreadCount(BaseModel):
+    unread: int
 class ReviewCommentBase(BaseModel):
     policy_version_id: int
     user_id: int
@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+# The app reads its settings at import time, so point it at a throwaway
+# SQLite database before any test module imports it.
+_TMP = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ["CONTENT_ROOT"] = os.path.join(_TMP, "content")
+os.environ["DIFF_CACHE_DIR"] = os.path.join(_TMP, "diff-cache")
+os.environ["DIFF_WORKERS"] = "1"
+
+import pytest
+
+from backend.scripts.scratch import scratch_schema
+
+# Tests that need PostgreSQL (row locks, query plans) run in a scratch schema of this database, and are skipped without it.
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+SCRATCH_SCHEMA = "backend_tests"
+
+
+@pytest.fixture
+def pg_engine():
+    """An engine on a fresh scratch schema of TEST_POSTGRES_URL with the app's tables."""
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    with scratch_schema(TEST_POSTGRES_URL, SCRATCH_SCHEMA, pool_size=20) as engine:
+        yield engine
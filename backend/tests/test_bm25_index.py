@@ -0,0 +1,79 @@
+"""BM25Index: updates, compaction, paging and snapshots."""
+import random
+
+import pytest
+
+from backend.src.core.search import BM25Index
+
+WORDS = ["safety", "policy", "travel", "expense", "security", "access", "review", "data", "privacy", "training"]
+
+
+def document(rng: random.Random) -> tuple:
+    return (" ".join(rng.choices(WORDS, k=3)), " ".join(rng.choices(WORDS, k=12)), None, None)
+
+
+@pytest.fixture
+def index():
+    rng = random.Random(7)
+    index = BM25Index()
+    for policy_id in range(1, 301):
+        index.upsert(policy_id, document(rng), "published" if policy_id % 3 else "draft", policy_id % 4 or None)
+    return index
+
+
+def test_upsert_replaces_the_document(index):
+    index.upsert(5, ("Zebra handling", None, None, None), "draft", None)
+    assert [policy_id for _, policy_id in index.search(["zebra"])] == [5]
+    index.upsert(5, ("Giraffe handling", None, None, None), "draft", None)
+    assert index.search(["zebra"]) == []
+    assert [policy_id for _, policy_id in index.search(["giraffe"])] == [5]
+    assert len(index) == 300
+
+
+def test_compaction_keeps_results(index):
+    rng = random.Random(11)
+    for policy_id in rng.sample(range(1, 301), 120):
+        index.upsert(policy_id, document(rng), "published", None)
+    for policy_id in range(1, 301, 10):
+        index.remove(policy_id)
+    queries = [["policy"], ["travel", "expense"], ["privacy", "data", "access"]]
+    before = [index.search(terms, limit=500) for terms in queries]
+    filtered_before = index.search(["review"], status="draft", document_type_id=2, limit=500)
+
+    index.compact()
+
+    assert index.stats()["slots"] == len(index)
+    assert [index.search(terms, limit=500) for terms in queries] == before
+    assert index.search(["review"], status="draft", document_type_id=2, limit=500) == filtered_before
+
+
+def test_after_paging_has_no_duplicates_or_gaps(index):
+    everything = index.search(["policy"], limit=1000)
+    assert len(everything) > 50
+    pages, after = [], None
+    while True:
+        page = index.search(["policy"], after=after, limit=7)
+        if not page:
+            break
+        pages.extend(page)
+        after = page[-1]
+    assert pages == everything
+    assert len({policy_id for _, policy_id in pages}) == len(pages)
+
+
+def test_save_and_load_keep_the_ranking(index, tmp_path):
+    index.upsert(12, ("Travel travel travel", None, None, None), "published", 1)
+    index.remove(13)
+    index.watermark = "2030-01-01"
+    path = str(tmp_path / "index.pickle")
+    queries = [["travel"], ["security", "review"]]
+    before = [index.search(terms, limit=500) for terms in queries]
+
+    index.save(path)
+    loaded = BM25Index()
+    assert loaded.load(path)
+
+    assert [loaded.search(terms, limit=500) for terms in queries] == before
+    assert loaded.policy_ids() == index.policy_ids()
+    assert loaded.watermark == "2030-01-01"
+    assert not BM25Index().load(str(tmp_path / "missing.pickle"))
@@ -0,0 +1,91 @@
+"""The version diff cache must not be shared between blobs that only claim the same hash,
+and a request that goes away must not fail the others sharing its computation."""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.src.api import auth_api, policies
+from backend.src.auth.auth import get_password_hash
+from backend.src.core.diff import DiffEngine, content_key, diff_engine
+from backend.src.core.storage import content_path
+from backend.src.database import Base, SessionLocal, engine
+from backend.src.models import policy as models
+
+SHARED_HASH = "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+
+
+@pytest.fixture(scope="module")
+def setup():
+    Base.metadata.create_all(engine)
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as db:
+        db.add(models.User(id=1, username="editor", password_hash=get_password_hash("pw"), email="editor@example.com"))
+        db.add(models.Policy(id=1, title="Code of Conduct", status="Published", created_by=1))
+        # An uploaded blob, and an older one registered by path that claims the same hash.
+        db.add(models.ContentBlob(id=1, file_path=content_path(SHARED_HASH), file_hash=SHARED_HASH,
+                                  extracted_text="Be kind to colleagues.", extracted_at=now))
+        db.add(models.ContentBlob(id=2, file_path="legacy/conduct.txt", file_hash=SHARED_HASH,
+                                  extracted_text="Replaced paragraph about expenses.", extracted_at=now))
+        db.add_all([
+            models.PolicyVersion(id=1, policy_id=1, version_number=1, content_blob_id=1, created_by=1),
+            models.PolicyVersion(id=2, policy_id=1, version_number=2, content_blob_id=1, created_by=1),
+            models.PolicyVersion(id=3, policy_id=1, version_number=3, content_blob_id=2, created_by=1),
+        ])
+        db.commit()
+
+    app = FastAPI()
+    app.include_router(auth_api.router)
+    app.include_router(policies.router)
+    client = TestClient(app)
+    token = client.post("/auth/token", data={"username": "editor", "password": "pw"}).json()["access_token"]
+    yield client, {"Authorization": f"Bearer {token}"}
+    diff_engine.shutdown()
+
+
+def test_content_key_ignores_client_supplied_hashes():
+    stored = content_key(1, content_path(SHARED_HASH), SHARED_HASH, "file")
+    registered = content_key(2, "legacy/conduct.txt", SHARED_HASH, "file")
+    assert stored == SHARED_HASH
+    assert registered == "blob-2"
+
+
+def test_blobs_sharing_a_hash_get_their_own_diffs(setup):
+    client, headers = setup
+    same = client.get("/policies/1/versions/1/diff/2", headers=headers)
+    assert same.status_code == 200
+    assert "expenses" not in same.text
+
+    # Cached above under the uploaded blob's hash; the registered blob must not be served that result.
+    changed = client.get("/policies/1/versions/1/diff/3", headers=headers)
+    assert changed.status_code == 200
+    assert "expenses" in changed.text
+    assert "colleagues" in changed.text
+
+
+def test_cancelled_first_request_does_not_fail_the_others(tmp_path):
+    engine = DiffEngine(workers=1, cache_dir=str(tmp_path))
+    loads = []
+
+    async def load_texts():
+        loads.append(1)
+        await asyncio.sleep(0.2)
+        return "Be kind.", "Be kind to colleagues."
+
+    async def scenario():
+        first = asyncio.ensure_future(engine.diff("pair", load_texts))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(engine.diff("pair", load_texts))
+        await asyncio.sleep(0.05)
+        first.cancel() # The first client disconnects while the texts load
+        return await second
+
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        engine.shutdown()
+    assert b"colleagues" in result
+    assert loads == [1]
+    assert engine.cached("pair") == result
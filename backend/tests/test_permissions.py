@@ -0,0 +1,55 @@
+"""The permission cache must not keep roles that were revoked while they were being loaded."""
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from backend.src.auth import permissions
+from backend.src.auth.permissions import PermissionResolver
+from backend.src.database import Base, SessionLocal, engine
+from backend.src.models import policy as models
+
+
+@pytest.fixture(scope="module")
+def user_id():
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        user = models.User(id=100, username="reviewer", password_hash="x", email="reviewer@example.com")
+        role = models.Role(name="Reviewer")
+        db.add_all([user, role])
+        db.flush()
+        db.add(models.UserRole(user_id=user.id, role_id=role.id))
+        db.commit()
+        return user.id
+
+
+def test_fill_from_the_primary_is_cached(user_id):
+    resolver = PermissionResolver()
+    with SessionLocal() as db:
+        assert resolver.role_mask(db, user_id) == permissions.REVIEWER
+    assert resolver._cache.get(user_id) == permissions.REVIEWER
+
+
+def test_invalidation_during_a_fill_wins(user_id):
+    resolver = PermissionResolver()
+
+    def revoke(*_):
+        # The revoke commits while the roles query is in flight.
+        resolver.invalidate(user_id)
+
+    event.listen(engine, "after_cursor_execute", revoke)
+    try:
+        with SessionLocal() as db:
+            assert resolver.role_mask(db, user_id) == permissions.REVIEWER
+    finally:
+        event.remove(engine, "after_cursor_execute", revoke)
+    assert resolver._cache.get(user_id) is None
+    assert resolver.stats()["stale_fills"] == 1
+
+
+def test_replica_reads_are_not_cached(user_id):
+    resolver = PermissionResolver()
+    replica = create_engine(engine.url)
+    with Session(bind=replica) as db:
+        assert resolver.role_mask(db, user_id) == permissions.REVIEWER
+    replica.dispose()
+    assert resolver._cache.get(user_id) is None
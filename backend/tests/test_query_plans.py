@@ -0,0 +1,114 @@
+"""Query-plan regression checks for the routers' hot filters.
+
+Seeds a large synthetic dataset into a scratch schema of TEST_POSTGRES_URL
+and fails if the main query behind a list or lookup endpoint falls back to a
+sequential scan on the filtered table. Skipped without TEST_POSTGRES_URL.
+"""
+import json
+import os
+from typing import Iterator
+
+import pytest
+from sqlalchemy import func, literal_column, select, text
+
+from backend.scripts.scratch import scratch_schema
+from backend.src.models import policy as models
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+SCHEMA = "query_plan_check"
+
+SEED_SQL = [
+    "INSERT INTO users (id, username, password_hash, email, permissions_version) "
+    "SELECT g, 'user' || g, 'x', 'user' || g || '@example.com', 0 FROM generate_series(1, 20000) g",
+    "INSERT INTO roles (id, name) VALUES (1, 'Admin'), (2, 'Editor'), (3, 'Reviewer'), (4, 'Viewer')",
+    "INSERT INTO user_roles (user_id, role_id) SELECT g, 1 + g % 4 FROM generate_series(1, 20000) g",
+    "INSERT INTO policies (id, title, status, created_by) "
+    "SELECT g, 'Policy ' || g, 'Published', 1 FROM generate_series(1, 20000) g",
+    "INSERT INTO policy_versions (id, policy_id, version_number, created_by) "
+    "SELECT g, 1 + g % 2000, 1 + g / 2000, 1 FROM generate_series(1, 10000) g",
+    "INSERT INTO attestations (user_id, policy_version_id) "
+    "SELECT 1 + g % 20000, 1 + g / 20000 FROM generate_series(0, 199999) g",
+    "INSERT INTO notifications (user_id, message, read, created_at) "
+    "SELECT 1 + g % 20000, 'Notification ' || g, g % 3 = 0, now() - g * interval '1 minute' FROM generate_series(1, 200000) g",
+    "INSERT INTO workflows (id, policy_id, name, status) "
+    "SELECT g, 1 + g % 2000, 'Review ' || g, 'Pending' FROM generate_series(1, 4000) g",
+    "INSERT INTO workflow_steps (workflow_id, step_order, name, assigned_to_user_id, status, due_date, completed_at) "
+    "SELECT 1 + g % 4000, 1 + g / 4000, 'Step', 1 + g % 20000, CASE WHEN g % 5 = 0 THEN 'Completed' ELSE 'Pending' END, "
+    "now() + (g - 2000) * interval '1 hour', CASE WHEN g % 5 = 0 THEN now() END "
+    "FROM generate_series(0, 19999) g",
+    "INSERT INTO review_comments (policy_version_id, user_id, comment_text) "
+    "SELECT 1 + g % 10000, 1 + g % 20000, 'Looks good' FROM generate_series(1, 40000) g",
+]
+
+# (endpoint, table that must be reached through an index, statement)
+CHECKS = [
+    ("permissions: role lookup", "user_roles",
+     select(models.Role.name).join(models.UserRole, models.UserRole.role_id == models.Role.id).where(models.UserRole.user_id == 42)),
+    ("GET /policies/{id}/versions/", "policy_versions",
+     select(models.PolicyVersion).where(models.PolicyVersion.policy_id == 42).limit(100)),
+    ("GET /workflows/attestations/policy-version/{id}", "attestations",
+     select(models.Attestation).where(models.Attestation.policy_version_id == 3, models.Attestation.user_id > 15000)
+     .order_by(models.Attestation.user_id).limit(101)),
+    ("POST /workflows/attestations/ (duplicate check)", "attestations",
+     select(models.Attestation).where(models.Attestation.user_id == 42, models.Attestation.policy_version_id == 3).limit(1)),
+    ("GET /notifications/me/", "notifications",
+     select(models.Notification).where(models.Notification.user_id == 42, models.Notification.id < 150000)
+     .order_by(models.Notification.id.desc()).limit(101)),
+    ("GET /notifications/me/ (unread)", "notifications",
+     select(models.Notification).where(models.Notification.user_id == 42, models.Notification.read.is_(False))
+     .order_by(models.Notification.created_at.desc()).limit(100)),
+    ("notification retention batch", "notifications",
+     select(models.Notification.id).where(models.Notification.read.is_(True), models.Notification.created_at < func.now() - text("interval '120 days'"))
+     .order_by(models.Notification.created_at).limit(1000).with_for_update(skip_locked=True)),
+    ("GET /workflows/{id}/steps/", "workflow_steps",
+     select(models.WorkflowStep).where(models.WorkflowStep.workflow_id == 42).order_by(models.WorkflowStep.step_order).limit(100)),
+    ("assigned steps by user and status", "workflow_steps",
+     select(models.WorkflowStep).where(models.WorkflowStep.assigned_to_user_id == 42, models.WorkflowStep.status == "Pending")),
+    ("deadline scheduler refill", "workflow_steps",
+     select(models.WorkflowStep.id, models.WorkflowStep.due_date)
+     .where(models.WorkflowStep.reminded_at.is_(None), models.WorkflowStep.completed_at.is_(None),
+            models.WorkflowStep.due_date.isnot(None), models.WorkflowStep.due_date <= func.now() + text("interval '1 day'"))
+     .order_by(models.WorkflowStep.due_date, models.WorkflowStep.id).limit(20000)),
+    ("workflows for a policy", "workflows",
+     select(models.Workflow).where(models.Workflow.policy_id == 42)),
+    ("GET /workflows/review-comments/policy-version/{id}", "review_comments",
+     select(models.ReviewComment).where(models.ReviewComment.policy_version_id == 42).limit(100)),
+    ("GET /policies/typeahead/ (title prefix)", "policies",
+     select(models.Policy.id, models.Policy.title)
+     .where(func.lower(models.Policy.title).op("~>=~")("policy 12"), func.lower(models.Policy.title).op("~<~")("policy 13"))
+     .order_by(func.lower(models.Policy.title).op("USING")(literal_column("~<~"))).limit(10)),
+    ("GET /policies/typeahead/ (word prefix)", "policies",
+     select(models.Policy.id, models.Policy.title)
+     .where(func.to_tsvector(literal_column("'simple'::regconfig"), models.Policy.title)
+            .op("@@")(func.to_tsquery(literal_column("'simple'::regconfig"), "1234:*")))
+     .order_by(func.lower(models.Policy.title)).limit(10)),
+]
+
+
+def _seq_scans(plan: dict) -> Iterator[str]:
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan.get("Relation Name")
+    for child in plan.get("Plans", ()):
+        yield from _seq_scans(child)
+
+
+@pytest.fixture(scope="module")
+def seeded_engine():
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    with scratch_schema(TEST_POSTGRES_URL, SCHEMA) as engine:
+        with engine.begin() as conn:
+            for statement in SEED_SQL:
+                conn.execute(text(statement))
+            conn.execute(text("ANALYZE"))
+        yield engine
+
+
+@pytest.mark.parametrize("table, statement", [check[1:] for check in CHECKS], ids=[check[0] for check in CHECKS])
+def test_filter_uses_an_index(seeded_engine, table, statement):
+    compiled = statement.compile(seeded_engine, compile_kwargs={"literal_binds": True})
+    with seeded_engine.connect() as conn:
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    assert table not in set(_seq_scans(plan[0]["Plan"])), f"sequential scan on {table}"
@@ -0,0 +1,84 @@
+"""The Redis read-cache backend, against TEST_REDIS_URL or an in-process fakeredis server."""
+import asyncio
+import os
+import uuid
+
+import pytest
+
+from backend.src.core import read_cache
+from backend.src.core.read_cache import ReadCache, RedisBackend
+
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    if read_cache.redis is None:
+        pytest.skip("the redis package is not installed")
+    if not TEST_REDIS_URL:
+        # The Lua script needs fakeredis' lua extra (lupa).
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeServer()
+        monkeypatch.setattr(read_cache.redis.Redis, "from_url", lambda url, **kw: fakeredis.FakeRedis(server=server))
+        monkeypatch.setattr(read_cache.redis_asyncio.Redis, "from_url", lambda url, **kw: fakeredis.FakeAsyncRedis(server=server))
+    # A unique prefix keeps runs against a shared server apart.
+    backend = RedisBackend(url=TEST_REDIS_URL or "redis://fake", ttl=60, prefix=f"test-read-cache:{uuid.uuid4().hex}:")
+    yield backend
+    keys = list(backend._sync_client.scan_iter(match=backend._prefix + "*"))
+    if keys:
+        backend._sync_client.delete(*keys)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_set_get_round_trip(backend):
+    async def scenario():
+        token = await backend.fill_token()
+        assert await backend.set("policy:1", {"title": "T"}, token)
+        return await backend.get("policy:1")
+
+    assert run(scenario()) == {"title": "T"}
+    assert backend.stats()["hits"] == 1
+
+
+def test_invalidation_bumps_the_generation_and_drops_keys(backend):
+    async def scenario():
+        before = await backend.fill_token()
+        assert await backend.set("policy:1", "v1", before)
+        backend.invalidate(["policy:1"])
+        return before, await backend.fill_token(), await backend.get("policy:1")
+
+    before, after, value = run(scenario())
+    assert after != before
+    assert value is None
+    assert backend.stats()["invalidations"] == 1
+
+
+def test_fill_started_before_an_invalidation_is_not_stored(backend):
+    async def scenario():
+        token = await backend.fill_token()
+        # A write commits while the value is being loaded.
+        backend.invalidate(["policy:1"])
+        stored = await backend.set("policy:1", "pre-commit", token)
+        return stored, await backend.get("policy:1")
+
+    assert run(scenario()) == (False, None)
+    assert backend.stats()["stale_fills"] == 1
+
+
+def test_read_cache_loads_once(backend):
+    cache = ReadCache(backend)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return "value"
+
+    async def scenario():
+        return [await cache.get_or_load("document-types", load) for _ in range(3)]
+
+    assert run(scenario()) == ["value"] * 3
+    assert len(loads) == 1
@@ -0,0 +1,47 @@
+"""Concurrent version creation must hand out gap-free, unique version numbers."""
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from backend.src.api.policies import create_policy_version
+from backend.src.models import policy as models
+from backend.src.schemas import policy as schemas
+
+WORKERS = 16
+VERSIONS = 200
+
+
+def test_parallel_creations_get_consecutive_numbers(pg_engine):
+    # SQLite serializes writers, so the race only shows on PostgreSQL.
+    Session = sessionmaker(bind=pg_engine)
+    with Session() as db:
+        user = models.User(username="editor", password_hash="x", email="editor@example.com")
+        db.add(user)
+        db.flush()
+        policy = models.Policy(title="Concurrency", created_by=user.id)
+        db.add(policy)
+        db.commit()
+        user_id, policy_id = user.id, policy.id
+
+    def create_one(i: int) -> int:
+        with Session() as db:
+            current_user = db.get(models.User, user_id)
+            payload = schemas.PolicyVersionCreate(summary_of_changes=f"change {i}")
+            return create_policy_version(policy_id, payload, db=db, current_user=current_user).version_number
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        returned = sorted(pool.map(create_one, range(VERSIONS)))
+
+    with Session() as db:
+        stored = sorted(db.execute(
+            select(models.PolicyVersion.version_number).where(models.PolicyVersion.policy_id == policy_id)
+        ).scalars())
+        policy = db.get(models.Policy, policy_id)
+        current = db.get(models.PolicyVersion, policy.current_version_id)
+
+    expected = list(range(1, VERSIONS + 1))
+    assert returned == expected
+    assert stored == expected
+    assert policy.version_counter == VERSIONS
+    assert current.version_number == VERSIONS
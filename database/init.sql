@@ -5,6 +5,7 @@ CREATE TABLE IF NOT EXISTS users (
     username VARCHAR(255) UNIQUE NOT NULL,
     password_hash VARCHAR(255) NOT NULL,
     email VARCHAR(255) UNIQUE NOT NULL,
+    permissions_version INTEGER DEFAULT 0 NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -12,27 +13,282 @@ CREATE TABLE IF NOT EXISTS users (
 CREATE TABLE IF NOT EXISTS roles (
     id SERIAL PRIMARY KEY,
     name VARCHAR(50) UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_roles (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    role_id INTEGER NOT NULL REFERENCES roles(id) ON DELETE CASCADE,
+    PRIMARY KEY (user_id, role_id)
+);
+
+CREATE TABLE IF NOT EXISTS document_types (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) UNIQUE NOT NULL,
+    description VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS content_blobs (
+    id SERIAL PRIMARY KEY,
+    file_path VARCHAR(1024) NOT NULL,
+    file_hash VARCHAR(128),
+    size_bytes INTEGER,
+    mime_type VARCHAR(255),
+    uploaded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    extracted_text TEXT,
+    extracted_at TIMESTAMP WITH TIME ZONE,
+    storage VARCHAR(16) DEFAULT 'file' NOT NULL
+);
+
+-- Chunked blobs are stored as content-defined chunks, each kept once.
+CREATE TABLE IF NOT EXISTS content_chunks (
+    hash VARCHAR(64) PRIMARY KEY,
+    size_bytes INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS content_blob_chunks (
+    content_blob_id INTEGER NOT NULL REFERENCES content_blobs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    "offset" BIGINT NOT NULL,
+    chunk_hash VARCHAR(64) NOT NULL REFERENCES content_chunks(hash),
+    PRIMARY KEY (content_blob_id, position)
+);
+
+-- policies.current_version_id references policy_versions, which references
+-- policies; the foreign key is added once both tables exist.
 CREATE TABLE IF NOT EXISTS policies (
     id SERIAL PRIMARY KEY,
     title VARCHAR(255) NOT NULL,
     description TEXT,
     document_type_id INTEGER REFERENCES document_types(id),
-    current_version_id INTEGER REFERENCES policy_versions(id) ON DELETE SET NULL,
+    current_version_id INTEGER,
     status VARCHAR(50) DEFAULT 'Draft' NOT NULL,
+    version_counter INTEGER DEFAULT 0 NOT NULL,
     created_by INTEGER REFERENCES users(id),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     search_vector TSVECTOR
 );
 
+CREATE TABLE IF NOT EXISTS policy_versions (
+    id SERIAL PRIMARY KEY,
+    policy_id INTEGER NOT NULL REFERENCES policies(id) ON DELETE CASCADE,
+    version_number INTEGER NOT NULL,
+    effective_date TIMESTAMP WITH TIME ZONE,
+    content_blob_id INTEGER REFERENCES content_blobs(id),
+    summary_of_changes TEXT,
+    created_by INTEGER REFERENCES users(id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    search_vector TSVECTOR,
+    CONSTRAINT uq_policy_versions_policy_id_version_number UNIQUE (policy_id, version_number)
+);
+
+-- Databases created before policies.version_counter existed: add it and
+-- start each counter at the policy's highest existing version number.
+ALTER TABLE policies ADD COLUMN IF NOT EXISTS version_counter INTEGER DEFAULT 0 NOT NULL;
+ALTER TABLE content_blobs ADD COLUMN IF NOT EXISTS extracted_text TEXT;
+ALTER TABLE content_blobs ADD COLUMN IF NOT EXISTS extracted_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE content_blobs ADD COLUMN IF NOT EXISTS storage VARCHAR(16) DEFAULT 'file' NOT NULL;
+UPDATE policies p SET version_counter = v.max_version
+FROM (SELECT policy_id, MAX(version_number) AS max_version FROM policy_versions GROUP BY policy_id) v
+WHERE v.policy_id = p.id AND p.version_counter < v.max_version;
+
+-- Text extracted from blobs the server didn't store (registered by path) is
+-- dropped, and their versions are re-indexed by the extraction backfill.
+WITH dropped AS (
+    UPDATE content_blobs SET extracted_text = ''
+    WHERE extracted_text <> '' AND NOT (
+        COALESCE(file_hash, '') ~ '^[0-9a-f]{64}$'
+        AND (storage = 'chunks' OR file_path = 'sha256/' || substr(file_hash, 1, 2) || '/' || substr(file_hash, 3, 2) || '/' || file_hash)
+    )
+    RETURNING id
+)
+UPDATE policy_versions SET search_vector = NULL WHERE content_blob_id IN (SELECT id FROM dropped);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'policies_current_version_id_fkey') THEN
+        ALTER TABLE policies ADD CONSTRAINT policies_current_version_id_fkey
+            FOREIGN KEY (current_version_id) REFERENCES policy_versions(id) ON DELETE SET NULL;
+    END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS workflow_templates (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) UNIQUE NOT NULL,
+    description TEXT,
+    created_by INTEGER REFERENCES users(id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS workflow_template_steps (
+    id SERIAL PRIMARY KEY,
+    template_id INTEGER NOT NULL REFERENCES workflow_templates(id) ON DELETE CASCADE,
+    step_order INTEGER NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    assigned_to_role_id INTEGER REFERENCES roles(id),
+    due_offset_hours INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS workflows (
+    id SERIAL PRIMARY KEY,
+    policy_id INTEGER NOT NULL REFERENCES policies(id) ON DELETE CASCADE,
+    template_id INTEGER REFERENCES workflow_templates(id) ON DELETE SET NULL,
+    name VARCHAR(255) NOT NULL,
+    status VARCHAR(50) DEFAULT 'Pending' NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS workflow_steps (
+    id SERIAL PRIMARY KEY,
+    workflow_id INTEGER NOT NULL REFERENCES workflows(id) ON DELETE CASCADE,
+    step_order INTEGER NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    assigned_to_user_id INTEGER REFERENCES users(id),
+    assigned_to_role_id INTEGER REFERENCES roles(id),
+    status VARCHAR(50) DEFAULT 'Pending' NOT NULL,
+    due_date TIMESTAMP WITH TIME ZONE,
+    completed_at TIMESTAMP WITH TIME ZONE,
+    reminded_at TIMESTAMP WITH TIME ZONE,
+    escalated_at TIMESTAMP WITH TIME ZONE,
+    due_offset_hours INTEGER
+);
+
+-- Databases created before the deadline scheduler: add its markers.
+ALTER TABLE workflow_steps ADD COLUMN IF NOT EXISTS reminded_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE workflow_steps ADD COLUMN IF NOT EXISTS escalated_at TIMESTAMP WITH TIME ZONE;
+-- ... and before workflow templates.
+ALTER TABLE workflows ADD COLUMN IF NOT EXISTS template_id INTEGER REFERENCES workflow_templates(id) ON DELETE SET NULL;
+ALTER TABLE workflow_steps ADD COLUMN IF NOT EXISTS due_offset_hours INTEGER;
+
+CREATE TABLE IF NOT EXISTS attestations (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    policy_version_id INTEGER NOT NULL REFERENCES policy_versions(id) ON DELETE CASCADE,
+    attested_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    signature_data TEXT,
+    CONSTRAINT uq_attestations_policy_version_id_user_id UNIQUE (policy_version_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS attestation_fanouts (
+    id SERIAL PRIMARY KEY,
+    policy_version_id INTEGER NOT NULL REFERENCES policy_versions(id) ON DELETE CASCADE,
+    role_ids TEXT NOT NULL DEFAULT '[]',
+    user_ids TEXT NOT NULL DEFAULT '[]',
+    message TEXT NOT NULL,
+    due_at TIMESTAMP WITH TIME ZONE,
+    status VARCHAR(20) NOT NULL DEFAULT 'Pending',
+    last_user_id INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    processed INTEGER NOT NULL DEFAULT 0,
+    assigned INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_by INTEGER REFERENCES users(id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS attestation_assignments (
+    id SERIAL PRIMARY KEY,
+    policy_version_id INTEGER NOT NULL REFERENCES policy_versions(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    fanout_id INTEGER REFERENCES attestation_fanouts(id) ON DELETE SET NULL,
+    assigned_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    due_at TIMESTAMP WITH TIME ZONE,
+    CONSTRAINT uq_attestation_assignments_policy_version_id_user_id UNIQUE (policy_version_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS review_comments (
+    id SERIAL PRIMARY KEY,
+    policy_version_id INTEGER NOT NULL REFERENCES policy_versions(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    comment_text TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    message TEXT NOT NULL,
+    read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    unread INTEGER NOT NULL DEFAULT 0
+);
+
+-- Databases created before notification_counters existed: count what is unread.
+INSERT INTO notification_counters (user_id, unread)
+SELECT user_id, COUNT(*) FROM notifications WHERE read IS NOT TRUE GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS notifications_archive (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    message TEXT NOT NULL,
+    read BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP WITH TIME ZONE,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS outbox_events (
+    id SERIAL PRIMARY KEY,
+    channel VARCHAR(32) NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    payload TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    dead_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Indexes for the foreign keys and composite filters used by the API routers.
+-- Names match the SQLAlchemy models so create_all and this script agree.
+CREATE INDEX IF NOT EXISTS ix_content_blobs_file_hash ON content_blobs (file_hash);
+CREATE INDEX IF NOT EXISTS ix_content_blob_chunks_chunk_hash ON content_blob_chunks (chunk_hash);
+CREATE INDEX IF NOT EXISTS ix_policy_versions_policy_id ON policy_versions (policy_id);
+CREATE INDEX IF NOT EXISTS ix_workflow_template_steps_template_id_step_order ON workflow_template_steps (template_id, step_order);
+CREATE INDEX IF NOT EXISTS ix_workflows_policy_id ON workflows (policy_id);
+CREATE INDEX IF NOT EXISTS ix_workflow_steps_workflow_id_step_order ON workflow_steps (workflow_id, step_order);
+CREATE INDEX IF NOT EXISTS ix_workflow_steps_assigned_to_user_id_status ON workflow_steps (assigned_to_user_id, status);
+CREATE INDEX IF NOT EXISTS ix_workflow_steps_reminder_due ON workflow_steps (due_date, id)
+    WHERE reminded_at IS NULL AND completed_at IS NULL AND due_date IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_workflow_steps_escalation_due ON workflow_steps (due_date, id)
+    WHERE escalated_at IS NULL AND completed_at IS NULL AND due_date IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_attestations_user_id ON attestations (user_id);
+CREATE INDEX IF NOT EXISTS ix_attestation_assignments_user_id_id ON attestation_assignments (user_id, id);
+CREATE INDEX IF NOT EXISTS ix_attestation_fanouts_policy_version_id ON attestation_fanouts (policy_version_id);
+CREATE INDEX IF NOT EXISTS ix_review_comments_policy_version_id ON review_comments (policy_version_id);
+CREATE INDEX IF NOT EXISTS ix_notifications_user_id_read_created_at ON notifications (user_id, read, created_at);
+CREATE INDEX IF NOT EXISTS ix_notifications_user_id_id ON notifications (user_id, id);
+CREATE INDEX IF NOT EXISTS ix_notifications_read_created_at ON notifications (created_at) WHERE read IS TRUE;
+CREATE INDEX IF NOT EXISTS ix_notifications_archive_user_id ON notifications_archive (user_id);
+CREATE INDEX IF NOT EXISTS ix_outbox_events_pending ON outbox_events (available_at, id) WHERE dead_at IS NULL;
+CREATE INDEX IF NOT EXISTS ix_outbox_events_channel_user_id_id ON outbox_events (channel, user_id, id);
+
 -- Add a GIN index for faster full-text search
 CREATE INDEX IF NOT EXISTS policies_search_idx ON policies USING GIN (search_vector);
 
--- Create a function to update the search_vector
+-- Title typeahead: whole-title prefixes via text_pattern_ops, word prefixes via the title's words
+CREATE INDEX IF NOT EXISTS ix_policies_lower_title_prefix ON policies (lower(title) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_policies_title_words ON policies USING GIN (to_tsvector('simple'::regconfig, title));
+
+-- Create a function to update the search_vector: title and description plus the
+-- current version's vector, which the extraction pipeline fills in from the
+-- version's content (backend/src/core/extraction.py builds the same vector).
 CREATE OR REPLACE FUNCTION update_policy_search_vector()
 RETURNS TRIGGER AS $$
 BEGIN
-    NEW.search_vector = to_tsvector('english', COALESCE(NEW.title, '') || ' ' || COALESCE(NEW.description, ''));
+    NEW.search_vector =
+        setweight(to_tsvector('english', COALESCE(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(NEW.description, '')), 'B') ||
+        COALESCE((SELECT search_vector FROM policy_versions WHERE id = NEW.current_version_id), ''::tsvector);
     RETURN NEW;
 END;
 $$
@@ -41,17 +297,9 @@ LANGUAGE plpgsql;
 -- Create a trigger to update search_vector on insert or update
 DROP TRIGGER IF EXISTS trg_update_policy_search_vector ON policies;
 CREATE TRIGGER trg_update_policy_search_vector
-BEFORE INSERT OR UPDATE OF title, description ON policies
+BEFORE INSERT OR UPDATE OF title, description, current_version_id ON policies
 FOR EACH ROW EXECUTE FUNCTION update_policy_search_vector();
 
-
-CREATE TABLE IF NOT EXISTS user_roles (
-    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-    role_id INTEGER NOT NULL REFERENCES roles(id) ON DELETE CASCADE,
-    PRIMARY KEY (user_id, role_id)
-INSERT INTO users (username, password_hash, email) VALUES
-('admin', '$2b$12$5h/d/M.E.T.h.e.r.e.a.l.H.a.s.h.f.o.r.a.d.m.i.n.p.a.s.s.w.d', 'admin@example.com') -- Hashed 'adminpass'
-
 -- Add some default roles
 INSERT INTO roles (name) VALUES ('Admin'), ('Editor'), ('Reviewer'), ('Viewer') ON CONFLICT (name) DO NOTHING;
 